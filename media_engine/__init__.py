@@ -0,0 +1,75 @@
+"""
+媒体处理引擎：与界面无关的抽帧、音频提取、GIF 转换、图片转换、网格裁剪、合成 GIF。
+
+图形界面（多媒体处理工具.py）和命令行（python -m media_engine）都只是它的前端。
+
+为了让短命令（例如 --version）和只用到部分功能的脚本启动足够快，
+这里不直接导入各子模块：cv2 / PIL / numpy 只在第一次访问相应名字时才加载。
+"""
+
+import importlib
+
+from .common import (
+    ANIMATION_EXTS, ANIMATION_FORMATS, AUDIO_FORMATS, DEDUP_METHODS, ENCODE_PRESETS, EXTRACT_MODES,
+    EXTRACT_STRATEGIES, GIF_BACKENDS, GIF_DITHER_MODES, GIF_PALETTE_MODES, IMAGE_EXTS, OUTPUT_SINKS, TILE_SINKS,
+    VIDEO_EXTS, Cancelled, MediaError, default_writer_count, expand_inputs,
+)
+
+__version__ = "0.1.0"
+
+# 名字 -> 所在子模块，首次访问时再导入
+_LAZY = {
+    "extract_audio": "audio",
+    "probe_audio": "audio",
+    "StreamingGifWriter": "gif",
+    "StreamingWebpWriter": "animated",
+    "StreamingApngWriter": "animated",
+    "build_gif_palette": "gif",
+    "encode_options": "encoders",
+    "estimate_presets": "encoders",
+    "BatchResult": "images",
+    "convert_images": "images",
+    "grid_crop": "images",
+    "make_gif": "images",
+    "extract_frames": "video",
+    "video_to_mp3": "video",
+    "video_to_gif": "video",
+    "plan_frame_indices": "video",
+    "choose_extract_strategy": "video",
+    "iter_video_frames": "video",
+    "probe_gop_size": "video",
+    "extract_keyframes": "video",
+    "detect_scenes": "scenes",
+    "FrameDeduper": "dedup",
+    "PackedReader": "sinks",
+    "ResultCache": "cache",
+    "Checkpoint": "checkpoint",
+    "JobProfile": "profiling",
+    "AsyncImageWriter": "writers",
+    "Job": "jobs",
+    "JobScheduler": "jobs",
+    "FolderWatcher": "watch",
+    "WatchRule": "watch",
+    "default_rules": "watch",
+}
+
+# 注意 from media_engine import * 会导入 _LAZY 里的全部子模块
+__all__ = [
+    "ANIMATION_EXTS", "ANIMATION_FORMATS", "AUDIO_FORMATS", "DEDUP_METHODS", "ENCODE_PRESETS", "EXTRACT_MODES",
+    "EXTRACT_STRATEGIES", "GIF_BACKENDS", "GIF_DITHER_MODES", "GIF_PALETTE_MODES", "IMAGE_EXTS", "OUTPUT_SINKS",
+    "TILE_SINKS", "VIDEO_EXTS", "Cancelled", "MediaError", "default_writer_count", "expand_inputs",
+]
+__all__ += list(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
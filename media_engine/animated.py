@@ -0,0 +1,398 @@
+"""
+动画 WebP / APNG 的流式编码，接口与 StreamingGifWriter 相同（add_frame / close / abort / with）。
+不做调色板量化，保留 24 位色（带透明时 32 位）：
+
+- WebP：有损或无损（encode 中的 quality / method / lossless，见 encoders 模块），逐帧交给 libwebp 的动画编码器
+  （Pillow 11 起的 _webp.WebPAnimEncoder，版本见 WEBP_MIN_PILLOW），内存里只留压缩后的数据；相同的帧由 libwebp 合并进上一帧的时长。
+  Pillow 版本更低或内部接口对不上时，退回公开的 Image.save(save_all=True)：帧先留在内存里，close() 时一次编码
+- APNG：无损，compress_level 为 zlib 压缩级别。逐帧写 fcTL + fdAT 块，delta=True 时只写与上一帧不同的包围盒，
+  完全相同的帧并进上一帧的时长；总帧数在结束时回填到文件头的 acTL 块
+
+GifComparison 把同样的帧再编码一份 GIF（写到临时文件，不保留），结束时把两者的体积和编码耗时
+记进任务报告的 "compare"（见 profiling.annotate）。
+"""
+
+import io
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from .common import ANIMATION_FORMATS, MediaError
+from .profiling import StageRecorder, annotate, recording, stage
+
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# _webp.WebPAnimEncoder 是 Pillow 的内部接口，参数在 Pillow 11 改过（尺寸改为元组、帧改为 getim()），
+# 这里按 Pillow 11 的参数调用；更低的版本直接走 Image.save
+WEBP_MIN_PILLOW = (11, 0)
+
+
+def open_animation_writer(fmt, path, duration, loop=0, encode=None, delta=True, **gif_options):
+    """按 fmt 返回对应的流式编码器；gif_options（palette / sample_frames / dither 等）只用于 GIF"""
+    if fmt not in ANIMATION_FORMATS:
+        raise MediaError(f"不支持的动画格式: {fmt}")
+    if fmt == "gif":
+        from .gif import StreamingGifWriter
+        return StreamingGifWriter(path, duration, loop=loop, delta=delta, **gif_options)
+    if fmt == "webp":
+        return StreamingWebpWriter(path, duration, loop, encode)
+    return StreamingApngWriter(path, duration, loop, encode, delta)
+
+
+def _to_image(img, size):
+    """RGB 数组或 PIL 图片 -> 尺寸为 size（None 表示不缩放）的 PIL 图片"""
+    if isinstance(img, np.ndarray):
+        img = Image.fromarray(img)
+    if size is not None and img.size != size:
+        img = img.resize(size)
+    return img
+
+
+def _has_alpha(img):
+    return img.mode in ("RGBA", "LA") and img.getchannel("A").getextrema()[0] < 255
+
+
+class _StreamingWriter:
+    """两种编码器共用的部分：先写 .part 临时文件，close() 成功后再改名"""
+
+    def __init__(self, path, duration, loop):
+        self.path = path
+        self.duration = max(1, int(duration))
+        self.loop = loop
+        self.size = None
+        self.frame_count = 0        # 输入帧数
+        self._tmp_path = path + ".part"
+        self._fp = open(self._tmp_path, "wb")
+
+    def _finish(self):
+        raise NotImplementedError
+
+    def close(self):
+        if self._fp is None:
+            return
+        try:
+            if self.frame_count == 0:
+                raise MediaError("没有读取到任何帧，无法生成动画")
+            with stage("anim_write"):
+                self._finish()
+            self._fp.close()
+            self._fp = None
+            os.replace(self._tmp_path, self.path)
+        except Exception:
+            self.abort()
+            raise
+
+    def abort(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def check_webp_support():
+    """
+    没有编译 libwebp 时抛出 MediaError；返回能否逐帧流式编码
+    （Pillow 版本不低于 WEBP_MIN_PILLOW 且有 _webp.WebPAnimEncoder）
+    """
+    import PIL
+    from PIL import features
+
+    if not features.check("webp"):
+        raise MediaError("当前 Pillow 没有编译 WebP 支持（libwebp），无法编码动画 WebP")
+    try:
+        version = tuple(int(part) for part in PIL.__version__.split(".")[:2])
+    except ValueError:
+        version = (0, 0)
+    try:
+        from PIL import _webp
+    except ImportError:
+        return False
+    return version >= WEBP_MIN_PILLOW and hasattr(_webp, "WebPAnimEncoder")
+
+
+class StreamingWebpWriter(_StreamingWriter):
+    """
+    动画 WebP：encode 为 encode_options("webp", ...) 的结果，None 时用 balanced 预设。
+    Pillow 的内部编码器不可用（版本过低，或构造、add() 报参数不符）时改用 Image.save(save_all=True)，
+    此时所有帧留在内存里，close() 时一次编码。
+    """
+
+    def __init__(self, path, duration, loop=0, encode=None):
+        self.streaming = check_webp_support()
+        if encode is None:
+            from .encoders import encode_options
+            encode = encode_options("webp")
+        self.quality = encode.get("quality", 80)
+        self.method = encode.get("method", 4)
+        self.lossless = encode.get("lossless", False)
+        self._encoder = None
+        self._frames = []           # 退回 Image.save 时缓存的帧
+        self._timestamp = 0
+        super().__init__(path, duration, loop)
+
+    def _open_encoder(self, size):
+        from PIL import _webp
+        # 关键帧间隔取 gif2webp 的默认值
+        kmin, kmax = (9, 17) if self.lossless else (3, 5)
+        return _webp.WebPAnimEncoder(size, 0, self.loop, False, kmin, kmax, False, False)
+
+    def _add_streaming(self, frame):
+        """交给内部编码器；第一帧就报参数不符时返回 False，改走 Image.save"""
+        try:
+            if self._encoder is None:
+                self._encoder = self._open_encoder(frame.size)
+            self._encoder.add(frame.getim(), self._timestamp, self.lossless, self.quality, 100, self.method)
+        except (TypeError, AttributeError) as e:
+            if self.frame_count:
+                raise MediaError(f"WebP 编码失败: {e}")
+            self._encoder = None
+            self.streaming = False
+            return False
+        return True
+
+    def add_frame(self, img):
+        with stage("anim_encode"):
+            frame = _to_image(img, self.size)
+            if frame.mode not in ("RGB", "RGBA"):
+                frame = frame.convert("RGBA" if _has_alpha(frame) else "RGB")
+            self.size = frame.size
+            if not (self.streaming and self._add_streaming(frame)):
+                # 数组来的帧可能与调用方的缓冲共用内存，存一份拷贝
+                self._frames.append(frame.copy())
+        self._timestamp += self.duration
+        self.frame_count += 1
+
+    def _finish(self):
+        if self._frames:
+            first, *rest = self._frames
+            self._frames = []
+            first.save(self._fp, "WEBP", save_all=True, append_images=rest, duration=self.duration, loop=self.loop,
+                       lossless=self.lossless, quality=self.quality, method=self.method)
+            return
+        # 空帧标记结束时间（最后一帧的时长）
+        self._encoder.add(None, self._timestamp, self.lossless, self.quality, 100, 0)
+        data = self._encoder.assemble("", "", "")
+        self._encoder = None
+        if data is None:
+            raise MediaError("WebP 编码失败")
+        self._fp.write(data)
+
+    def abort(self):
+        self._encoder = None
+        self._frames = []
+        super().abort()
+
+
+def _chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def _png_chunks(data):
+    pos = len(_PNG_SIGNATURE)
+    while pos < len(data):
+        length, tag = struct.unpack(">I4s", data[pos:pos + 8])
+        yield tag, data[pos + 8:pos + 8 + length]
+        pos += length + 12
+
+
+def _delay(ms):
+    """帧时长 -> fcTL 的 (分子, 分母)；超出 16 位时改用 1/100 秒"""
+    if ms <= 0xFFFF:
+        return ms, 1000
+    return min(0xFFFF, round(ms / 10)), 100
+
+
+class StreamingApngWriter(_StreamingWriter):
+    """
+    APNG：encode 为 encode_options("apng", ...) 的结果，None 时用 balanced 预设。
+    颜色模式由第一帧决定：第一帧有透明像素时为 RGBA，否则为 RGB（之后各帧都转换成这个模式）。
+    """
+
+    def __init__(self, path, duration, loop=0, encode=None, delta=True):
+        if encode is None:
+            from .encoders import encode_options
+            encode = encode_options("apng")
+        self.encode = encode
+        self.delta = delta
+        self.mode = None
+        self.written_frames = 0     # 实际写入的帧数（相同帧会被合并）
+        self._seq = 0               # fcTL / fdAT 共用的序号
+        self._actl_offset = None
+        self._canvas = None         # 当前显示内容，用于差分
+        self._pending = None        # 等待写出的上一帧，留一帧以便合并时长
+        super().__init__(path, duration, loop)
+
+    def add_frame(self, img):
+        with stage("anim_encode"):
+            frame = self._encode_frame(img)
+        if frame is None:
+            return
+        with stage("anim_write"):
+            self._flush()
+        self._pending = frame
+        self.frame_count += 1
+
+    def _pixels(self, img):
+        if isinstance(img, np.ndarray) and self.mode in (None, "RGB") and \
+                self.size in (None, (img.shape[1], img.shape[0])):
+            self.mode = "RGB"
+            return img
+        img = _to_image(img, self.size)
+        if self.mode is None:
+            self.mode = "RGBA" if _has_alpha(img) else "RGB"
+        return np.asarray(img.convert(self.mode))
+
+    def _encode_png(self, pixels):
+        buf = io.BytesIO()
+        Image.fromarray(np.ascontiguousarray(pixels)).save(buf, "PNG", **self.encode)
+        chunks = list(_png_chunks(buf.getvalue()))
+        return chunks[0][1], b"".join(data for tag, data in chunks if tag == b"IDAT")
+
+    def _encode_frame(self, img):
+        """与上一帧比较并编码变化区域，返回待写出的帧；与上一帧完全相同时合并进上一帧，返回 None"""
+        pixels = self._pixels(img)
+        offset = (0, 0)
+        if self.delta and self._canvas is not None:
+            changed = (pixels != self._canvas).any(axis=2)
+            rows = np.flatnonzero(changed.any(axis=1))
+            if not len(rows):
+                self._pending["duration"] += self.duration
+                self.frame_count += 1
+                return None
+            cols = np.flatnonzero(changed.any(axis=0))
+            x0, y0, x1, y1 = cols[0], rows[0], cols[-1] + 1, rows[-1] + 1
+            region = pixels[y0:y1, x0:x1]
+            self._canvas[y0:y1, x0:x1] = region
+            offset = (int(x0), int(y0))
+        else:
+            region = pixels
+            if self.delta:
+                self._canvas = pixels.copy()
+
+        ihdr, data = self._encode_png(region)
+        if self.size is None:
+            self.size = (pixels.shape[1], pixels.shape[0])
+            self._fp.write(_PNG_SIGNATURE + _chunk(b"IHDR", ihdr))
+            # 帧数先占位，close() 时回填
+            self._actl_offset = self._fp.tell()
+            self._fp.write(_chunk(b"acTL", struct.pack(">II", 0, self.loop)))
+        return {"data": data, "size": (region.shape[1], region.shape[0]), "offset": offset,
+                "duration": self.duration}
+
+    def _flush(self):
+        frame = self._pending
+        if frame is None:
+            return
+        self._pending = None
+
+        # 处置方式 none、混合方式 source：变化区域直接覆盖上一帧的内容（包括透明度）
+        self._fp.write(_chunk(b"fcTL", struct.pack(">IIIIIHHBB", self._seq, *frame["size"], *frame["offset"],
+                                                   *_delay(frame["duration"]), 0, 0)))
+        self._seq += 1
+        if self.written_frames == 0:
+            self._fp.write(_chunk(b"IDAT", frame["data"]))
+        else:
+            self._fp.write(_chunk(b"fdAT", struct.pack(">I", self._seq) + frame["data"]))
+            self._seq += 1
+        self.written_frames += 1
+
+    def _finish(self):
+        self._flush()
+        self._fp.write(_chunk(b"IEND", b""))
+        self._fp.seek(self._actl_offset)
+        self._fp.write(_chunk(b"acTL", struct.pack(">II", self.written_frames, self.loop)))
+
+
+class GifComparison:
+    """
+    包装 writer：每一帧同时送给一个写到临时文件的 GIF 编码器，close() 时比较两者的输出体积和编码耗时，
+    结果记进当前任务报告的 "compare"，临时 GIF 随即删除。
+    GIF 的各阶段记在单独的记录器上，不计入任务本身的阶段统计（任务总用时仍包含它）。
+    """
+
+    def __init__(self, writer, fmt, duration, loop=0, delta=True, **gif_options):
+        from .gif import StreamingGifWriter
+
+        self.writer = writer
+        self.fmt = fmt
+        self._recorder = StageRecorder()
+        self._seconds = 0.0
+        self._gif_path = writer.path + ".compare.gif"
+        with recording(self._recorder):
+            self._gif = StreamingGifWriter(self._gif_path, duration, loop=loop, delta=delta, **gif_options)
+
+    @property
+    def frame_count(self):
+        return self.writer.frame_count
+
+    def add_frame(self, img):
+        t0 = time.perf_counter()
+        self.writer.add_frame(img)
+        self._seconds += time.perf_counter() - t0
+        with recording(self._recorder):
+            self._gif.add_frame(img)
+
+    def close(self):
+        t0 = time.perf_counter()
+        try:
+            self.writer.close()
+        except Exception:
+            self._gif.abort()
+            raise
+        self._seconds += time.perf_counter() - t0
+        try:
+            with recording(self._recorder):
+                self._gif.close()
+            annotate("compare", compare_entry(self.fmt, os.path.getsize(self.writer.path), self._seconds,
+                                              os.path.getsize(self._gif_path),
+                                              sum(s for s, _ in self._recorder.snapshot().values())))
+        finally:
+            try:
+                os.remove(self._gif_path)
+            except OSError:
+                pass
+
+    def abort(self):
+        self.writer.abort()
+        self._gif.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def compare_entry(fmt, size, seconds, gif_size, gif_seconds):
+    """任务报告里的 "compare" 项：输出格式与 GIF 的体积、编码耗时及比值"""
+    return {
+        "format": fmt,
+        "bytes": size,
+        "encode_s": round(seconds, 4),
+        "gif_bytes": gif_size,
+        "gif_encode_s": round(gif_seconds, 4),
+        "size_ratio": round(size / gif_size, 4) if gif_size else None,
+        "time_ratio": round(seconds / gif_seconds, 4) if gif_seconds else None,
+    }
@@ -0,0 +1,183 @@
+"""
+提取音频：先探测音轨编码，与目标容器兼容时直接流复制（-c:a copy，不解码不编码），
+否则才转码。复制只是拆包再封装，比重新编码快几十倍，音质也没有损失。
+
+ffmpeg 以子进程运行（见 ffmpeg.run_ffmpeg），进度是真实百分比，
+先写到 .part 临时文件，成功后才替换输出；取消或失败时不留下不完整的文件，也不动已有的输出。
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+
+from .common import AUDIO_FORMATS, MediaError, media_name, report
+from .ffmpeg import parse_ffmpeg_duration, run_ffmpeg, to_float
+
+
+# 容器 -> 可以直接放进去（流复制）的音频编码
+COPY_CODECS = {
+    "mp3": ("mp3",),
+    "m4a": ("aac", "alac"),
+    "ogg": ("vorbis", "opus", "flac"),
+    "opus": ("opus",),
+    "flac": ("flac",),
+    "wav": ("pcm_s16le", "pcm_s24le", "pcm_s32le", "pcm_f32le", "pcm_u8"),
+}
+
+# 需要转码时的编码参数
+ENCODE_ARGS = {
+    "mp3": ["-c:a", "libmp3lame", "-q:a", "2"],
+    "m4a": ["-c:a", "aac", "-b:a", "192k"],
+    "ogg": ["-c:a", "libvorbis", "-q:a", "5"],
+    "opus": ["-c:a", "libopus", "-b:a", "128k"],
+    "flac": ["-c:a", "flac"],
+    "wav": ["-c:a", "pcm_s16le"],
+}
+
+# 容器 -> ffmpeg 封装器（输出写到 .part 临时文件，不能靠扩展名推断）
+MUXERS = {
+    "mp3": "mp3",
+    "m4a": "ipod",
+    "ogg": "ogg",
+    "opus": "opus",
+    "flac": "flac",
+    "wav": "wav",
+}
+
+# fmt="auto" 时按源编码选容器，尽量流复制；不认识的编码转成 mp3
+AUTO_CONTAINERS = {
+    "aac": "m4a", "alac": "m4a",
+    "mp3": "mp3",
+    "opus": "opus",
+    "vorbis": "ogg",
+    "flac": "flac",
+}
+
+
+def probe_audio(path):
+    """
+    探测第一条音轨，返回 {"codec", "duration", "sample_rate", "channels", "bit_rate"}；
+    没有音轨返回 None。优先用 ffprobe，没有 ffprobe 时解析 ffmpeg -i 的输出。
+    """
+    if shutil.which("ffprobe"):
+        info = _probe_with_ffprobe(path)
+        if info is not False:
+            return info
+    if shutil.which("ffmpeg"):
+        return _probe_with_ffmpeg(path)
+    raise MediaError("请安装 ffmpeg 并加入 PATH")
+
+
+def _probe_with_ffprobe(path):
+    """失败返回 False（交给 ffmpeg 兜底），没有音轨返回 None"""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name,sample_rate,channels,bit_rate,duration:format=duration",
+        "-of", "json",
+        path
+    ]
+    try:
+        p = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        if p.returncode != 0:
+            return False
+        data = json.loads(p.stdout or "{}")
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return False
+
+    streams = data.get("streams") or []
+    if not streams:
+        return None
+    stream = streams[0]
+    duration = to_float(stream.get("duration")) or to_float(data.get("format", {}).get("duration"))
+    return {
+        "codec": stream.get("codec_name"),
+        "duration": duration,
+        "sample_rate": _to_int(stream.get("sample_rate")),
+        "channels": _to_int(stream.get("channels")),
+        "bit_rate": _to_int(stream.get("bit_rate")),
+    }
+
+
+_AUDIO_RE = re.compile(r"Stream #\d+:\d+.*?: Audio: (\w+)[^,]*(?:, (\d+) Hz)?(?:, ([\w.]+))?")
+_BITRATE_RE = re.compile(r"(\d+) kb/s")
+
+
+def _probe_with_ffmpeg(path):
+    try:
+        p = subprocess.run(["ffmpeg", "-hide_banner", "-i", path], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError) as e:
+        raise MediaError(f"无法读取音频信息: {e}")
+
+    # 只给输入时 ffmpeg 总是返回非 0，信息在 stderr 里
+    text = p.stderr
+    for line in text.splitlines():
+        m = _AUDIO_RE.search(line)
+        if m is None:
+            continue
+        channels = {"mono": 1, "stereo": 2}.get(m.group(3))
+        bit_rate = _BITRATE_RE.search(line)
+        return {
+            "codec": m.group(1),
+            "duration": parse_ffmpeg_duration(text),
+            "sample_rate": _to_int(m.group(2)),
+            "channels": channels,
+            "bit_rate": int(bit_rate.group(1)) * 1000 if bit_rate else None,
+        }
+    if "Invalid data" in text or "No such file" in text:
+        raise MediaError(text.strip().splitlines()[-1])
+    return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def plan_audio_extract(codec, fmt="auto", copy=True):
+    """根据源编码决定 (输出容器, 是否流复制)"""
+    if fmt not in AUDIO_FORMATS:
+        raise MediaError(f"不支持的音频格式: {fmt}")
+    if fmt == "auto":
+        fmt = AUTO_CONTAINERS.get(codec, "mp3")
+    return fmt, bool(copy and codec in COPY_CODECS[fmt])
+
+
+def extract_audio(video_path, output_dir, fmt="auto", copy=True, progress=None, cancel=None):
+    """
+    提取第一条音轨为 {视频名}.{容器}，返回输出路径。
+    fmt 为 AUDIO_FORMATS 之一，auto 时按源编码选容器；copy=False 时总是重新编码。
+    """
+    info = probe_audio(video_path)
+    if info is None:
+        raise MediaError("该视频没有音轨，无法提取音频")
+
+    container, stream_copy = plan_audio_extract(info["codec"], fmt, copy)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"{media_name(video_path)}.{container}")
+
+    codec_args = ["-c:a", "copy"] if stream_copy else ENCODE_ARGS[container]
+    if container == "m4a":
+        # 把 moov 放到文件开头，边下边播
+        codec_args = codec_args + ["-movflags", "+faststart"]
+    message = "正在复制音轨" if stream_copy else f"正在转码为 {container.upper()}"
+    report(progress, 0, None, f"{message}...")
+
+    # 写到临时文件，完成后再改名，失败或取消时不留下不完整的文件，也不删掉上次成功的输出
+    part_path = output_path + ".part"
+    args = (["-i", video_path, "-map", "0:a:0", "-vn", "-sn", "-dn"] + codec_args
+            + ["-f", MUXERS[container], part_path])
+    try:
+        run_ffmpeg(args, info["duration"], progress, cancel, message)
+        os.replace(part_path, output_path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+    return output_path
@@ -0,0 +1,379 @@
+"""
+基准测试：在本机生成合成输入，无界面地跑各条处理管线，记录耗时、吞吐、峰值内存和输出大小，
+并与保存的基准 JSON 比较，超出容差的记为回退。
+
+命令行：python -m media_engine bench [--suite quick|full] [--baseline base.json] [--save-baseline base.json]
+
+- 输入：ffmpeg testsrc2 + 正弦波生成的测试视频（多种分辨率、时长、关键帧间隔），
+  以及固定随机种子生成的图片集（多种格式和尺寸）。生成一次后缓存在工作目录里，重复运行结果可比
+- 每个用例在单独的子进程里运行，峰值内存互不干扰；峰值 = 该进程与其最大子进程（ffmpeg、
+  转换进程池）中较大的一个。没有 resource 模块的平台（Windows）不记录内存
+- 有回退时返回非零退出码，可以直接放进 CI
+"""
+
+import fnmatch
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from . import __version__
+from .common import MediaError
+from .profiling import StageRecorder, peak_rss, recording
+
+
+# 名字 -> (宽, 高, 时长秒, 帧率, 关键帧间隔)
+VIDEO_SPECS = {
+    "360p-10s-g30": (640, 360, 10, 30, 30),
+    "360p-10s-g250": (640, 360, 10, 30, 250),
+    "360p-60s-g250": (640, 360, 60, 30, 250),
+    "720p-10s-g60": (1280, 720, 10, 30, 60),
+    "1080p-5s-g250": (1920, 1080, 5, 30, 250),
+}
+
+# 名字 -> (格式, 宽, 高, 张数)
+IMAGE_SPECS = {
+    "png-640x480x24": ("png", 640, 480, 24),
+    "jpg-1920x1080x24": ("jpg", 1920, 1080, 24),
+    "webp-1280x720x24": ("webp", 1280, 720, 24),
+    "png-4000x3000x1": ("png", 4000, 3000, 1),
+}
+
+# 用例：(名字, 管线, 输入, 参数)；quick 是 full 的子集
+FULL_CASES = [
+    ("extract/360p-10s-g30", "extract", "360p-10s-g30", {"count": 100}),
+    ("extract/360p-10s-g250", "extract", "360p-10s-g250", {"count": 100}),
+    ("extract-sparse/360p-60s-g250", "extract", "360p-60s-g250", {"count": 20}),
+    ("extract/720p-10s-g60", "extract", "720p-10s-g60", {"count": 100}),
+    ("extract/1080p-5s-g250", "extract", "1080p-5s-g250", {"count": 50}),
+    ("to-mp3/360p-60s-g250", "to-mp3", "360p-60s-g250", {}),
+    ("to-gif/360p-10s-g250", "to-gif", "360p-10s-g250", {"fps": 10, "scale": 0.5}),
+    ("to-gif/720p-10s-g60", "to-gif", "720p-10s-g60", {"fps": 10, "scale": 0.5}),
+    ("to-gif-ffmpeg/720p-10s-g60", "to-gif", "720p-10s-g60", {"fps": 10, "scale": 0.5, "backend": "ffmpeg"}),
+    # 不复用帧缓冲（每帧新分配数组），与上面的 to-gif 用例对比分配次数和帧率
+    ("to-gif-nobuf/720p-10s-g60", "to-gif", "720p-10s-g60", {"fps": 10, "scale": 0.5, "reuse_buffers": False}),
+    # 同样的帧写成动画 WebP / APNG，与 to-gif/720p-10s-g60 对比输出大小和耗时
+    ("to-webp/720p-10s-g60", "to-gif", "720p-10s-g60", {"fps": 10, "scale": 0.5, "anim_format": "webp"}),
+    ("to-apng/720p-10s-g60", "to-gif", "720p-10s-g60", {"fps": 10, "scale": 0.5, "anim_format": "apng"}),
+    ("convert-jpg/png-640x480x24", "convert", "png-640x480x24", {"fmt": "jpg"}),
+    ("convert-webp/jpg-1920x1080x24", "convert", "jpg-1920x1080x24", {"fmt": "webp"}),
+    ("convert-png/webp-1280x720x24", "convert", "webp-1280x720x24", {"fmt": "png"}),
+    ("grid-crop/png-4000x3000x1", "grid-crop", "png-4000x3000x1", {"cols": 4, "rows": 4}),
+    ("make-gif/png-640x480x24", "make-gif", "png-640x480x24", {"duration": 100}),
+    ("make-gif/jpg-1920x1080x24", "make-gif", "jpg-1920x1080x24", {"duration": 100}),
+]
+QUICK_CASES = [c for c in FULL_CASES if c[0] in (
+    "extract/360p-10s-g30", "extract/360p-10s-g250", "to-mp3/360p-60s-g250", "to-gif/360p-10s-g250",
+    "convert-jpg/png-640x480x24", "grid-crop/png-4000x3000x1", "make-gif/png-640x480x24",
+)]
+SUITES = {"quick": QUICK_CASES, "full": FULL_CASES}
+
+DEFAULT_TOLERANCE = 0.15
+# 绝对差值低于这些值时不算回退，避免极短用例的计时抖动
+MIN_TIME_DELTA = 0.05
+MIN_RSS_DELTA = 10 * 1024 * 1024
+
+
+def default_work_dir():
+    return os.path.join(tempfile.gettempdir(), "media_engine_bench")
+
+
+# ---------- 合成输入 ----------
+def make_test_video(path, width, height, duration, fps, gop):
+    """testsrc2 画面（有运动和色块）+ 440Hz 正弦波音轨，H.264 固定关键帧间隔"""
+    from .ffmpeg import run_ffmpeg
+    tmp_path = path + ".part.mp4"
+    run_ffmpeg([
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={duration}",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-c:a", "aac", "-b:a", "128k", "-shortest", tmp_path,
+    ])
+    os.replace(tmp_path, path)
+
+
+def make_test_images(directory, fmt, width, height, count, seed=0):
+    """渐变底色 + 随机色块 + 轻微噪声，压缩难度接近真实照片；同一种子生成的图片完全相同"""
+    import numpy as np
+    from PIL import Image
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.RandomState(seed)
+    ys, xs = np.mgrid[0:height, 0:width]
+    for i in range(count):
+        img = np.empty((height, width, 3), np.uint8)
+        img[..., 0] = (xs * 255 // max(width - 1, 1) + i * 10) % 256
+        img[..., 1] = ys * 255 // max(height - 1, 1)
+        img[..., 2] = ((xs + ys) // 4 + i * 30) % 256
+        for _ in range(12):
+            x0, y0 = rng.randint(0, width), rng.randint(0, height)
+            img[y0:y0 + height // 6, x0:x0 + width // 6] = rng.randint(0, 256, 3)
+        noise = rng.randint(-8, 9, img.shape, dtype=np.int16)
+        img = np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"img_{i:03d}.{fmt}")
+        tmp_path = os.path.join(directory, f".img_{i:03d}.part.{fmt}")
+        Image.fromarray(img).save(tmp_path, quality=90)
+        os.replace(tmp_path, path)
+
+
+def prepare_inputs(names, work_dir, log=None):
+    """生成（或复用已生成的）输入，返回 {名字: [文件, ...]}"""
+    inputs = {}
+    for name in names:
+        if name in VIDEO_SPECS:
+            path = os.path.join(work_dir, "inputs", f"{name}.mp4")
+            if not os.path.isfile(path):
+                if log:
+                    log(f"生成测试视频 {name} ...")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                make_test_video(path, *VIDEO_SPECS[name])
+            inputs[name] = [path]
+        elif name in IMAGE_SPECS:
+            fmt, width, height, count = IMAGE_SPECS[name]
+            directory = os.path.join(work_dir, "inputs", name)
+            files = [os.path.join(directory, f"img_{i:03d}.{fmt}") for i in range(count)]
+            if not all(os.path.isfile(f) for f in files):
+                if log:
+                    log(f"生成测试图片 {name} ...")
+                make_test_images(directory, fmt, width, height, count)
+            inputs[name] = files
+        else:
+            raise MediaError(f"未知的基准输入: {name}")
+    return inputs
+
+
+# ---------- 运行 ----------
+def run_pipeline(pipeline, files, output_dir, params):
+    """无界面执行一条管线，返回 (处理量, 单位)：帧、张，或音频的秒数"""
+    if pipeline == "extract":
+        from .video import extract_frames
+        return extract_frames(files[0], output_dir, params["count"]), "帧"
+    if pipeline == "to-mp3":
+        from .video import video_to_mp3
+        from .ffmpeg import probe_duration
+        video_to_mp3(files[0], output_dir)
+        return probe_duration(files[0]) or 0, "秒"
+    if pipeline == "to-gif":
+        from PIL import Image
+        from .video import video_to_gif
+        path = video_to_gif(files[0], output_dir, params["fps"], params["scale"],
+                            backend=params.get("backend", "opencv"),
+                            reuse_buffers=params.get("reuse_buffers", True),
+                            anim_format=params.get("anim_format", "gif"))
+        with Image.open(path) as im:
+            return im.n_frames, "帧"
+    if pipeline == "convert":
+        from .images import convert_images
+        result = convert_images(files, output_dir, params["fmt"])
+        if result.failed:
+            raise MediaError(f"转换失败: {result.failed[0][1]}")
+        return len(result.succeeded), "张"
+    if pipeline == "grid-crop":
+        from .images import grid_crop
+        return grid_crop(files[0], output_dir, params["cols"], params["rows"])[0], "张"
+    if pipeline == "make-gif":
+        from .images import make_gif
+        make_gif(files, os.path.join(output_dir, "out.gif"), params["duration"])
+        return len(files), "张"
+    raise MediaError(f"未知管线: {pipeline}")
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, names in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, n)) for n in names)
+    return total
+
+
+def _case_worker(pipeline, files, output_dir, params, conn):
+    try:
+        recorder = StageRecorder()
+        start = time.perf_counter()
+        with recording(recorder):
+            units, unit = run_pipeline(pipeline, files, output_dir, params)
+        wall = time.perf_counter() - start
+        allocations = recorder.snapshot().get("frame_alloc", (0, None))[1]
+        conn.send({"wall_s": wall, "units": units, "unit": unit, "peak_rss": peak_rss(), "allocations": allocations})
+    except BaseException as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_case(pipeline, files, output_dir, params):
+    """在新的子进程里跑一次，返回 {"wall_s", "units", "unit", "peak_rss", "output_bytes"}"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    p = ctx.Process(target=_case_worker, args=(pipeline, files, output_dir, params, child_conn))
+    p.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = None
+    p.join()
+    if result is None:
+        raise MediaError(f"子进程异常退出（退出码 {p.exitcode}）")
+    if "error" in result:
+        raise MediaError(result["error"])
+    result["output_bytes"] = _dir_size(output_dir)
+    return result
+
+
+def _unit_rate(unit):
+    return {"帧": "帧/秒", "张": "张/秒", "秒": "倍速"}.get(unit, f"{unit}/秒")
+
+
+def run_benchmarks(suite="quick", only=None, repeat=3, work_dir=None, log=None):
+    """
+    跑一组用例，每个重复 repeat 次取耗时中位数、内存最大值。
+    返回基准 JSON 结构：{"meta": {...}, "cases": {名字: {"pipeline", "wall_s", "throughput", "unit",
+    "peak_rss_mb", "output_bytes"[, "frame_allocs"]}}}；跑不了的用例记 {"error": ...}
+    """
+    if suite not in SUITES:
+        raise MediaError(f"未知的基准组: {suite}")
+    # only 为通配符列表，例如 ["extract/*", "to-gif*"]
+    cases = [c for c in SUITES[suite] if not only or any(fnmatch.fnmatch(c[0], pat) for pat in only)]
+    if not cases:
+        raise MediaError("没有匹配的基准用例")
+    work_dir = work_dir or default_work_dir()
+
+    # 输入用到时才生成；生成失败（例如没有 ffmpeg 时的测试视频）只影响用它的用例
+    inputs = {}
+    results = {}
+    for name, pipeline, input_name, params in cases:
+        if log:
+            log(f"运行 {name} ...")
+        output_dir = os.path.join(work_dir, "outputs", name.replace("/", "__"))
+        try:
+            if input_name not in inputs:
+                try:
+                    inputs.update(prepare_inputs([input_name], work_dir, log))
+                except MediaError as e:
+                    inputs[input_name] = e
+            if isinstance(inputs[input_name], MediaError):
+                raise MediaError(f"无法生成输入 {input_name}: {inputs[input_name]}")
+            runs = [run_case(pipeline, inputs[input_name], output_dir, params) for _ in range(max(1, repeat))]
+        except MediaError as e:
+            results[name] = {"pipeline": pipeline, "error": str(e)}
+            continue
+        wall = sorted(r["wall_s"] for r in runs)[len(runs) // 2]
+        rss = [r["peak_rss"] for r in runs if r["peak_rss"] is not None]
+        results[name] = {
+            "pipeline": pipeline,
+            "wall_s": round(wall, 4),
+            "throughput": round(runs[0]["units"] / wall, 2) if wall > 0 else None,
+            "unit": _unit_rate(runs[0]["unit"]),
+            "peak_rss_mb": round(max(rss) / 1024 / 1024, 1) if rss else None,
+            "output_bytes": runs[-1]["output_bytes"],
+        }
+        if runs[0]["allocations"] is not None:
+            results[name]["frame_allocs"] = runs[0]["allocations"]
+
+    return {
+        "meta": {
+            "version": __version__,
+            "suite": suite,
+            "repeat": repeat,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "cases": results,
+    }
+
+
+# ---------- 基准比较 ----------
+def load_baseline(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise MediaError(f"无法读取基准文件 {path}: {e}")
+
+
+def save_baseline(report_data, path):
+    tmp_path = path + ".part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report_data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def compare_results(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    逐用例比较耗时、峰值内存、输出大小，返回 [(用例, 指标, 基准值, 当前值, 变化比例, 是否回退), ...]。
+    只比较两边都有的用例和指标；比基准大超过 tolerance（且绝对差值不是计时抖动量级）记为回退。
+    """
+    rows = []
+    base_cases = baseline.get("cases", {})
+    for name, cur in current.get("cases", {}).items():
+        base = base_cases.get(name)
+        if not base or "error" in cur or "error" in base:
+            continue
+        for metric, min_delta in (("wall_s", MIN_TIME_DELTA), ("peak_rss_mb", MIN_RSS_DELTA / 1024 / 1024),
+                                  ("output_bytes", 0)):
+            old, new = base.get(metric), cur.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = change > tolerance and new - old > min_delta
+            rows.append((name, metric, old, new, change, regressed))
+    return rows
+
+
+def _format_metric(metric, value):
+    if metric == "wall_s":
+        return f"{value:.3f} s"
+    if metric == "peak_rss_mb":
+        return f"{value:.1f} MB"
+    from .cache import format_size
+    return format_size(value)
+
+
+def print_report(report_data, comparison=None, out=None):
+    out = out or sys.stdout
+    meta = report_data["meta"]
+    print(f"media_engine {meta['version']}，{meta['suite']} 组，每项 {meta['repeat']} 次取中位数"
+          f"（{meta['platform']}，{meta['cpu_count']} 核）", file=out)
+    print(f"{'用例':<32}{'耗时':>10}{'吞吐':>16}{'峰值内存':>12}{'输出':>12}", file=out)
+    for name, r in report_data["cases"].items():
+        if "error" in r:
+            print(f"{name:<32}  失败: {r['error']}", file=out)
+            continue
+        throughput = f"{r['throughput']:.1f} {r['unit']}" if r["throughput"] is not None else "-"
+        rss = f"{r['peak_rss_mb']:.0f} MB" if r["peak_rss_mb"] is not None else "-"
+        allocs = f"  帧数组分配 {r['frame_allocs']}" if "frame_allocs" in r else ""
+        print(f"{name:<32}{r['wall_s']:>9.3f}s{throughput:>16}{rss:>12}"
+              f"{_format_metric('output_bytes', r['output_bytes']):>12}{allocs}", file=out)
+
+    if comparison is None:
+        return
+    regressions = [row for row in comparison if row[5]]
+    print(f"\n与基准比较：{len(comparison)} 项指标，回退 {len(regressions)} 项", file=out)
+    for name, metric, old, new, change, regressed in comparison:
+        if regressed or change < -DEFAULT_TOLERANCE:
+            tag = "回退" if regressed else "改善"
+            print(f"  [{tag}] {name} {metric}: {_format_metric(metric, old)} -> {_format_metric(metric, new)}"
+                  f"（{change:+.0%}）", file=out)
+
+
+def run_bench_command(suite="quick", only=None, repeat=3, work_dir=None, baseline=None, save_to=None,
+                      tolerance=DEFAULT_TOLERANCE, out=None):
+    """命令行入口：跑基准、打印结果、与基准比较；返回是否没有回退（且没有失败的用例）"""
+    out = out or sys.stdout
+    data = run_benchmarks(suite, only, repeat, work_dir, log=lambda msg: print(msg, file=sys.stderr))
+    comparison = compare_results(data, load_baseline(baseline), tolerance) if baseline else None
+    print_report(data, comparison, out)
+    if save_to:
+        print(f"已保存基准: {save_baseline(data, save_to)}", file=out)
+    failed = any("error" in r for r in data["cases"].values())
+    return not failed and not (comparison and any(row[5] for row in comparison))
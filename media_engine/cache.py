@@ -0,0 +1,289 @@
+"""
+结果缓存：同一输入、同一操作和参数已经处理过时，直接从缓存还原输出，不再重新处理
+
+键 = 引擎版本 + 操作 + 影响输出的参数 + 输入指纹：
+- 默认指纹为 绝对路径 + 大小 + 修改时间（只 stat，不读文件）
+- content_hash=True 时改用文件名 + 内容的 SHA-256（换了目录、touch 过的文件也能命中）
+
+缓存目录下 index.db（sqlite）记录每项的输出文件、结果、大小和最近使用时间，
+objects/ 下存放输出文件的副本。总大小超过上限时按最近使用时间淘汰（LRU）。
+多个线程 / 进程可以同时使用同一个缓存目录。
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from . import __version__
+from .common import MediaError, media_name
+
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# 各操作中会影响输出内容的参数；写入线程数、抽帧策略、分段数这类只影响速度的参数不参与
+KEY_PARAMS = {
+    "extract": ("count", "fmt", "mode", "threshold", "dedup", "dedup_threshold", "sink"),
+    "to-gif": ("fps", "scale", "palette", "dither", "delta", "start", "end", "duration", "backend", "anim_format",
+               "anim_encode"),
+    "to-mp3": (),
+    "to-audio": ("audio_format", "copy"),
+    "convert": ("fmt", "encode"),
+    "grid-crop": ("cols", "rows", "fmt", "overlap", "encode", "sink"),
+}
+
+# fetch() 未命中时的返回值（结果本身可能是 None）
+MISS = object()
+
+
+def default_cache_dir():
+    """MEDIA_ENGINE_CACHE，或 $XDG_CACHE_HOME/media_engine（默认 ~/.cache/media_engine）"""
+    path = os.environ.get("MEDIA_ENGINE_CACHE")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "media_engine")
+
+
+def parse_size(text):
+    """"500M"、"2G"、"1048576" -> 字节数"""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    text = str(text).strip().upper().rstrip("B")
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise MediaError(f"无效的大小: {text}")
+
+
+def format_size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def output_files(op, input_path, params, result, since):
+    """列出一次处理在 output_dir 中产生的文件名（用于存入缓存）"""
+    output_dir = params["output_dir"]
+    name = media_name(input_path)
+    if op in ("to-gif", "to-mp3", "to-audio", "convert"):
+        return [os.path.basename(result)]
+    if op in ("extract", "grid-crop") and params.get("sink", "files") != "files":
+        from .sinks import packed_files
+        prefix = f"{name}_frames" if op == "extract" else f"{name}_tiles"
+        files = packed_files(output_dir, prefix)
+        if op == "extract" and params.get("dedup"):
+            files.append(f"{name}_frames.json")
+        return files
+    if op == "grid-crop":
+        fmt = params.get("fmt", "png").strip().lower()
+        return [f"{name}_{r+1:02d}_{c+1:02d}.{fmt}" for r in range(params["rows"]) for c in range(params["cols"])]
+    if op == "extract":
+        fmt = params.get("fmt", "jpg").strip().lower()
+        if not params.get("dedup") and params.get("mode", "uniform") != "keyframes":
+            # 序号与抽取位置一一对应（读取失败的位置留空）；断点续抽时前面的帧是上次写的，不能按修改时间筛
+            names = (f"{name}_{i:04d}.{fmt}" for i in range(1, result + 1))
+            return [n for n in names if os.path.isfile(os.path.join(output_dir, n))]
+        # 序号文件名 + 去重清单；只收这次写出的（目录里可能还有以前留下的同名前缀文件）
+        files = []
+        for entry in os.scandir(output_dir):
+            stem, ext = os.path.splitext(entry.name)
+            numbered = stem.startswith(f"{name}_") and stem[len(name) + 1:].isdigit() and ext == f".{fmt}"
+            if (numbered or entry.name == f"{name}_frames.json") and entry.stat().st_mtime >= since - 1:
+                files.append(entry.name)
+        return sorted(files)
+    raise MediaError(f"未知操作: {op}")
+
+
+class ResultCache:
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES, content_hash=False):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.content_hash = content_hash
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, op TEXT, input TEXT, params TEXT, files TEXT, result TEXT,"
+                " size INTEGER, created REAL, last_used REAL, hits INTEGER DEFAULT 0)"
+            )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # 每次操作单独连接：sqlite 连接不能跨线程共用
+        db = sqlite3.connect(os.path.join(self.root, "index.db"), timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _object_dir(self, key):
+        return os.path.join(self.root, "objects", key[:2], key)
+
+    # ---------- 键 ----------
+    def fingerprint(self, input_path):
+        st = os.stat(input_path)
+        if not self.content_hash:
+            return {"path": os.path.abspath(input_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        h = hashlib.sha256()
+        with open(input_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        # 输出文件名由输入文件名决定，所以文件名也要参与
+        return {"sha256": h.hexdigest(), "size": st.st_size, "name": os.path.basename(input_path)}
+
+    def key(self, op, input_path, params):
+        if op not in KEY_PARAMS:
+            raise MediaError(f"未知操作: {op}")
+        data = {
+            "version": __version__,
+            "op": op,
+            "params": {k: params.get(k) for k in KEY_PARAMS[op]},
+            "input": self.fingerprint(input_path),
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+    # ---------- 读写 ----------
+    def fetch(self, key, output_dir):
+        """命中时把输出还原到 output_dir（已存在且大小相同的文件不重复复制），返回结果；未命中返回 MISS"""
+        with self._connect() as db:
+            row = db.execute("SELECT files, result FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return MISS
+        files, result = json.loads(row[0]), json.loads(row[1])
+        obj_dir = self._object_dir(key)
+        if not all(os.path.isfile(os.path.join(obj_dir, f)) for f in files):
+            self._remove(key)   # 缓存文件被外部删掉了，当作未命中
+            return MISS
+
+        os.makedirs(output_dir, exist_ok=True)
+        for f in files:
+            src = os.path.join(obj_dir, f)
+            dst = os.path.join(output_dir, f)
+            if os.path.isfile(dst) and os.path.getsize(dst) == os.path.getsize(src):
+                continue
+            shutil.copy2(src, dst)
+
+        with self._connect() as db:
+            db.execute("UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        return self._decode_result(result, output_dir)
+
+    def store(self, key, op, input_path, params, files, result):
+        output_dir = params["output_dir"]
+        obj_dir = self._object_dir(key)
+        tmp_dir = f"{obj_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        size = 0
+        try:
+            for f in files:
+                shutil.copy2(os.path.join(output_dir, f), os.path.join(tmp_dir, f))
+                size += os.path.getsize(os.path.join(tmp_dir, f))
+            shutil.rmtree(obj_dir, ignore_errors=True)
+            os.replace(tmp_dir, obj_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, op, input, params, files, result, size, created, last_used, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, op, os.path.abspath(input_path), json.dumps({k: params.get(k) for k in KEY_PARAMS[op]}),
+                 json.dumps(files), json.dumps(self._encode_result(result, output_dir)), size, now, now),
+            )
+        self.evict()
+
+    def run(self, op, input_path, params, run):
+        """
+        缓存包装：命中返回 (结果, True)；否则执行 run()，存入缓存后返回 (结果, False)。
+        params 需包含 output_dir 以及 KEY_PARAMS[op] 中的参数。
+        """
+        key = self.key(op, input_path, params)
+        result = self.fetch(key, params["output_dir"])
+        if result is not MISS:
+            return result, True
+        started = time.time()
+        result = run()
+        self.store(key, op, input_path, params, output_files(op, input_path, params, result, started), result)
+        return result, False
+
+    @staticmethod
+    def _encode_result(result, output_dir):
+        # 输出路径只存文件名，还原到别的输出目录时重新拼接
+        if isinstance(result, str) and os.path.dirname(os.path.abspath(result)) == os.path.abspath(output_dir):
+            return {"file": os.path.basename(result)}
+        return {"value": result}
+
+    @staticmethod
+    def _decode_result(data, output_dir):
+        if "file" in data:
+            return os.path.join(output_dir, data["file"])
+        value = data["value"]
+        return tuple(value) if isinstance(value, list) else value
+
+    # ---------- 查看 / 清理 ----------
+    def entries(self):
+        """按最近使用时间从新到旧列出：[{"key", "op", "input", "params", "files", "size", "created", "last_used", "hits"}]"""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT key, op, input, params, files, size, created, last_used, hits FROM entries"
+                " ORDER BY last_used DESC"
+            ).fetchall()
+        return [
+            {"key": r[0], "op": r[1], "input": r[2], "params": json.loads(r[3]), "files": len(json.loads(r[4])),
+             "size": r[5], "created": r[6], "last_used": r[7], "hits": r[8]}
+            for r in rows
+        ]
+
+    def stats(self):
+        with self._connect() as db:
+            count, size, hits = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) "
+                                           "FROM entries").fetchone()
+        return {"root": self.root, "entries": count, "size": size, "max_bytes": self.max_bytes, "hits": hits}
+
+    def evict(self, max_bytes=None):
+        """总大小超过上限时从最久未使用的开始删除，返回 (删除项数, 释放字节数)"""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._connect() as db:
+            rows = db.execute("SELECT key, size FROM entries ORDER BY last_used DESC").fetchall()
+        total = sum(size for _, size in rows)
+        removed = freed = 0
+        while rows and total > limit:
+            key, size = rows.pop()
+            self._remove(key)
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
+
+    def prune(self, max_bytes=None, older_than=None, clear=False):
+        """
+        清理缓存：clear 删除全部；older_than（秒）删除超过该时间未使用的；
+        再按 max_bytes（默认为缓存上限）做 LRU 淘汰。返回 (删除项数, 释放字节数)
+        """
+        removed = freed = 0
+        if clear or older_than is not None:
+            cutoff = time.time() - (older_than or 0)
+            with self._connect() as db:
+                rows = db.execute("SELECT key, size FROM entries WHERE ? OR last_used < ?",
+                                  (1 if clear else 0, cutoff)).fetchall()
+            for key, size in rows:
+                self._remove(key)
+                removed += 1
+                freed += size
+        more, more_freed = self.evict(max_bytes)
+        return removed + more, freed + more_freed
+
+    def _remove(self, key):
+        with self._connect() as db:
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        shutil.rmtree(self._object_dir(key), ignore_errors=True)
@@ -0,0 +1,131 @@
+"""
+断点续传：长任务一边处理一边写清单（已完成的序号或文件、参数、输入指纹），
+中断（崩溃、取消、进程被杀）后用相同参数重新运行时跳过已完成的部分。
+
+- 清单是输出目录里的隐藏文件 .{名称}.checkpoint.json，序号按区间压缩存储
+- 先写临时文件再替换：任何时刻被杀，留下的都是上一份完整的清单
+- 最多每 interval 秒落盘一次；正常结束时删除清单，出错或取消时写出最终清单
+- 参数或输入文件（大小、修改时间）变了，旧清单作废，从头开始
+"""
+
+import json
+import os
+import threading
+import time
+
+
+CHECKPOINT_VERSION = 1
+
+# 清单最短落盘间隔（秒）
+SAVE_INTERVAL = 1.0
+
+
+def checkpoint_path(output_dir, name):
+    return os.path.join(output_dir, f".{name}.checkpoint.json")
+
+
+def input_fingerprint(path):
+    st = os.stat(path)
+    return {"name": os.path.basename(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def pack_ranges(numbers):
+    """{0, 1, 2, 5, 7, 8} -> [[0, 2], [5, 5], [7, 8]]"""
+    ranges = []
+    for n in sorted(numbers):
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ranges
+
+
+def unpack_ranges(ranges):
+    return {n for a, b in ranges for n in range(a, b + 1)}
+
+
+class Checkpoint:
+    """
+    已完成条目（整数序号或字符串）的集合，线程安全：写入线程可以直接 mark()。
+    用作上下文管理器：正常退出时删除清单，异常退出时保存。
+    """
+
+    def __init__(self, path, op, params, fingerprint=None, interval=SAVE_INTERVAL):
+        self.path = path
+        self.op = op
+        # 经过一次 JSON 往返，与读回的清单比较时元组 / 列表不会被当成不同
+        self.params = json.loads(json.dumps(params))
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.done = set()
+        self._lock = threading.Lock()
+        self._last_save = time.monotonic()
+        self._load()
+        self.resumed = len(self.done)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (data.get("version") != CHECKPOINT_VERSION or data.get("op") != self.op
+                or data.get("params") != self.params or data.get("input") != self.fingerprint):
+            return
+        self.done = unpack_ranges(data.get("indices", [])) | set(data.get("files", []))
+
+    def __contains__(self, item):
+        return item in self.done
+
+    def discard(self, item):
+        """清单里有、但输出已经不在了的条目，重新处理"""
+        with self._lock:
+            self.done.discard(item)
+
+    def mark(self, item):
+        with self._lock:
+            self.done.add(item)
+            if time.monotonic() - self._last_save >= self.interval:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        indices = [x for x in self.done if isinstance(x, int)]
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "op": self.op,
+            "params": self.params,
+            "input": self.fingerprint,
+            "indices": pack_ranges(indices),
+            "files": sorted(x for x in self.done if not isinstance(x, int)),
+            "updated": time.time(),
+        }
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self._last_save = time.monotonic()
+
+    def finish(self):
+        """全部完成：删除清单"""
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish()
+        else:
+            try:
+                self.save()
+            except OSError:
+                pass   # 保留原始异常
+        return False
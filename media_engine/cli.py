@@ -0,0 +1,747 @@
+"""
+命令行入口：python -m media_engine <命令> ...
+
+  extract    视频抽帧
+  to-mp3     视频提取音频为 MP3
+  to-audio   视频提取音频，编码兼容时直接流复制
+  to-gif     视频转 GIF
+  convert    图片格式转换
+  grid-crop  图片网格裁剪
+  make-gif   多张图片合成 GIF
+  batch      多个视频 x 多个操作，进任务队列并发执行
+  watch      监视文件夹，新文件写完后自动处理，完成 / 失败的输入分别移走
+  cache      查看或清理结果缓存（各处理命令加 --cache 启用）
+  startup    检查启动耗时与导入排行
+  bench      用合成输入跑各管线的基准测试，并与保存的基准比较
+
+输入可以是文件、目录或通配符（支持 **），可一次给多个。
+图片转换和网格裁剪可用 --preset fast/balanced/smallest 取舍编码速度与体积，--estimate 只试编码、预估各预设的结果。
+抽帧可用 --pack tar/zip/npy/sprite、网格裁剪可用 --pack tar/zip 写成少数几个大文件加索引，而不是成千上万个小文件。
+to-gif / make-gif 可用 --anim-format webp/apng 输出动画 WebP / APNG，--compare-gif 在报告里与 GIF 对比体积和耗时。
+处理命令加 --stats 打印分阶段耗时，--report FILE 写出 JSON 任务报告（可配合 --profile / --trace-memory）。
+各命令的处理模块在执行时才导入，解析参数和 --version 不会加载 cv2 / PIL / numpy。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import signal
+import sys
+import time
+
+from . import __version__
+from .common import (
+    ANIMATION_FORMATS, AUDIO_FORMATS, DEDUP_METHODS, ENCODE_PRESETS, EXTRACT_MODES, EXTRACT_STRATEGIES, GIF_BACKENDS,
+    GIF_DITHER_MODES, GIF_PALETTE_MODES, IMAGE_EXTS, OUTPUT_SINKS, TILE_SINKS, VIDEO_EXTS, expand_inputs,
+    guess_animation_format,
+)
+
+
+class ConsoleProgress:
+    """
+    终端输出，作为事件总线的订阅者在 EventPump 线程里调用（所有输出都经过它，不会互相打断）：
+    - 进度：交互终端下原地刷新一行（频率由 EventPump 决定）；非终端不输出中间进度。
+      事件带 show_message 时显示引擎给出的文字（进度单位不是“个”时，例如音频的毫秒）
+    - 其余事件：先清掉进度行，再打印 message；失败和带 stderr 标记的打印到 stderr
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self.interactive = self.stream.isatty()
+
+    def __call__(self, event):
+        if event.kind == "progress":
+            if self.interactive:
+                show_message = event.data.get("show_message") or not event.total
+                text = event.message if show_message else f"{event.done}/{event.total}"
+                self.stream.write(f"\r{event.source}: {text}\033[K")
+                self.stream.flush()
+            return
+        self.clear()
+        if event.message:
+            out = sys.stderr if event.kind == "failed" or event.data.get("stderr") else sys.stdout
+            print(event.message, file=out, flush=True)
+
+    def clear(self):
+        if self.interactive:
+            self.stream.write("\r\033[K")
+            self.stream.flush()
+
+
+def _open_events(args):
+    """命令行的事件总线：终端输出，给了 --log 时同时写日志文件"""
+    from .events import EventBus, log_handler
+
+    events = EventBus()
+    events.subscribe(ConsoleProgress())
+    if args.log:
+        import logging
+        from .events import logger
+        handler = logging.FileHandler(args.log, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        events.subscribe(log_handler())
+    return events
+
+
+class ReportSink:
+    """
+    --stats / --report / --profile / --trace-memory：为每个任务计时，
+    --stats 时逐个打印到 stderr，--report 时结束后把全部报告写成一个 JSON 文件。
+    都没给时 profiler() 返回空的上下文，不做任何计时。
+    """
+
+    def __init__(self, args, events):
+        self.events = events
+        self.path = getattr(args, "report", None)
+        self.stats = getattr(args, "stats", False)
+        self.profile = getattr(args, "profile", False)
+        self.trace_memory = getattr(args, "trace_memory", False)
+        # --compare-gif 的结果只出现在任务报告里
+        self.enabled = bool(self.path or self.stats or self.profile or self.trace_memory
+                            or getattr(args, "compare_gif", False))
+        self.reports = []
+
+    def profiler(self, op, inputs):
+        if not self.enabled:
+            return None
+        from .profiling import JobProfile
+        return JobProfile(op, inputs, self.profile, self.trace_memory)
+
+    def add(self, label, report):
+        if report is None:
+            return
+        self.reports.append(report)
+        if self.stats or (self.enabled and not self.path):
+            from .profiling import format_report
+            text = io.StringIO()
+            format_report(report, text)
+            self.events.post(label, "log", f"[统计] {label}\n{text.getvalue().rstrip()}", stderr=True)
+
+    def close(self):
+        if self.path:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"jobs": self.reports}, f, ensure_ascii=False, indent=2)
+            self.events.post("报告", "log", f"[报告] {self.path}", stderr=True)
+
+
+def _run_each(files, label, func, events, show_message=False, cache=None, op=None, params=None, describe=str,
+              sink=None):
+    """
+    对每个输入文件执行 func(path, progress)，单个失败不影响其余，返回失败数。进度和结果都发到 events。
+    给出 cache 时按 op / params 查结果缓存，命中的直接还原输出；给出 sink 时为每个文件生成计时报告。
+    """
+    failed = 0
+    for path in files:
+        source = f"{label} {path}"
+        progress = events.progress(source, show_message=show_message)
+        prof = sink.profiler(op, [path]) if sink is not None else None
+        try:
+            with prof or contextlib.nullcontext():
+                if cache is not None:
+                    result, hit = cache.run(op, path, params, lambda: func(path, progress))
+                else:
+                    result, hit = func(path, progress), False
+            events.post(source, "finished", f"[{'缓存' if hit else '完成'}] {path} -> {describe(result)}")
+            if prof is not None:
+                from .jobs import job_outputs
+                sink.add(path, prof.report(result, job_outputs(op, path, params, result, prof.started), cached=hit))
+        except Exception as e:
+            failed += 1
+            events.post(source, "failed", f"[失败] {path}: {e}")
+            if prof is not None:
+                sink.add(path, prof.report())
+    return failed
+
+
+def _open_cache(args):
+    """--cache 时打开结果缓存，否则返回 None"""
+    if not args.cache:
+        return None
+    from .cache import ResultCache, parse_size
+    return ResultCache(args.cache_dir, parse_size(args.cache_size), args.content_hash)
+
+
+def cmd_extract(args, files, sink, events):
+    from .video import extract_frames
+    params = {
+        "output_dir": args.output_dir, "count": args.count, "fmt": args.format, "mode": args.mode,
+        "threshold": args.threshold, "dedup": args.dedup, "dedup_threshold": args.dedup_threshold,
+        "sink": args.pack,
+    }
+    return _run_each(files, "抽帧", lambda path, progress: extract_frames(
+        path, args.output_dir, args.count, args.format, args.strategy, args.writers, progress,
+        mode=args.mode, threshold=args.threshold, dedup=args.dedup, dedup_threshold=args.dedup_threshold,
+        checkpoint=args.checkpoint, segments=args.segments, sink=args.pack,
+    ), events, cache=_open_cache(args), op="extract", params=params, sink=sink)
+
+
+def cmd_to_mp3(args, files, sink, events):
+    from .video import video_to_mp3
+    return _run_each(files, "提取音频", lambda path, progress: video_to_mp3(
+        path, args.output_dir, progress
+    ), events, show_message=True, cache=_open_cache(args), op="to-mp3", params={"output_dir": args.output_dir},
+        sink=sink)
+
+
+def cmd_to_audio(args, files, sink, events):
+    from .audio import extract_audio
+    params = {"output_dir": args.output_dir, "audio_format": args.format, "copy": args.copy}
+    return _run_each(files, "提取音频", lambda path, progress: extract_audio(
+        path, args.output_dir, args.format, args.copy, progress
+    ), events, show_message=True, cache=_open_cache(args), op="to-audio", params=params, sink=sink)
+
+
+def cmd_to_gif(args, files, sink, events):
+    from .video import video_to_gif
+    anim_format = args.anim_format or "gif"
+    anim_encode = _anim_encode(args, anim_format)
+    params = {
+        "output_dir": args.output_dir, "fps": args.fps, "scale": args.scale, "palette": args.palette,
+        "dither": args.dither, "delta": args.delta, "start": args.start, "end": args.end,
+        "duration": args.duration, "backend": args.backend, "segments": args.segments,
+        "anim_format": anim_format, "anim_encode": anim_encode,
+    }
+    return _run_each(files, f"转{anim_format.upper()}", lambda path, progress: video_to_gif(
+        path, args.output_dir, args.fps, args.scale, args.palette, args.dither, args.delta, progress,
+        start=args.start, end=args.end, duration=args.duration, backend=args.backend, segments=args.segments,
+        anim_format=anim_format, anim_encode=anim_encode, compare_gif=args.compare_gif,
+    ), events, cache=_open_cache(args), op="to-gif", params=params, sink=sink)
+
+
+def cmd_convert(args, files, sink, events):
+    from .images import convert_images
+    progress = events.progress("图片转换")
+    encode = _encode_options(args)
+    if args.estimate:
+        return _estimate(args, files, events)
+    prof = sink.profiler("convert", files)
+    with prof or contextlib.nullcontext():
+        result = convert_images(files, args.output_dir, args.format, progress, args.workers, args.skip_existing,
+                                _open_cache(args), checkpoint=args.checkpoint, encode=encode)
+    for path, reason in result.skipped:
+        events.post(path, "log", f"[跳过] {path}: {reason}")
+    for path, error in result.failed:
+        events.post(path, "failed", f"[失败] {path}: {error}")
+    events.post("图片转换", "finished", f"[完成] {result.summary()} -> {args.output_dir}")
+    if prof is not None:
+        sink.add(f"{len(files)} 张图片", prof.report(result, result.succeeded + result.cached))
+    return len(result.failed)
+
+
+def cmd_grid_crop(args, files, sink, events):
+    from .images import grid_crop
+    encode = _encode_options(args)
+    if args.estimate:
+        # 切片之和与整图编码的体积、耗时相近，直接按整图估算
+        return _estimate(args, files, events)
+    params = {"output_dir": args.output_dir, "cols": args.cols, "rows": args.rows, "fmt": args.format,
+              "overlap": args.overlap, "encode": encode, "sink": args.pack}
+    return _run_each(files, "网格裁剪", lambda path, progress: grid_crop(
+        path, args.output_dir, args.cols, args.rows, args.format, progress, args.overlap, args.workers, encode,
+        args.pack,
+    ), events, cache=_open_cache(args), op="grid-crop", params=params,
+        describe=lambda r: f"{r[0]} 张 {r[1]}x{r[2]}", sink=sink)
+
+
+def _encode_options(args):
+    from .encoders import encode_options
+    return encode_options(args.format, args.preset, quality=args.quality, optimize=args.optimize,
+                          progressive=args.progressive, subsampling=args.subsampling,
+                          compress_level=args.compress_level, method=args.method, lossless=args.lossless)
+
+
+def _estimate(args, files, events):
+    from .encoders import estimate_presets, format_estimates
+    estimates = estimate_presets(files, args.format, args.samples, args.workers, events.progress("试编码"),
+                                 quality=args.quality, optimize=args.optimize, progressive=args.progressive,
+                                 subsampling=args.subsampling, compress_level=args.compress_level,
+                                 method=args.method, lossless=args.lossless)
+    text = io.StringIO()
+    format_estimates(estimates, text)
+    events.post("试编码", "finished", f"[预估] {len(files)} 张图片 -> {args.format}（抽样 {min(args.samples, len(files))} 张）\n"
+                f"{text.getvalue().rstrip()}")
+    return 0
+
+
+def cmd_make_gif(args, files, sink, events):
+    from .images import make_gif
+    progress = events.progress("合成GIF")
+    anim_format = args.anim_format or guess_animation_format(args.output)
+    prof = sink.profiler("make-gif", files)
+    with prof or contextlib.nullcontext():
+        output_path = make_gif(files, args.output, args.duration, args.loop, args.palette, args.dither,
+                               args.delta, progress, args.max_side, args.workers, anim_format,
+                               _anim_encode(args, anim_format), args.compare_gif)
+    events.post("合成GIF", "finished", f"[完成] {output_path}")
+    if prof is not None:
+        sink.add(output_path, prof.report(output_path, [output_path]))
+    return 0
+
+
+def cmd_batch(args, files, sink, events):
+    from .jobs import JobScheduler
+
+    ops = args.ops or ["extract"]
+    finished = {"done": 0, "failed": 0, "cancelled": 0}
+
+    def on_update(job):
+        # 工作线程里调用：只往事件总线里写
+        if job.status in finished and not getattr(job, "_reported", False):
+            job._reported = True
+            finished[job.status] += 1
+            source = f"#{job.id} {job.op} {job.input_path}"
+            if job.status == "done":
+                tag = "缓存" if job.cached else "完成"
+                events.post(source, "finished", f"[{tag}] {source} -> {job.result}")
+                sink.add(source, job.report if sink.enabled else None)
+            elif job.status == "failed":
+                events.post(source, "failed", f"[失败] {source}: {job.error}")
+            else:
+                events.post(source, "cancelled", f"[取消] {source}")
+
+    scheduler = JobScheduler(args.cpu_workers, args.io_workers, on_update=on_update, cache=_open_cache(args),
+                             profile=args.profile, trace_memory=args.trace_memory)
+    params = {
+        "output_dir": args.output_dir,
+        "count": args.count, "fmt": args.format, "strategy": args.strategy, "writers": args.writers,
+        "mode": args.mode, "threshold": args.threshold,
+        "dedup": args.dedup, "dedup_threshold": args.dedup_threshold,
+        "fps": args.fps, "scale": args.scale, "palette": args.palette, "dither": args.dither, "delta": args.delta,
+        "start": args.start, "end": args.end, "duration": args.duration, "backend": args.backend,
+        "audio_format": args.audio_format, "copy": args.copy, "checkpoint": args.checkpoint,
+        "segments": args.segments, "sink": args.pack,
+        "anim_format": args.anim_format or "gif", "anim_encode": _anim_encode(args, args.anim_format),
+        "compare_gif": args.compare_gif,
+    }
+    for path in files:
+        for op in ops:
+            scheduler.submit(op, path, args.priority, args.retries, **params)
+
+    try:
+        while not scheduler.wait(timeout=1.0):
+            st = scheduler.stats()
+            events.update("队列", st["files"], None,
+                          f"进行中 {st['counts']['running']}，排队 {st['counts']['queued']}，"
+                          f"{st['files_per_min']:.1f} 文件/分钟，{st['frames_per_s']:.1f} 帧/秒")
+    except KeyboardInterrupt:
+        scheduler.shutdown(wait=True, cancel_pending=True)
+        raise
+    scheduler.shutdown()
+
+    st = scheduler.stats()
+    events.post("队列", "finished", f"[汇总] 完成 {finished['done']}，失败 {finished['failed']}，取消 {finished['cancelled']}；"
+          f"用时 {st['elapsed']:.1f} 秒，{st['files_per_min']:.1f} 文件/分钟，{st['frames_per_s']:.1f} 帧/秒"
+          f"（CPU 线程 {st['workers']['cpu']}，I/O 线程 {st['workers']['io']}）")
+    return finished["failed"]
+
+
+def cmd_watch(args, dirs, sink, events):
+    from .jobs import JobScheduler
+    from .watch import FolderWatcher, default_rules
+
+    def on_update(job):
+        if job.status == "done" and sink.enabled and not getattr(job, "_reported", False):
+            job._reported = True
+            sink.add(f"#{job.id} {job.op} {job.input_path}", job.report)
+
+    def on_file(path, status, message):
+        tag = {"ready": "就绪", "done": "完成", "failed": "失败", "skipped": "跳过"}[status]
+        kind = {"ready": "started", "done": "finished", "failed": "failed", "skipped": "log"}[status]
+        events.post(path, kind, f"[{tag}] {path}: {message}")
+
+    def on_tick(st):
+        events.update("监视", st["done"] + st["failed"], None,
+                      f"等待写完 {st['pending']}，处理中 {st['inflight']}，完成 {st['done']}，失败 {st['failed']}，"
+                      f"{st['files_per_min']:.1f} 文件/分钟（{st['source']}）")
+        # 长时间运行：结束的任务不留在调度器里
+        scheduler.clear_finished()
+
+    scheduler = JobScheduler(args.cpu_workers, args.io_workers, on_update=on_update, cache=_open_cache(args),
+                             profile=args.profile, trace_memory=args.trace_memory)
+    image_format = None if args.image_format == "none" else args.image_format
+    rules = default_rules(args.output_dir, args.video_ops or ["extract", "to-mp3"], image_format, args.count)
+    try:
+        watcher = FolderWatcher(dirs, rules, scheduler, args.done_dir, args.failed_dir, args.settle,
+                                max_pending=args.max_pending, poll=args.poll, on_file=on_file)
+        events.post("监视", "log", f"监视 {', '.join(watcher.dirs)} -> {args.output_dir}"
+                                   f"（完成移到 {watcher.done_dir}，失败移到 {watcher.failed_dir}，Ctrl+C 停止）")
+        watcher.run(once=args.once, on_tick=on_tick)
+    except KeyboardInterrupt:
+        scheduler.shutdown(wait=True, cancel_pending=True)
+        raise
+    except BaseException:
+        scheduler.shutdown(wait=False, cancel_pending=True)
+        raise
+    scheduler.shutdown()
+
+    st = watcher.stats()
+    events.post("监视", "finished", f"[汇总] 完成 {st['done']}，失败 {st['failed']}，跳过 {st['skipped']}；"
+                                    f"用时 {st['elapsed']:.1f} 秒，{st['files_per_min']:.1f} 文件/分钟")
+    return st["failed"]
+
+
+def cmd_cache(args):
+    from .cache import ResultCache, format_size, parse_size
+
+    cache = ResultCache(args.cache_dir, parse_size(args.cache_size))
+    if args.action == "prune":
+        max_bytes = parse_size(args.max_size) if args.max_size else None
+        older_than = args.older_than * 86400 if args.older_than is not None else None
+        removed, freed = cache.prune(max_bytes, older_than, args.all)
+        print(f"已删除 {removed} 项，释放 {format_size(freed)}")
+    elif args.action == "list":
+        for e in cache.entries()[:args.limit]:
+            used = time.strftime("%Y-%m-%d %H:%M", time.localtime(e["last_used"]))
+            params = " ".join(f"{k}={v}" for k, v in e["params"].items() if v is not None)
+            print(f"{used}  {format_size(e['size']):>9}  命中 {e['hits']:<3} {e['op']:<9} {e['input']}  {params}")
+
+    st = cache.stats()
+    print(f"缓存目录: {st['root']}")
+    print(f"共 {st['entries']} 项，{format_size(st['size'])} / 上限 {format_size(st['max_bytes'])}，累计命中 {st['hits']} 次")
+    return 0
+
+
+def cmd_startup(args):
+    from .startup import run_startup_check
+    ok = run_startup_check(args.budget, args.runs, args.module, args.top)
+    return 0 if ok else 1
+
+
+def cmd_bench(args):
+    from .bench import run_bench_command
+    ok = run_bench_command(args.suite, args.only, args.repeat, args.work_dir, args.baseline, args.save_baseline,
+                           args.tolerance)
+    return 0 if ok else 1
+
+
+def _add_gif_options(p):
+    p.add_argument("--palette", default="global", choices=GIF_PALETTE_MODES, help="调色板模式")
+    p.add_argument("--dither", default="none", choices=GIF_DITHER_MODES, help="抖动方式")
+    p.add_argument("--no-delta", dest="delta", action="store_false", help="关闭差分帧")
+    g = p.add_argument_group("动画 WebP / APNG（不做调色板量化，上面的调色板和抖动选项只对 GIF 有效）")
+    g.add_argument("--anim-format", default=None, choices=ANIMATION_FORMATS,
+                   help="输出格式（默认 gif；make-gif 按输出文件扩展名判断）")
+    g.add_argument("--anim-preset", default="balanced", choices=ENCODE_PRESETS, help="编码速度与体积的取舍")
+    g.add_argument("--anim-quality", type=int, default=None, help="WebP 画质 1~100")
+    g.add_argument("--anim-method", type=int, default=None, help="WebP 压缩方法 0（快）~6（小）")
+    g.add_argument("--lossless", action=argparse.BooleanOptionalAction, default=None, help="WebP 无损")
+    g.add_argument("--anim-compress-level", type=int, default=None, help="APNG zlib 压缩级别 0~9")
+    g.add_argument("--compare-gif", action="store_true",
+                   help="同样的帧再编码一份 GIF（不保留），在计时报告里对比体积和编码耗时")
+
+
+def _anim_encode(args, anim_format):
+    """--anim-* 参数 -> 动画编码参数；GIF 返回 None"""
+    if anim_format in (None, "gif"):
+        return None
+    from .encoders import encode_options
+    return encode_options(anim_format, args.anim_preset, quality=args.anim_quality, method=args.anim_method,
+                          lossless=args.lossless, compress_level=args.anim_compress_level)
+
+
+def _add_clip_options(p):
+    p.add_argument("--start", default=None, help="开始时间，秒或 mm:ss / hh:mm:ss（默认从头）")
+    p.add_argument("--end", default=None, help="结束时间（默认到结尾）")
+    p.add_argument("--duration", default=None, help="时长，与 --end 二选一")
+    p.add_argument("--backend", default="opencv", choices=GIF_BACKENDS,
+                   help="opencv：逐帧解码后自行量化；ffmpeg：palettegen/paletteuse 一条管线完成")
+
+
+def _add_cache_options(p, with_switch=True):
+    if with_switch:
+        p.add_argument("--cache", action="store_true", help="使用结果缓存：输入和参数都没变时直接还原上次的输出")
+        p.add_argument("--content-hash", action="store_true",
+                       help="按文件内容（SHA-256）而不是路径+大小+修改时间识别输入")
+    p.add_argument("--cache-dir", default=None, help="缓存目录（默认 $MEDIA_ENGINE_CACHE 或 ~/.cache/media_engine）")
+    p.add_argument("--cache-size", default="2G", help="缓存大小上限，超出时淘汰最久未用的（默认 2G）")
+
+
+def _add_checkpoint_option(p):
+    p.add_argument("--no-checkpoint", dest="checkpoint", action="store_false",
+                   help="不记断点清单（默认记录：中断或 Ctrl+C 后重跑同样的命令，跳过已完成的部分）")
+
+
+def _segment_count(value):
+    from .segments import default_segment_count
+    n = int(value)
+    if n < 0:
+        raise argparse.ArgumentTypeError("段数不能为负数")
+    return n or default_segment_count()
+
+
+_PACK_HELP = {
+    "files": "files 每张一个文件（默认）",
+    "tar": "tar / zip 未压缩归档",
+    "npy": "npy 原始 RGB 数组",
+    "sprite": "sprite 缩略图拼图",
+}
+
+
+def _add_pack_option(p, choices=OUTPUT_SINKS):
+    # 帮助里只列出该命令支持的方式
+    kinds = "；".join(text for name, text in _PACK_HELP.items() if name in choices)
+    p.add_argument("--pack", default="files", choices=choices,
+                   help=f"输出方式：{kinds}。打包时另写 .index.json 索引（偏移、时间、位置），可随机读取单张")
+
+
+def _add_segments_option(p):
+    p.add_argument("--segments", type=_segment_count, default=1,
+                   help="按关键帧把视频切成 N 段，在 N 个进程里并行解码（0 为 CPU 核数；默认 1 不分段）")
+
+
+def _add_encode_options(p):
+    g = p.add_argument_group("编码参数（显式给出的覆盖预设中的同名项）")
+    g.add_argument("--preset", default="balanced", choices=ENCODE_PRESETS,
+                   help="fast 压缩最快、文件较大；smallest 最慢、文件最小；balanced 为默认参数（画质都相同）")
+    g.add_argument("--quality", type=int, default=None, help="JPEG / WebP 画质 1~100")
+    g.add_argument("--progressive", action=argparse.BooleanOptionalAction, default=None, help="JPEG 渐进式")
+    g.add_argument("--optimize", action=argparse.BooleanOptionalAction, default=None,
+                   help="JPEG 优化霍夫曼表 / PNG 额外压缩")
+    g.add_argument("--subsampling", default=None, choices=["4:4:4", "4:2:2", "4:2:0"], help="JPEG 色度抽样")
+    g.add_argument("--compress-level", type=int, default=None, help="PNG zlib 压缩级别 0~9")
+    g.add_argument("--method", type=int, default=None, help="WebP 压缩方法 0（快）~6（小）")
+    g.add_argument("--lossless", action=argparse.BooleanOptionalAction, default=None, help="WebP 无损")
+    g.add_argument("--estimate", action="store_true",
+                   help="不写文件：抽几张图片用各预设试编码，预估整批的输出大小和用时")
+    g.add_argument("--samples", type=int, default=5, help="--estimate 抽样张数（默认 5）")
+
+
+def _add_report_options(p):
+    p.add_argument("--stats", action="store_true", help="每个任务结束后打印分阶段耗时、吞吐、读写字节和内存峰值")
+    p.add_argument("--report", default=None, help="把全部任务的计时报告写入该 JSON 文件")
+    p.add_argument("--profile", action="store_true", help="报告中附带 cProfile 函数耗时排行")
+    p.add_argument("--trace-memory", action="store_true", help="用 tracemalloc 统计 Python 内存分配峰值（会变慢）")
+    p.add_argument("--log", default=None, help="把进度和结果事件追加写入该日志文件")
+
+
+def _add_audio_options(p, *format_flags, dest="format"):
+    p.add_argument(*format_flags, dest=dest, default="auto", choices=AUDIO_FORMATS,
+                   help="输出容器（默认 auto：按源编码选择，尽量不重新编码）")
+    p.add_argument("--no-copy", dest="copy", action="store_false", help="总是重新编码，不流复制")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="media_engine", description="全能媒体工具箱（命令行）")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    sub = parser.add_subparsers(dest="command", metavar="<命令>")
+    sub.required = True
+
+    p = sub.add_parser("extract", help="视频抽帧")
+    p.add_argument("inputs", nargs="+", help="视频文件、目录或通配符")
+    p.add_argument("-o", "--output-dir", required=True, help="输出目录")
+    p.add_argument("-n", "--count", type=int, default=100, help="抽取数量（默认 100）")
+    p.add_argument("-f", "--format", default="jpg", choices=["jpg", "png", "jpeg"], help="输出格式")
+    p.add_argument("--strategy", default="auto", choices=EXTRACT_STRATEGIES, help="抽帧策略")
+    p.add_argument("--mode", default="uniform", choices=EXTRACT_MODES,
+                   help="uniform 均匀抽取；keyframes 只取关键帧；scenes 每个镜头一帧（后两种 -n 为上限）")
+    p.add_argument("--threshold", type=float, default=0.35, help="scenes 的镜头切换阈值，0~1（默认 0.35）")
+    p.add_argument("--dedup", default=None, choices=DEDUP_METHODS,
+                   help="用感知哈希去掉与上一张几乎相同的帧，并写出 {视频名}_frames.json 清单")
+    p.add_argument("--dedup-threshold", type=int, default=5, help="汉明距离不超过该值视为重复（0~64，默认 5）")
+    p.add_argument("--writers", type=int, default=None, help="写入线程数（分段时为每段的写入线程数，默认 1）")
+    _add_pack_option(p)
+    _add_segments_option(p)
+    _add_checkpoint_option(p)
+    _add_cache_options(p)
+    _add_report_options(p)
+    p.set_defaults(func=cmd_extract, exts=VIDEO_EXTS)
+
+    p = sub.add_parser("to-mp3", help="视频提取音频为 MP3")
+    p.add_argument("inputs", nargs="+", help="视频文件、目录或通配符")
+    p.add_argument("-o", "--output-dir", required=True, help="输出目录")
+    _add_cache_options(p)
+    _add_report_options(p)
+    p.set_defaults(func=cmd_to_mp3, exts=VIDEO_EXTS)
+
+    p = sub.add_parser("to-audio", help="视频提取音频，编码兼容时直接流复制")
+    p.add_argument("inputs", nargs="+", help="视频文件、目录或通配符")
+    p.add_argument("-o", "--output-dir", required=True, help="输出目录")
+    _add_audio_options(p, "-f", "--format")
+    _add_cache_options(p)
+    _add_report_options(p)
+    p.set_defaults(func=cmd_to_audio, exts=VIDEO_EXTS)
+
+    p = sub.add_parser("to-gif", help="视频转 GIF")
+    p.add_argument("inputs", nargs="+", help="视频文件、目录或通配符")
+    p.add_argument("-o", "--output-dir", required=True, help="输出目录")
+    p.add_argument("--fps", type=int, default=10, help="帧率（默认 10）")
+    p.add_argument("--scale", type=float, default=0.5, help="缩放比例（默认 0.5）")
+    _add_gif_options(p)
+    _add_clip_options(p)
+    _add_segments_option(p)
+    _add_cache_options(p)
+    _add_report_options(p)
+    p.set_defaults(func=cmd_to_gif, exts=VIDEO_EXTS)
+
+    p = sub.add_parser("convert", help="图片格式转换")
+    p.add_argument("inputs", nargs="+", help="图片文件、目录或通配符")
+    p.add_argument("-o", "--output-dir", required=True, help="输出目录")
+    p.add_argument("-f", "--format", default="png", choices=["png", "jpg", "jpeg", "bmp", "webp"], help="输出格式")
+    p.add_argument("-j", "--workers", type=int, default=None, help="并行进程数（默认 CPU 核数）")
+    p.add_argument("--skip-existing", action="store_true", help="输出已存在时跳过")
+    _add_encode_options(p)
+    _add_checkpoint_option(p)
+    _add_cache_options(p)
+    _add_report_options(p)
+    p.set_defaults(func=cmd_convert, exts=IMAGE_EXTS)
+
+    p = sub.add_parser("grid-crop", help="图片网格裁剪")
+    p.add_argument("inputs", nargs="+", help="图片文件、目录或通配符")
+    p.add_argument("-o", "--output-dir", required=True, help="输出目录")
+    p.add_argument("--cols", type=int, default=4, help="横向切割数（默认 4）")
+    p.add_argument("--rows", type=int, default=4, help="纵向切割数（默认 4）")
+    p.add_argument("-f", "--format", default="png", choices=["png", "jpg", "jpeg", "webp"], help="输出格式")
+    p.add_argument("--overlap", type=int, default=0, help="每块向四周扩展的重叠像素（默认 0）")
+    p.add_argument("-j", "--workers", type=int, default=None, help="并行编码线程数")
+    _add_pack_option(p, TILE_SINKS)
+    _add_encode_options(p)
+    _add_cache_options(p)
+    _add_report_options(p)
+    p.set_defaults(func=cmd_grid_crop, exts=IMAGE_EXTS)
+
+    p = sub.add_parser("make-gif", help="多张图片按顺序合成 GIF")
+    p.add_argument("inputs", nargs="+", help="图片文件、目录或通配符（按给出顺序合成）")
+    p.add_argument("-o", "--output", required=True, help="输出 .gif 文件（.webp / .png 为动画 WebP / APNG）")
+    p.add_argument("--duration", type=int, default=100, help="帧间隔毫秒（默认 100）")
+    p.add_argument("--no-loop", dest="loop", action="store_false", help="不循环播放")
+    p.add_argument("--max-side", type=int, default=None,
+                   help="输出最长边像素（默认与第一张图相同；JPEG 会直接按缩小比例解码）")
+    p.add_argument("-j", "--workers", type=int, default=None, help="并行解码线程数")
+    _add_gif_options(p)
+    _add_report_options(p)
+    p.set_defaults(func=cmd_make_gif, exts=IMAGE_EXTS)
+
+    p = sub.add_parser("batch", help="多个视频 x 多个操作，进任务队列并发执行")
+    p.add_argument("inputs", nargs="+", help="视频文件、目录或通配符")
+    p.add_argument("-o", "--output-dir", required=True, help="输出目录")
+    p.add_argument("--op", dest="ops", action="append", choices=["extract", "to-gif", "to-mp3", "to-audio"],
+                   help="要执行的操作，可重复（默认 extract）")
+    p.add_argument("--cpu-workers", type=int, default=None, help="CPU 密集任务（抽帧、转 GIF）并发数")
+    p.add_argument("--io-workers", type=int, default=2, help="I/O 密集任务（提取音频）并发数（默认 2）")
+    p.add_argument("--priority", type=int, default=0, help="任务优先级，数值大的先执行")
+    p.add_argument("--retries", type=int, default=0, help="失败后自动重试次数")
+    p.add_argument("-n", "--count", type=int, default=100, help="抽帧数量（默认 100）")
+    p.add_argument("-f", "--format", default="jpg", choices=["jpg", "png", "jpeg"], help="抽帧输出格式")
+    p.add_argument("--strategy", default="auto", choices=EXTRACT_STRATEGIES, help="抽帧策略")
+    p.add_argument("--mode", default="uniform", choices=EXTRACT_MODES,
+                   help="uniform 均匀抽取；keyframes 只取关键帧；scenes 每个镜头一帧（后两种 -n 为上限）")
+    p.add_argument("--threshold", type=float, default=0.35, help="scenes 的镜头切换阈值，0~1（默认 0.35）")
+    p.add_argument("--dedup", default=None, choices=DEDUP_METHODS,
+                   help="用感知哈希去掉与上一张几乎相同的帧，并写出 {视频名}_frames.json 清单")
+    p.add_argument("--dedup-threshold", type=int, default=5, help="汉明距离不超过该值视为重复（0~64，默认 5）")
+    p.add_argument("--writers", type=int, default=None, help="每个抽帧任务的写入线程数")
+    _add_pack_option(p)
+    p.add_argument("--fps", type=int, default=10, help="GIF 帧率（默认 10）")
+    p.add_argument("--scale", type=float, default=0.5, help="GIF 缩放比例（默认 0.5）")
+    _add_gif_options(p)
+    _add_clip_options(p)
+    _add_audio_options(p, "--audio-format", dest="audio_format")
+    _add_segments_option(p)
+    _add_checkpoint_option(p)
+    _add_cache_options(p)
+    _add_report_options(p)
+    p.set_defaults(func=cmd_batch, exts=VIDEO_EXTS)
+
+    p = sub.add_parser("watch", help="监视文件夹，新文件写完后自动处理")
+    p.add_argument("inputs", nargs="+", help="要监视的目录（不递归子目录）")
+    p.add_argument("-o", "--output-dir", required=True, help="输出目录（不能是监视目录）")
+    p.add_argument("--done", dest="done_dir", default=None, help="处理成功的输入移到这里（默认 第一个监视目录/done）")
+    p.add_argument("--failed", dest="failed_dir", default=None,
+                   help="处理失败的输入移到这里（默认 第一个监视目录/failed）")
+    p.add_argument("--video-op", dest="video_ops", action="append", choices=["extract", "to-gif", "to-mp3", "to-audio"],
+                   help="视频要执行的操作，可重复（默认 extract 和 to-mp3）")
+    p.add_argument("--image-format", default="webp", choices=["webp", "png", "jpg", "none"],
+                   help="图片转换为该格式（默认 webp；none 不处理图片）")
+    p.add_argument("-n", "--count", type=int, default=100, help="抽帧数量（默认 100）")
+    p.add_argument("--settle", type=float, default=2.0, help="大小和修改时间连续多少秒不变才算写完（默认 2）")
+    p.add_argument("--cpu-workers", type=int, default=None, help="CPU 密集任务并发数")
+    p.add_argument("--io-workers", type=int, default=2, help="I/O 密集任务并发数（默认 2）")
+    p.add_argument("--max-pending", type=int, default=None, help="同时在处理的文件数上限（默认 总并发数的 4 倍）")
+    p.add_argument("--poll", action="store_true", help="不用 inotify，轮询目录（网络盘等收不到事件时）")
+    p.add_argument("--once", action="store_true", help="处理完目录里现有的文件就退出")
+    _add_cache_options(p)
+    _add_report_options(p)
+    p.set_defaults(func=cmd_watch, exts=None, expand=False)
+
+    p = sub.add_parser("cache", help="查看或清理结果缓存")
+    p.add_argument("action", nargs="?", default="info", choices=["info", "list", "prune"],
+                   help="info 统计（默认）；list 按最近使用列出；prune 清理")
+    p.add_argument("-n", "--limit", type=int, default=50, help="list 最多显示几项（默认 50）")
+    p.add_argument("--max-size", default=None, help="prune：淘汰最久未用的项直到不超过该大小（如 500M）")
+    p.add_argument("--older-than", type=float, default=None, help="prune：删除超过该天数未使用的项")
+    p.add_argument("--all", action="store_true", help="prune：清空缓存")
+    _add_cache_options(p, with_switch=False)
+    p.set_defaults(func=cmd_cache, exts=None)
+
+    p = sub.add_parser("startup", help="检查启动耗时与导入排行")
+    p.add_argument("--budget", type=float, default=100, help="--version 冷启动中位数预算，毫秒（默认 100）")
+    p.add_argument("--runs", type=int, default=5, help="测量次数（默认 5）")
+    p.add_argument("--module", default="media_engine.cli", help="统计导入耗时的模块")
+    p.add_argument("--top", type=int, default=15, help="显示前几项（默认 15）")
+    p.set_defaults(func=cmd_startup, exts=None)
+
+    p = sub.add_parser("bench", help="用合成输入跑各管线的基准测试，并与保存的基准比较")
+    p.add_argument("--suite", default="quick", choices=["quick", "full"],
+                   help="quick 每条管线一两项；full 覆盖更多分辨率、时长和关键帧间隔")
+    p.add_argument("--only", action="append", default=None, help="只跑名字匹配该通配符的用例，可重复（如 'extract/*'）")
+    p.add_argument("--repeat", type=int, default=3, help="每项重复次数，耗时取中位数（默认 3）")
+    p.add_argument("--work-dir", default=None, help="生成的输入和输出放在这里（默认系统临时目录下 media_engine_bench）")
+    p.add_argument("--baseline", default=None, help="与该基准 JSON 比较，有回退时返回非零退出码")
+    p.add_argument("--save-baseline", default=None, help="把本次结果保存为基准 JSON")
+    p.add_argument("--tolerance", type=float, default=0.15, help="超过基准多少比例算回退（默认 0.15）")
+    p.set_defaults(func=cmd_bench, exts=None)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if not hasattr(args, "inputs"):
+        return _call(args.func, args)
+
+    # watch 的输入是要监视的目录，不展开
+    files = expand_inputs(args.inputs, args.exts) if getattr(args, "expand", True) else args.inputs
+    if not files:
+        print("错误: 没有匹配到任何输入文件", file=sys.stderr)
+        return 2
+
+    # 被 kill（SIGTERM）时和 Ctrl+C 一样收尾：停止处理、写好断点清单再退出
+    signal.signal(signal.SIGTERM, _interrupt)
+
+    from .events import EventPump
+    events = _open_events(args)
+    sink = ReportSink(args, events)
+
+    def run():
+        failed = args.func(args, files, sink, events)
+        sink.close()
+        return failed
+
+    def fail(message):
+        events.post("错误", "failed", message)
+
+    # 所有终端输出都经过事件总线，由泵线程按固定频率统一打印
+    with EventPump(events):
+        return _call(run, fail=fail)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _call(func, *args, fail=None):
+    fail = fail or (lambda message: print(message, file=sys.stderr))
+    try:
+        failed = func(*args)
+    except KeyboardInterrupt:
+        fail("\n已取消")
+        return 130
+    except Exception as e:
+        fail(f"错误: {e}")
+        return 1
+    return 1 if failed else 0
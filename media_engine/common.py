@@ -0,0 +1,171 @@
+"""
+引擎公共部分：异常类型、文件类型、批量输入展开、进度回调约定
+
+进度回调统一为 progress(done, total, message)，total 为 None 表示进度未知。
+逐帧报告的 message 可以是 ProgressTemplate，显示时才用 format_progress 填入数字。
+"""
+
+import glob
+import os
+
+
+# 这里只放不依赖 cv2 / PIL / numpy 的常量和工具，命令行解析参数、界面建控件时
+# 只需导入本模块，重量级依赖留到真正处理时再加载
+
+# 抽帧策略：auto 按帧数与关键帧间隔自动选择；sequential 单次顺序解码（grab 跳帧、只 retrieve 目标帧）；
+# seek 逐帧定位（每次定位都要从前一个关键帧重新解码，只适合非常稀疏的抽帧）
+EXTRACT_STRATEGIES = ("auto", "sequential", "seek")
+
+# 抽帧方式：uniform 均匀抽 count 帧；keyframes 只解码关键帧（需要 ffmpeg）；
+# scenes 每个镜头一帧。后两种 count 是上限
+EXTRACT_MODES = ("uniform", "keyframes", "scenes")
+
+# 抽帧去重用的感知哈希
+DEDUP_METHODS = ("ahash", "dhash")
+
+GIF_PALETTE_MODES = ("global", "per-frame")
+GIF_DITHER_MODES = ("none", "ordered", "floyd")
+# 视频转 GIF：opencv 逐帧解码后由本工具量化编码；ffmpeg 用 fps/scale/palettegen/paletteuse 滤镜一条管线完成
+GIF_BACKENDS = ("opencv", "ffmpeg")
+
+# 视频转动图 / 合成动图的输出格式：gif 调色板量化；webp 有损或无损、apng 无损，都是 24 位色（见 animated 模块）
+ANIMATION_FORMATS = ("gif", "webp", "apng")
+ANIMATION_EXTS = {"gif": ".gif", "webp": ".webp", "apng": ".png"}
+
+# 抽帧 / 网格裁剪的输出方式：files 每张一个文件；tar / zip 未压缩归档；npy 原始像素数组（仅抽帧）；
+# sprite 缩略图拼图（仅抽帧）。打包输出都另有一份带偏移和位置的索引（见 sinks 模块）
+OUTPUT_SINKS = ("files", "tar", "zip", "npy", "sprite")
+TILE_SINKS = ("files", "tar", "zip")
+
+# 图片编码预设：只调压缩耗时与体积的取舍，不改画质（见 encoders 模块）
+ENCODE_PRESETS = ("fast", "balanced", "smallest")
+
+# 提取音频的输出容器：auto 按源音轨编码选择，能流复制就不重新编码
+AUDIO_FORMATS = ("auto", "mp3", "m4a", "ogg", "opus", "flac", "wav")
+
+VIDEO_EXTS = (".mp4", ".avi", ".mkv", ".mov", ".wmv")
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".gif")
+
+
+class MediaError(Exception):
+    """处理失败时抛出，消息可直接展示给用户"""
+
+
+class Cancelled(MediaError):
+    """任务被取消（cancel 事件被置位）时抛出"""
+
+    def __init__(self, message="已取消"):
+        super().__init__(message)
+
+
+def check_cancel(cancel):
+    """cancel 为 threading.Event 或 None；已置位时抛出 Cancelled"""
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+
+
+def media_name(path):
+    """不带扩展名的文件名，用于拼接输出文件名"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def guess_animation_format(path):
+    """按输出文件扩展名判断动画格式：.webp -> webp，.png / .apng -> apng，其余为 gif"""
+    ext = os.path.splitext(path)[1].lower()
+    return {".webp": "webp", ".png": "apng", ".apng": "apng"}.get(ext, "gif")
+
+
+def expand_inputs(patterns, exts=None):
+    """
+    把命令行给的文件 / 目录 / 通配符展开成有序、去重的文件列表。
+    目录展开为其中扩展名属于 exts 的文件（不递归）；通配符支持 **。
+    """
+    files = []
+    seen = set()
+
+    def add(path):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            files.append(path)
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for name in sorted(os.listdir(pattern)):
+                path = os.path.join(pattern, name)
+                if os.path.isfile(path) and (exts is None or name.lower().endswith(exts)):
+                    add(path)
+        elif glob.has_magic(pattern):
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(path):
+                    add(path)
+        else:
+            add(pattern)
+    return files
+
+
+def parse_time(text):
+    """
+    把 "90"、"1:30"、"00:01:30.5" 这样的时间解析为秒（float）；空字符串或 None 返回 None。
+    """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        value = float(text)
+    else:
+        text = text.strip()
+        if not text:
+            return None
+        parts = text.split(":")
+        if len(parts) > 3:
+            raise MediaError(f"无效的时间: {text}")
+        try:
+            value = 0.0
+            for part in parts:
+                value = value * 60 + float(part)
+        except ValueError:
+            raise MediaError(f"无效的时间: {text}")
+    if value < 0:
+        raise MediaError(f"时间不能为负数: {text}")
+    return value
+
+
+def resolve_time_range(start=None, end=None, duration=None):
+    """
+    把开始时间与结束时间 / 时长（秒或 parse_time 支持的字符串）整理成 (开始秒, 结束秒或 None)。
+    结束时间与时长只能给一个。
+    """
+    start = parse_time(start) or 0.0
+    end = parse_time(end)
+    duration = parse_time(duration)
+    if end is not None and duration is not None:
+        raise MediaError("结束时间和时长只能指定一个")
+    if duration is not None:
+        if duration <= 0:
+            raise MediaError("时长必须大于 0")
+        end = start + duration
+    if end is not None and end <= start:
+        raise MediaError("结束时间必须晚于开始时间")
+    return start, end
+
+
+def default_writer_count():
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+class ProgressTemplate(str):
+    """进度消息模板：引擎逐帧原样传递，不在循环里拼字符串；显示时由 format_progress 填入 done / total"""
+
+
+PROCESSING = ProgressTemplate("处理中: {done}/{total}")
+
+
+def format_progress(message, done, total):
+    if isinstance(message, ProgressTemplate):
+        return message.format(done=done, total=total)
+    return message
+
+
+def report(progress, done, total=None, message=""):
+    if progress is not None:
+        progress(done, total, message)
@@ -0,0 +1,105 @@
+"""
+感知哈希去重：抽帧时在编码写出之前丢掉与上一张保留帧几乎一样的帧
+
+- aHash：缩成 8x8 灰度，像素是否高于均值 -> 64 位
+- dHash：缩成 9x8 灰度，每行相邻像素比较大小 -> 64 位（对整体明暗变化不敏感，默认）
+- 两个哈希的汉明距离 <= 阈值即视为重复
+
+保留了哪些帧、每张替代了哪些帧，写进 JSON 清单，方便下游按时间回溯。
+"""
+
+import json
+import os
+
+import cv2
+import numpy as np
+
+from .common import DEDUP_METHODS, MediaError
+
+
+def _gray_thumbnail(frame, width, height):
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def _pack_bits(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def average_hash(frame):
+    """BGR 或灰度帧 -> 64 位 aHash"""
+    small = _gray_thumbnail(frame, 8, 8)
+    return _pack_bits(small > small.mean())
+
+
+def difference_hash(frame):
+    """BGR 或灰度帧 -> 64 位 dHash"""
+    small = _gray_thumbnail(frame, 9, 8)
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+
+HASH_FUNCTIONS = {
+    "ahash": average_hash,
+    "dhash": difference_hash,
+}
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FrameDeduper:
+    """
+    依次送入帧，add() 返回是否保留；被丢弃的帧记在上一张保留帧名下。
+    用法：
+        deduper = FrameDeduper("dhash", threshold=5)
+        if deduper.add(frame, frame_idx, seconds, file_name):
+            ...写出 frame...
+        deduper.write_manifest(path, video=...)
+    """
+
+    def __init__(self, method="dhash", threshold=5):
+        if method not in DEDUP_METHODS:
+            raise MediaError(f"未知去重哈希: {method}")
+        if not 0 <= threshold <= 64:
+            raise MediaError("去重阈值必须在 0 到 64 之间")
+        self.method = method
+        self.threshold = threshold
+        self._hash = HASH_FUNCTIONS[method]
+        self._last = None
+        self.kept = []        # [{"file", "index", "time", "hash", "replaced": [...]}, ...]
+        self.dropped = 0
+
+    def add(self, frame, index, time, file):
+        h = self._hash(frame)
+        if self._last is not None:
+            distance = hamming(h, self._last)
+            if distance <= self.threshold:
+                self.kept[-1]["replaced"].append({"index": index, "time": _round_time(time), "distance": distance})
+                self.dropped += 1
+                return False
+        self._last = h
+        self.kept.append({"file": file, "index": index, "time": _round_time(time), "hash": f"{h:016x}",
+                          "replaced": []})
+        return True
+
+    def write_manifest(self, path, **meta):
+        """写 JSON 清单：meta（视频路径等）+ 参数 + 每张保留帧"""
+        data = dict(meta)
+        data.update({
+            "hash": self.method,
+            "threshold": self.threshold,
+            "kept": len(self.kept),
+            "dropped": self.dropped,
+            "frames": self.kept,
+        })
+        tmp_path = path + ".part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+def _round_time(time):
+    return None if time is None else round(time, 3)
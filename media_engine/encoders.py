@@ -0,0 +1,148 @@
+"""
+图片编码参数：按速度 / 体积取舍的预设（fast / balanced / smallest）和各格式的显式参数
+
+预设只调“花多少时间压缩”，不改画质：同一格式下各预设的 quality 相同，
+smallest 更慢、文件更小，fast 更快、文件更大；balanced 与 Pillow 默认参数一致。
+JPEG 没有比默认更快的编码路径，fast 与 balanced 相同。
+需要改画质时显式给 quality 等参数，覆盖预设中的同名项。
+
+estimate_presets() 抽几张图片用各预设编码到内存，按像素数推算整批的输出大小和耗时（不写文件）。
+"""
+
+import io
+import os
+import time
+
+from PIL import Image
+
+from .common import ENCODE_PRESETS, MediaError
+
+
+# 格式 -> Pillow 格式名（apng 的每帧按 PNG 编码，参数相同）
+_PIL_FORMATS = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "apng": "PNG", "webp": "WEBP", "bmp": "BMP", "gif": "GIF"}
+
+PRESETS = {
+    "fast": {
+        "JPEG": {"quality": 75, "optimize": False, "progressive": False, "subsampling": "4:2:0"},
+        "PNG": {"compress_level": 1, "optimize": False},
+        "WEBP": {"quality": 80, "method": 0, "lossless": False},
+    },
+    "balanced": {
+        "JPEG": {"quality": 75, "optimize": False, "progressive": False, "subsampling": "4:2:0"},
+        "PNG": {"compress_level": 6, "optimize": False},
+        "WEBP": {"quality": 80, "method": 4, "lossless": False},
+    },
+    "smallest": {
+        "JPEG": {"quality": 75, "optimize": True, "progressive": True, "subsampling": "4:2:0"},
+        "PNG": {"compress_level": 9, "optimize": True},
+        "WEBP": {"quality": 80, "method": 6, "lossless": False},
+    },
+}
+
+# 各格式可调的参数及取值检查
+_KNOBS = {
+    "quality": lambda v: 1 <= v <= 100,
+    "optimize": lambda v: isinstance(v, bool),
+    "progressive": lambda v: isinstance(v, bool),
+    "subsampling": lambda v: v in ("4:4:4", "4:2:2", "4:2:0"),
+    "compress_level": lambda v: 0 <= v <= 9,
+    "method": lambda v: 0 <= v <= 6,
+    "lossless": lambda v: isinstance(v, bool),
+}
+
+
+def pil_format(fmt):
+    try:
+        return _PIL_FORMATS[fmt.strip().lower()]
+    except KeyError:
+        raise MediaError(f"不支持的输出格式: {fmt}")
+
+
+def encode_options(fmt, preset="balanced", **overrides):
+    """
+    返回 fmt 格式的编码参数（可直接传给 Image.save）。
+    overrides 中值为 None 的忽略；不适用于该格式的参数（例如 PNG 的 quality）也忽略。
+    """
+    if preset not in ENCODE_PRESETS:
+        raise MediaError(f"未知编码预设: {preset}")
+    options = dict(PRESETS[preset].get(pil_format(fmt), {}))
+    for key, value in overrides.items():
+        if value is None or key not in options:
+            continue
+        if not _KNOBS[key](value):
+            raise MediaError(f"无效的编码参数 {key}={value}")
+        options[key] = value
+    return options
+
+
+def save_image(img, fp, fmt, options=None):
+    """按 fmt 转成可写的模式后保存；fp 为路径或文件对象"""
+    name = pil_format(fmt)
+    if name == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    img.save(fp, format=name, **(options or {}))
+
+
+def estimate_presets(image_files, fmt, samples=5, workers=None, progress=None, **overrides):
+    """
+    抽 samples 张图片（均匀分布），每张解码一次，用各预设编码到内存，
+    按像素数把样本的输出字节和耗时推算到整批。返回按预设顺序的列表：
+    [{"preset", "options", "bytes", "input_bytes", "cpu_seconds", "seconds"}]，
+    seconds 为按 workers 个进程并行估算的用时。
+    """
+    from .gif import _even_indices
+
+    if not image_files:
+        raise MediaError("请先添加图片")
+    workers = workers or os.cpu_count() or 1
+
+    total_pixels = input_bytes = 0
+    for path in image_files:
+        with Image.open(path) as img:
+            total_pixels += img.width * img.height
+        input_bytes += os.path.getsize(path)
+
+    picks = _even_indices(len(image_files), samples)
+    sample_pixels = decode_s = 0
+    out_bytes = {p: 0 for p in ENCODE_PRESETS}
+    encode_s = {p: 0.0 for p in ENCODE_PRESETS}
+    options = {p: encode_options(fmt, p, **overrides) for p in ENCODE_PRESETS}
+    for n, i in enumerate(picks):
+        t0 = time.perf_counter()
+        with Image.open(image_files[i]) as img:
+            img.load()
+            decode_s += time.perf_counter() - t0
+            sample_pixels += img.width * img.height
+            for preset in ENCODE_PRESETS:
+                buf = io.BytesIO()
+                t0 = time.perf_counter()
+                save_image(img, buf, fmt, options[preset])
+                encode_s[preset] += time.perf_counter() - t0
+                out_bytes[preset] += buf.tell()
+        if progress is not None:
+            progress(n + 1, len(picks), f"试编码: {n+1}/{len(picks)}")
+
+    scale = total_pixels / max(1, sample_pixels)
+    estimates = []
+    for preset in ENCODE_PRESETS:
+        cpu = (decode_s + encode_s[preset]) * scale
+        estimates.append({
+            "preset": preset,
+            "options": options[preset],
+            "bytes": int(out_bytes[preset] * scale),
+            "input_bytes": input_bytes,
+            "cpu_seconds": cpu,
+            "seconds": cpu / min(workers, len(image_files)),
+        })
+    return estimates
+
+
+def format_estimates(estimates, out):
+    from .cache import format_size
+
+    # 中文表头每个字占两列
+    out.write(f"{'预设':<8}  {'预计大小':>8}  {'占原图':>5}  {'预计用时':>7}  参数\n")
+    for e in estimates:
+        ratio = e["bytes"] / e["input_bytes"] if e["input_bytes"] else 0
+        params = " ".join(f"{k}={v}" for k, v in e["options"].items())
+        out.write(f"{e['preset']:<10}  {format_size(e['bytes']):>12}  {ratio:>8.0%}  {e['seconds']:>10.1f}s  {params}\n")
@@ -0,0 +1,189 @@
+"""
+进度事件总线：工作线程只把事件写进总线（进度只记下最新值，不碰界面），
+由主线程（Tk 的 after 定时器）或后台泵线程（命令行）按固定频率取出、分发给订阅者。
+
+- 同一来源的进度事件会合并，只保留最新一条：处理再快，界面每秒也只刷新 rate 次；
+  工作线程逐帧只写一个计数，事件对象和消息文字在分发时按 rate 的频率才生成
+- 开始 / 完成 / 失败 / 取消 / 日志事件不合并，按发生顺序全部送达
+- 图形界面、命令行进度行和日志都只是同一事件流的订阅者
+
+用法：
+    bus = EventBus()
+    bus.subscribe(handler)                        # handler(event)，在 dispatch 的线程里调用
+    progress = bus.progress("抽帧 a.mp4")          # 交给引擎函数的 progress(done, total, message)
+    bus.post("抽帧 a.mp4", "finished", "[完成] a.mp4 -> 100")
+    bus.dispatch()                                # 主线程定时调用；或 with EventPump(bus): ...
+"""
+
+import itertools
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from .common import format_progress
+
+
+EVENT_KINDS = ("progress", "started", "finished", "failed", "cancelled", "log")
+
+# 默认分发频率（次/秒）
+DEFAULT_RATE = 15
+
+ProgressEvent = namedtuple("ProgressEvent", "source kind done total message data")
+
+logger = logging.getLogger("media_engine")
+# 没有配置日志时不输出（避免 lastResort 把错误事件打到 stderr 上）
+logger.addHandler(logging.NullHandler())
+
+
+class _Slot:
+    """一个来源的最新进度。工作线程每次只整体替换 state（不加锁、不建事件、不拼消息），drain 时才取样"""
+
+    __slots__ = ("state", "sent", "data")
+
+    def __init__(self, data):
+        self.state = None       # (序号, done, total, message)
+        self.sent = None        # 上次取走的 state
+        self.data = data
+
+
+class EventBus:
+    """线程安全：任意线程 post / progress，dispatch 在单一线程里调用订阅者"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._slots = {}        # 来源 -> _Slot
+        self._queue = []        # [(序号, 事件)]：其余事件
+        self._handlers = []
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+        return handler
+
+    def _slot(self, source, data):
+        slot = self._slots.get(source)
+        if slot is None:
+            with self._lock:
+                slot = self._slots.setdefault(source, _Slot(data))
+        return slot
+
+    def update(self, source, done, total=None, message="", **data):
+        """记下 source 的最新进度（覆盖上一条尚未分发的）"""
+        slot = self._slot(source, data)
+        slot.data = data
+        slot.state = (next(self._seq), done, total, message)
+
+    def progress(self, source, **data):
+        """
+        返回写入 source 进度的 progress(done, total, message) 回调，可直接交给引擎函数。
+        每次调用只取一个序号、替换一个元组；事件对象和消息文字（含 ProgressTemplate）在 drain 时才生成。
+        """
+        slot = self._slot(source, data)
+        slot.data = data
+        seq = self._seq
+
+        def callback(done, total=None, message=""):
+            slot.state = (next(seq), done, total, message)
+        return callback
+
+    def _take(self, source, slot):
+        state = slot.state
+        if state is None or state is slot.sent:
+            return None
+        slot.sent = state
+        seq, done, total, message = state
+        return seq, ProgressEvent(source, "progress", done, total, format_progress(message, done, total), slot.data)
+
+    def post(self, source, kind, message="", **data):
+        """开始 / 结束 / 日志等不合并的事件；进度请用 update() 或 progress()"""
+        if kind not in EVENT_KINDS or kind == "progress":
+            raise ValueError(f"未知事件类型: {kind}")
+        event = ProgressEvent(source, kind, None, None, message, data)
+        with self._lock:
+            # 该来源尚未送出的进度排在这个事件之前
+            slot = self._slots.get(source)
+            latest = None if slot is None else self._take(source, slot)
+            if latest is not None:
+                self._queue.append(latest)
+            self._queue.append((next(self._seq), event))
+
+    def drain(self):
+        """取出到目前为止的事件（进度已合并），按发生顺序返回"""
+        with self._lock:
+            items = self._queue
+            self._queue = []
+            for source, slot in self._slots.items():
+                latest = self._take(source, slot)
+                if latest is not None:
+                    items.append(latest)
+        items.sort(key=lambda item: item[0])
+        return [event for _, event in items]
+
+    def dispatch(self):
+        """取出事件并依次交给订阅者，返回事件数；订阅者出错不影响其余订阅者"""
+        events = self.drain()
+        for event in events:
+            for handler in self._handlers:
+                try:
+                    handler(event)
+                except Exception:
+                    logger.exception("事件处理出错: %s", event)
+        return len(events)
+
+
+class EventPump:
+    """
+    没有 Tk 主循环时（命令行）用的后台线程：每秒 dispatch rate 次，
+    stop() / 退出 with 时把剩余事件全部分发完再返回。
+    """
+
+    def __init__(self, bus, rate=DEFAULT_RATE):
+        self.bus = bus
+        self.interval = 1.0 / rate
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.bus.dispatch()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.bus.dispatch()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def log_handler(log=None, progress_interval=5.0):
+    """
+    把事件写进 logging（默认 media_engine 日志）：失败为 ERROR，其余结束类事件为 INFO，
+    进度为 DEBUG 且每个来源每 progress_interval 秒最多一条。
+    """
+    log = log or logger
+    last = {}
+
+    def handle(event):
+        if event.kind == "progress":
+            now = time.monotonic()
+            prev = last.get(event.source)
+            if prev is not None and now - prev < progress_interval:
+                return
+            last[event.source] = now
+            total = f"/{event.total}" if event.total else ""
+            log.debug("%s: %s%s %s", event.source, event.done, total, event.message)
+        else:
+            last.pop(event.source, None)
+            level = logging.ERROR if event.kind == "failed" else logging.INFO
+            log.log(level, "%s", event.message or f"{event.source} [{event.kind}]")
+    return handle
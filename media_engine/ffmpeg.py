@@ -0,0 +1,216 @@
+"""
+ffmpeg 子进程公共部分：运行并解析 -progress 进度、支持取消，探测时长
+"""
+
+import json
+import re
+import shutil
+import subprocess
+import threading
+from collections import deque
+
+from .common import Cancelled, MediaError, report
+from .profiling import stage
+
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_ffmpeg_duration(text):
+    """从 ffmpeg -i 输出的 Duration: hh:mm:ss.xx 中取时长（秒），没有返回 None"""
+    m = _DURATION_RE.search(text)
+    if m is None:
+        return None
+    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+
+
+def probe_duration(path):
+    """媒体总时长（秒），取不到返回 None"""
+    try:
+        if shutil.which("ffprobe"):
+            p = subprocess.run(
+                ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+                capture_output=True, text=True, timeout=30,
+            )
+            if p.returncode == 0:
+                duration = to_float(json.loads(p.stdout or "{}").get("format", {}).get("duration"))
+                if duration:
+                    return duration
+        if shutil.which("ffmpeg"):
+            p = subprocess.run(["ffmpeg", "-hide_banner", "-i", path], capture_output=True, text=True, timeout=30)
+            return parse_ffmpeg_duration(p.stderr)
+    except (OSError, ValueError, subprocess.SubprocessError):
+        pass
+    return None
+
+
+def run_ffmpeg(args, duration=None, progress=None, cancel=None, message="处理中", frames=None):
+    """
+    运行 ffmpeg（args 不含程序名），解析 -progress 输出上报进度。
+    默认进度单位为毫秒：progress(已处理毫秒, 总毫秒, message)，不知道总时长时 total 为 None；
+    给出 frames（预计输出帧数）时改按输出帧数上报。
+    cancel 置位时终止子进程并抛出 Cancelled；失败时抛出带 ffmpeg 错误信息的 MediaError。
+    返回最后一次进度输出的键值（例如 {"frame": "42", ...}）。
+    """
+    if not shutil.which("ffmpeg"):
+        raise MediaError("请安装 ffmpeg 并加入 PATH")
+
+    cmd = ["ffmpeg", "-hide_banner", "-nostdin", "-y", "-v", "error", "-progress", "pipe:1", "-nostats"] + list(args)
+    total = int(duration * 1000) if duration else None
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+
+    # stderr 单独读，避免管道写满把 ffmpeg 卡住；只保留最后几行用于报错
+    errors = deque(maxlen=20)
+    err_thread = threading.Thread(target=lambda: errors.extend(p.stderr), daemon=True)
+    err_thread.start()
+
+    # 取消检查放在单独的线程里：ffmpeg 卡在读输入时 stdout 可能很久没有输出
+    stopped = threading.Event()
+    if cancel is not None:
+        def watch():
+            while not stopped.is_set():
+                if cancel.wait(0.2):
+                    p.terminate()
+                    return
+        threading.Thread(target=watch, daemon=True).start()
+
+    state = {}
+    with stage("ffmpeg"):
+        try:
+            for line in p.stdout:
+                key, _, value = line.strip().partition("=")
+                state[key] = value
+                if frames:
+                    if key == "frame" and value.isdigit():
+                        done = min(int(value), frames)
+                        report(progress, done, frames, f"{message}... {done}/{frames} 帧")
+                    continue
+                # out_time_us 与（名字有误导性的）out_time_ms 都是微秒
+                if key in ("out_time_us", "out_time_ms") and value.isdigit():
+                    done = int(value) // 1000
+                    report(progress, min(done, total) if total else done, total,
+                           f"{message}... {_percent(done, total)}")
+                elif key == "progress" and value == "end" and total:
+                    report(progress, total, total, f"{message}... 100%")
+            p.wait()
+        finally:
+            stopped.set()
+            if p.poll() is None:
+                p.kill()
+                p.wait()
+            err_thread.join(timeout=5)
+
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+    if p.returncode != 0:
+        raise MediaError("".join(errors).strip() or "ffmpeg 处理失败")
+    return state
+
+
+def _percent(done, total):
+    if not total:
+        return f"{done / 1000:.1f}s"
+    return f"{min(100.0, done / total * 100):.0f}%"
+
+
+_PTS_TIME_RE = re.compile(r"\bn:\s*\d+.*?\bpts_time:\s*(-?[\d.]+)")
+
+
+def _read_ppm(stream):
+    """从管道读一张二进制 PPM（P6, maxval 255），返回 (宽, 高, RGB 字节)；流结束返回 None"""
+    tokens = []
+    token = b""
+    while len(tokens) < 4:
+        c = stream.read(1)
+        if not c:
+            if tokens or token:
+                raise MediaError("ffmpeg 输出的图像不完整")
+            return None
+        if c.isspace():
+            if token:
+                tokens.append(token)
+                token = b""
+        else:
+            token += c
+    if tokens[0] != b"P6" or tokens[3] != b"255":
+        raise MediaError("无法解析 ffmpeg 输出的图像")
+    w, h = int(tokens[1]), int(tokens[2])
+    data = stream.read(w * h * 3)
+    if len(data) < w * h * 3:
+        raise MediaError("ffmpeg 输出的图像不完整")
+    return w, h, data
+
+
+def iter_ffmpeg_frames(input_args, vf=None, cancel=None):
+    """
+    用 ffmpeg 解码，逐帧产出 (时间秒, BGR 帧 ndarray)，可直接交给 cv2 / AsyncImageWriter。
+    input_args 为输入部分（如 ["-skip_frame", "nokey", "-i", path]），vf 为可选滤镜；
+    帧以 PPM 流经管道传回，时间取自末尾追加的 showinfo 滤镜。
+    """
+    import numpy as np
+
+    if not shutil.which("ffmpeg"):
+        raise MediaError("请安装 ffmpeg 并加入 PATH")
+
+    cmd = (["ffmpeg", "-hide_banner", "-nostdin", "-v", "info"] + list(input_args)
+           + ["-an", "-sn", "-dn", "-vsync", "0", "-vf", f"{vf},showinfo" if vf else "showinfo",
+              "-c:v", "ppm", "-f", "image2pipe", "pipe:1"])
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # showinfo 每输出一帧在 stderr 打一行，其余行留作报错信息
+    times = []
+    errors = deque(maxlen=20)
+    cond = threading.Condition()
+    ended = []
+
+    def read_stderr():
+        for raw in p.stderr:
+            line = raw.decode("utf-8", "replace")
+            m = _PTS_TIME_RE.search(line) if "showinfo" in line.lower() else None
+            with cond:
+                if m:
+                    times.append(float(m.group(1)))
+                else:
+                    errors.append(line)
+                cond.notify_all()
+        with cond:
+            ended.append(True)
+            cond.notify_all()
+
+    err_thread = threading.Thread(target=read_stderr, daemon=True)
+    err_thread.start()
+
+    n = 0
+    try:
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise Cancelled()
+            with stage("decode"):
+                image = _read_ppm(p.stdout)
+                if image is None:
+                    break
+                w, h, data = image
+                frame = np.frombuffer(data, np.uint8).reshape(h, w, 3)[:, :, ::-1].copy()
+            with cond:
+                while len(times) <= n and not ended:
+                    cond.wait(1.0)
+                t = times[n] if len(times) > n else None
+            n += 1
+            yield t, frame
+        p.wait()
+    finally:
+        if p.poll() is None:
+            p.kill()
+            p.wait()
+        err_thread.join(timeout=5)
+
+    if p.returncode != 0:
+        raise MediaError("".join(line for line in errors if "rror" in line or "No such" in line).strip()
+                         or "ffmpeg 解码失败")
@@ -0,0 +1,109 @@
+"""
+视频转 GIF 的帧缓冲：解码、缩放、BGR→RGB 都写进预先分配好的数组，逐帧处理时不再分配新数组。
+
+- 解码：cap.read / cap.retrieve 直接写进 depth 个轮流使用的 BGR 缓冲
+- 缩放：缩小用 INTER_AREA（按面积平均，双线性缩小会跳过像素产生摩尔纹和锯齿），放大用 INTER_LINEAR
+- 颜色转换：写进 depth 个轮流使用的 RGB 缓冲，数组直接交给 StreamingGifWriter，不经过 PIL 图片
+
+返回的数组在 depth 帧之后会被覆盖，调用方不能长期持有。
+OpenCV 没有写进给定的数组时（例如视频中途分辨率变化）按新尺寸重建缓冲。
+每次分配都记入 frame_alloc 计数（--stats 可见）；reuse=False 时每一步都新分配，用于对比。
+"""
+
+import cv2
+import numpy as np
+
+from .profiling import stage, tally
+
+
+def gif_size(width, height, scale):
+    if scale == 1.0:
+        return width, height
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def resize_interpolation(scale):
+    return cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+
+
+class FrameBuffers:
+    """一路视频的帧缓冲，不是线程安全的（每个解码循环一个）"""
+
+    def __init__(self, scale=1.0, depth=2, reuse=True):
+        self.scale = scale
+        self.depth = depth
+        self.reuse = reuse
+        self.allocations = 0
+        self.frames = 0
+        self._rings = {}    # 名字 -> [形状, 数组列表, 下一个位置]
+        self._decode_shape = None
+
+    def _next(self, name, shape, depth=1):
+        """取 name 缓冲环里的下一个数组，形状变了就重建；reuse=False 时返回 None（由 OpenCV 分配）"""
+        if not self.reuse:
+            return None
+        ring = self._rings.get(name)
+        if ring is None or ring[0] != shape:
+            ring = self._rings[name] = [shape, [], 0]
+        arrays = ring[1]
+        if len(arrays) < depth:
+            arrays.append(np.empty(shape, np.uint8))
+            self._count()
+            return arrays[-1]
+        buf = arrays[ring[2]]
+        ring[2] = (ring[2] + 1) % depth
+        return buf
+
+    def _count(self):
+        self.allocations += 1
+        tally("frame_alloc")
+
+    def _check(self, out, buf):
+        if out is not buf:
+            self._count()
+        return out
+
+    def _decode_buffer(self, cap):
+        # 第一帧之前按容器里记录的宽高分配，之后按实际解出的帧
+        if self._decode_shape is None:
+            w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            if w <= 0 or h <= 0:
+                return None
+            self._decode_shape = (h, w, 3)
+        return self._next("bgr", self._decode_shape, self.depth)
+
+    def _decoded(self, ret, frame, buf):
+        if not ret:
+            return None
+        self._decode_shape = frame.shape
+        return self._check(frame, buf)
+
+    def read(self, cap):
+        """cap.read() 到下一个 BGR 缓冲，读不到返回 None"""
+        buf = self._decode_buffer(cap)
+        with stage("decode"):
+            ret, frame = cap.read(buf) if buf is not None else cap.read()
+        return self._decoded(ret, frame, buf)
+
+    def retrieve(self, cap):
+        """grab() 之后取出当前帧到下一个 BGR 缓冲，失败返回 None"""
+        buf = self._decode_buffer(cap)
+        with stage("retrieve"):
+            ret, frame = cap.retrieve(buf) if buf is not None else cap.retrieve()
+        return self._decoded(ret, frame, buf)
+
+    def to_rgb(self, frame):
+        """BGR 帧 -> 缩放后的 RGB 数组"""
+        h, w = frame.shape[:2]
+        size = gif_size(w, h, self.scale)
+        if size != (w, h):
+            buf = self._next("resized", (size[1], size[0], 3))
+            with stage("resize"):
+                out = cv2.resize(frame, size, dst=buf, interpolation=resize_interpolation(self.scale))
+            frame = self._check(out, buf)
+        buf = self._next("rgb", frame.shape, self.depth)
+        with stage("color_convert"):
+            out = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buf)
+        self.frames += 1
+        return self._check(out, buf)
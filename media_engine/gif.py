@@ -0,0 +1,386 @@
+"""
+流式 GIF 编码：全局/逐帧调色板、差分帧、抖动
+"""
+
+import os
+
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+from .common import GIF_DITHER_MODES, GIF_PALETTE_MODES, MediaError
+from .profiling import stage
+
+
+# 调色板只用 0~254，255 号固定留作透明色（差分帧里“未变化”的像素）
+GIF_TRANSPARENT_INDEX = 255
+GIF_PALETTE_COLORS = 255
+
+# 8x8 Bayer 矩阵，归一化到 [-0.5, 0.5)
+_BAYER_8X8 = (np.array([
+    [0, 32, 8, 40, 2, 34, 10, 42],
+    [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44, 4, 36, 14, 46, 6, 38],
+    [60, 28, 52, 20, 62, 30, 54, 22],
+    [3, 35, 11, 43, 1, 33, 9, 41],
+    [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47, 7, 39, 13, 45, 5, 37],
+    [63, 31, 55, 23, 61, 29, 53, 21],
+], dtype=np.float32) + 0.5) / 64 - 0.5
+
+
+def _gif_color_table(palette_bytes):
+    """返回 (尺寸位, 补齐到 2 的幂的调色板字节)"""
+    colors = max(2, len(palette_bytes) // 3)
+    bits = max(0, (colors - 1).bit_length() - 1)
+    size = 2 ** (bits + 1)
+    table = bytes(palette_bytes[:size * 3])
+    return bits, table + b"\0" * (size * 3 - len(table))
+
+
+def write_gif_header(fp, size, palette_bytes, loop=0):
+    """GIF 文件头、逻辑屏幕描述、全局调色板和循环扩展；loop 为 None 时不写循环扩展"""
+    bits, table = _gif_color_table(palette_bytes)
+    w, h = size
+    fp.write(b"GIF89a" + w.to_bytes(2, "little") + h.to_bytes(2, "little"))
+    fp.write(bytes([0x80 | (bits << 4) | bits, 0, 0]))  # 全局调色板、背景色、像素比
+    fp.write(table)
+    if loop is not None:
+        fp.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + int(loop).to_bytes(2, "little") + b"\0")
+
+
+def concat_gif_segments(path, size, palette_bytes, parts, loop=0):
+    """
+    把 header=False 写出的若干段帧数据按顺序拼成一个 GIF（共用一个文件头和全局调色板）。
+    先写 .part 临时文件，完成后再改名。
+    """
+    tmp_path = path + ".part"
+    try:
+        with open(tmp_path, "wb") as fp:
+            write_gif_header(fp, size, palette_bytes, loop)
+            for part in parts:
+                with open(part, "rb") as src:
+                    while True:
+                        chunk = src.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        fp.write(chunk)
+            fp.write(b";")
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _full_palette(palette_bytes, colors):
+    """
+    把 colors 个有效颜色补齐成 256 色：多余的项重复 0 号颜色，
+    这样量化永远不会选中 255 号透明色。
+    """
+    palette = bytearray(palette_bytes[:colors * 3])
+    colors = len(palette) // 3
+    first = bytes(palette[:3]) or b"\0\0\0"
+    palette += first * (256 - colors)
+    return bytes(palette), colors
+
+
+def build_gif_palette(samples, colors=GIF_PALETTE_COLORS, sample_size=256):
+    """
+    用若干样本帧构建全局调色板，返回 (256 色调色板字节, 有效颜色数)。
+    样本先缩成小图再拼在一起做一次中位切分量化。
+    """
+    thumbs = []
+    for im in samples:
+        im = im.convert("RGB")
+        im.thumbnail((sample_size, sample_size))
+        thumbs.append(im)
+    if not thumbs:
+        raise ValueError("构建调色板至少需要一帧样本")
+
+    width = max(t.width for t in thumbs)
+    height = sum(t.height for t in thumbs)
+    sheet = Image.new("RGB", (width, height))
+    y = 0
+    for t in thumbs:
+        sheet.paste(t, (0, y))
+        y += t.height
+
+    q = sheet.quantize(colors=min(colors, GIF_PALETTE_COLORS), method=Image.Quantize.MEDIANCUT)
+    used = len(q.getcolors(256) or []) or colors
+    return _full_palette(q.getpalette()[:used * 3], used)
+
+
+def _alpha_mask(img):
+    """返回透明像素掩码（alpha < 128），没有透明像素则返回 None"""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        alpha = img.convert("RGBA").getchannel("A")
+        if alpha.getextrema()[0] < 128:
+            return np.asarray(alpha) < 128
+    return None
+
+
+def _bbox(mask):
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+class StreamingGifWriter:
+    """
+    边解码边量化、边写入的 GIF 编码器，内存只与单帧尺寸有关。
+
+    - palette="global"：所有帧共用一张全局调色板（由 sample_frames 构建，未提供时取第一帧），
+      某帧与全局调色板误差超过 palette_tolerance 时退回该帧自己的局部调色板；
+      palette="per-frame"：每帧单独量化（原有行为）
+    - delta=True：与上一帧比较，只写变化区域的包围盒，未变化像素写成透明色；
+      完全相同的帧直接合并到上一帧的时长里
+    - dither："none" / "ordered"（Bayer 有序抖动）/ "floyd"（误差扩散）
+
+    先写到 .part 临时文件，close() 成功后再改名，出错不会留下半个 GIF。
+    add_frame 接受 PIL 图片，或 H×W×3 的 uint8 RGB 数组（直接量化，不复制；调用返回后不再引用）。
+
+    分段并行时：global_palette 直接给出 build_gif_palette 的结果；header=False 只写帧数据
+    （不写文件头和结尾，每帧都带局部调色板或沿用给定的全局调色板），由 concat_gif_segments 拼接。
+    """
+
+    def __init__(self, path, duration, loop=0, palette="global", sample_frames=None,
+                 delta=True, dither="none", palette_tolerance=12.0, global_palette=None, header=True):
+        if palette not in GIF_PALETTE_MODES:
+            raise ValueError(f"未知调色板模式: {palette}")
+        if dither not in GIF_DITHER_MODES:
+            raise ValueError(f"未知抖动方式: {dither}")
+
+        self.path = path
+        self.duration = max(1, int(duration))
+        self.loop = loop
+        self.palette_mode = palette
+        self.delta = delta
+        self.dither = dither
+        self.palette_tolerance = palette_tolerance
+        self.size = None
+        self.frame_count = 0        # 输入帧数
+        self.written_frames = 0     # 实际写入的帧数（相同帧会被合并）
+        self.local_palette_frames = 0
+
+        self.header = header
+        self._global_palette = None
+        self._global_colors = 0
+        if palette == "global" and global_palette is not None:
+            self._set_global_palette(*global_palette)
+        elif palette == "global" and sample_frames:
+            with stage("gif_palette"):
+                self._set_global_palette(*build_gif_palette(sample_frames))
+
+        self._canvas = None         # 当前显示内容（量化后的 RGB），用于差分
+        self._pending = None        # 等待写出的上一帧，留一帧以便合并时长、决定处置方式
+        self._bayer = None
+        self._tmp_path = path + ".part"
+        self._fp = open(self._tmp_path, "wb")
+
+    def _set_global_palette(self, palette_bytes, colors):
+        self._global_palette = palette_bytes
+        self._global_colors = colors
+        self._global_lut = np.frombuffer(palette_bytes, dtype=np.uint8).reshape(256, 3)
+        self._global_im = Image.new("P", (1, 1))
+        self._global_im.putpalette(palette_bytes)
+
+    def _write_header(self, size, palette_bytes):
+        self.size = size
+        write_gif_header(self._fp, size, palette_bytes, self.loop)
+
+    def _ordered_dither(self, rgb):
+        h, w = rgb.shape[:2]
+        if self._bayer is None or self._bayer.shape != (h, w):
+            reps = (h // 8 + 1, w // 8 + 1)
+            self._bayer = np.tile(_BAYER_8X8, reps)[:h, :w]
+        # 自适应调色板的颜色比均匀色立方密得多，抖动幅度取 ±8 足以消除色带
+        out = rgb.astype(np.float32) + (self._bayer * 16.0)[:, :, None]
+        return np.clip(out, 0, 255).astype(np.uint8)
+
+    def _quantize(self, rgb, palette_im, colors):
+        """把 RGB 数组映射到给定调色板，返回索引数组"""
+        if self.dither == "ordered":
+            rgb = self._ordered_dither(rgb)
+        dither = Image.Dither.FLOYDSTEINBERG if self.dither == "floyd" else Image.Dither.NONE
+        q = Image.fromarray(rgb, "RGB").quantize(palette=palette_im, dither=dither)
+        idx = np.array(q, dtype=np.uint8)
+        idx[idx >= colors] = 0  # 补齐项与 0 号同色
+        return idx
+
+    def _local_palette(self, rgb):
+        q = Image.fromarray(rgb, "RGB").quantize(colors=GIF_PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+        used = len(q.getcolors(256) or []) or GIF_PALETTE_COLORS
+        palette_bytes, colors = _full_palette(q.getpalette()[:used * 3], used)
+        palette_im = Image.new("P", (1, 1))
+        palette_im.putpalette(palette_bytes)
+        return palette_bytes, colors, palette_im
+
+    def add_frame(self, img):
+        with stage("gif_quantize"):
+            frame = self._encode_frame(img)
+        if frame is None:
+            return
+        with stage("gif_write"):
+            self._flush()
+        self._pending = frame
+        self.frame_count += 1
+
+    def _encode_frame(self, img):
+        """量化并与上一帧比较，返回待写出的帧；与上一帧完全相同时合并进上一帧，返回 None"""
+        if isinstance(img, np.ndarray) and self.size not in (None, (img.shape[1], img.shape[0])):
+            img = Image.fromarray(img, "RGB")
+        if isinstance(img, np.ndarray):
+            alpha, rgb = None, img
+            size = (img.shape[1], img.shape[0])
+        else:
+            if self.size is not None and img.size != self.size:
+                img = img.resize(self.size)
+            alpha = _alpha_mask(img)
+            rgb = np.asarray(img.convert("RGB"))
+            size = img.size
+
+        if self.palette_mode == "global" and self._global_palette is None:
+            self._set_global_palette(*build_gif_palette([Image.fromarray(rgb, "RGB")]))
+
+        local = None
+        if self.palette_mode == "global":
+            # 先在 1/16 的抽样像素上（不抖动）估算全局调色板的误差，
+            # 表达不了这一帧（例如转场到完全不同的画面）时退回局部调色板
+            probe = np.ascontiguousarray(rgb[::4, ::4])
+            q = Image.fromarray(probe, "RGB").quantize(palette=self._global_im, dither=Image.Dither.NONE)
+            err = np.abs(self._global_lut[np.asarray(q)].astype(np.int16) - probe).mean()
+            if err > self.palette_tolerance:
+                local = self._local_palette(rgb)
+        else:
+            local = self._local_palette(rgb)
+
+        if local is not None:
+            palette_bytes, colors, palette_im = local
+            idx = self._quantize(rgb, palette_im, colors)
+            lut = np.frombuffer(palette_bytes, dtype=np.uint8).reshape(256, 3)
+            self.local_palette_frames += 1
+        else:
+            palette_bytes = None
+            idx = self._quantize(rgb, self._global_im, self._global_colors)
+            lut = self._global_lut
+
+        if self.size is None and not self.header:
+            self.size = size
+        elif self.size is None:
+            if self._global_palette is None:
+                # 逐帧模式下第一帧的调色板就是全局调色板
+                self._global_palette = palette_bytes
+            self._write_header(size, self._global_palette)
+        if palette_bytes == self._global_palette:
+            palette_bytes = None
+
+        recon = lut[idx]
+        offset = (0, 0)
+        transparency = None
+
+        if alpha is not None:
+            # 源图本身有透明区域：整帧写出，且上一帧必须清除为背景
+            idx[alpha] = GIF_TRANSPARENT_INDEX
+            transparency = GIF_TRANSPARENT_INDEX
+            if self._pending is not None:
+                self._pending["disposal"] = 2
+            self._canvas = None
+        elif self.delta and self._canvas is not None:
+            changed = (recon != self._canvas).any(axis=2)
+            box = _bbox(changed)
+            if box is None:
+                # 与上一帧完全相同：只延长上一帧的显示时间
+                self._pending["duration"] += self.duration
+                self.frame_count += 1
+                return None
+            x0, y0, x1, y1 = box
+            idx = idx[y0:y1, x0:x1].copy()
+            idx[~changed[y0:y1, x0:x1]] = GIF_TRANSPARENT_INDEX
+            transparency = GIF_TRANSPARENT_INDEX
+            offset = (x0, y0)
+            self._canvas[y0:y1, x0:x1] = recon[y0:y1, x0:x1]
+        else:
+            self._canvas = recon if self.delta else None
+
+        return {
+            "idx": idx,
+            "offset": offset,
+            "palette": palette_bytes,
+            "transparency": transparency,
+            "duration": self.duration,
+            "disposal": 1 if self.delta else 0,
+        }
+
+    def _flush(self):
+        frame = self._pending
+        if frame is None:
+            return
+        self._pending = None
+
+        im = Image.fromarray(frame["idx"], "P")
+        im.putpalette(frame["palette"] or self._global_palette)
+        params = {
+            "duration": frame["duration"],
+            "disposal": frame["disposal"],
+            "include_color_table": frame["palette"] is not None,
+        }
+        if frame["transparency"] is not None:
+            params["transparency"] = frame["transparency"]
+        for chunk in GifImagePlugin.getdata(im, frame["offset"], **params):
+            self._fp.write(chunk)
+        self.written_frames += 1
+
+    def close(self):
+        if self._fp is None:
+            return
+        try:
+            if self.frame_count == 0 and self.header:
+                raise MediaError("没有读取到任何帧，无法生成 GIF")
+            with stage("gif_write"):
+                self._flush()
+            if self.header:
+                self._fp.write(b";")
+            self._fp.close()
+            self._fp = None
+            os.replace(self._tmp_path, self.path)
+        except Exception:
+            self.abort()
+            raise
+
+    def abort(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def _even_indices(total, count):
+    count = min(count, total)
+    return [int(i * total / count) for i in range(count)]
+
+
+def sample_image_files(paths, count=8):
+    """从图片列表中均匀取几张缩略图，用于构建全局调色板"""
+    samples = []
+    for i in _even_indices(len(paths), count) if paths else []:
+        with Image.open(paths[i]) as img:
+            img.thumbnail((256, 256))
+            samples.append(img.convert("RGBA").convert("RGB"))
+    return samples
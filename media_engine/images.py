@@ -0,0 +1,318 @@
+"""
+图片处理：格式转换、网格裁剪、合成 GIF（或动画 WebP / APNG）
+"""
+
+import collections
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from .cache import MISS as CACHE_MISS
+from .common import (
+    ANIMATION_EXTS, ANIMATION_FORMATS, PROCESSING, MediaError, check_cancel, default_writer_count,
+    guess_animation_format, media_name, report,
+)
+from .encoders import encode_options, save_image
+from .profiling import current_recorder, stage
+
+
+class BatchResult:
+    """
+    批处理结果：succeeded / cached / resumed 为输出路径列表（cached 是从结果缓存还原的，
+    resumed 是断点清单里上次已完成的），failed / skipped 为 (输入路径, 原因) 列表
+    """
+
+    def __init__(self):
+        self.succeeded = []
+        self.cached = []
+        self.resumed = []
+        self.failed = []
+        self.skipped = []
+
+    @property
+    def total(self):
+        return len(self.succeeded) + len(self.cached) + len(self.resumed) + len(self.failed) + len(self.skipped)
+
+    def summary(self):
+        text = f"成功 {len(self.succeeded)}，失败 {len(self.failed)}，跳过 {len(self.skipped)}"
+        if self.cached:
+            text += f"，缓存命中 {len(self.cached)}"
+        if self.resumed:
+            text += f"，上次已完成 {len(self.resumed)}"
+        return text
+
+
+def default_process_count():
+    return max(1, os.cpu_count() or 1)
+
+
+def _convert_one(img_path, output_path, fmt, encode):
+    """
+    进程池里执行的单张转换，返回 (错误信息或 None, 解码秒数, 编码写盘秒数)；
+    出错返回错误信息而不是抛出，避免中断整批。计时在子进程里测，由父进程记入阶段统计。
+    """
+    t0 = time.perf_counter()
+    t1 = None
+    try:
+        with Image.open(img_path) as img:
+            img.load()
+            t1 = time.perf_counter()
+            save_image(img, output_path, fmt, encode)
+        return None, t1 - t0, time.perf_counter() - t1
+    except Exception as e:
+        t1 = t1 or time.perf_counter()
+        return f"{type(e).__name__}: {e}", t1 - t0, time.perf_counter() - t1
+
+
+def _convert_task(task):
+    return _convert_one(*task)
+
+
+def _checkpoint_item(img_path):
+    st = os.stat(img_path)
+    return f"{os.path.abspath(img_path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def convert_images(image_files, output_dir, fmt, progress=None, workers=None, skip_existing=False, cache=None,
+                   cancel=None, checkpoint=False, encode=None):
+    """
+    批量转换图片为 fmt 格式，输出为 {原名}.{fmt}，返回 BatchResult。
+
+    多张图片时用进程池并行（默认进程数为 CPU 核数）；进度按输入顺序汇报；
+    单张失败只记入 failed，不影响其余图片。
+    以下情况跳过：输入不存在、与前面的图片输出同名、skip_existing 时输出已存在。
+    给出 cache（cache.ResultCache）时，缓存中已有的直接还原，记入 cached。
+    checkpoint 为 True 时在输出目录记断点清单（输入路径 + 大小 + 修改时间），重跑时清单里已完成
+    且输出还在的记入 resumed；全部成功后删除清单，有失败时保留，下次只重做失败和没做的。
+    cancel 置位后在两张图片之间停止并抛出 Cancelled，清单保持有效。
+    encode 为编码参数（encoders.encode_options 的结果），默认 balanced 预设。
+    """
+    if not image_files:
+        raise MediaError("请先添加图片")
+
+    os.makedirs(output_dir, exist_ok=True)
+    fmt = fmt.strip().lower()
+    if encode is None:
+        encode = encode_options(fmt)
+    key_params = {"fmt": fmt, "encode": encode}
+
+    ckpt = None
+    if checkpoint:
+        from .checkpoint import Checkpoint, checkpoint_path
+        ckpt = Checkpoint(checkpoint_path(output_dir, f"convert.{fmt}"), "convert", key_params)
+
+    result = BatchResult()
+    tasks = []
+    seen_outputs = set()
+    for img_path in image_files:
+        output_path = os.path.join(output_dir, f"{media_name(img_path)}.{fmt}")
+        if not os.path.isfile(img_path):
+            result.skipped.append((img_path, "文件不存在"))
+        elif output_path in seen_outputs:
+            result.skipped.append((img_path, f"与其他图片输出同名: {os.path.basename(output_path)}"))
+        elif skip_existing and os.path.exists(output_path):
+            result.skipped.append((img_path, "输出已存在"))
+        elif ckpt is not None and _checkpoint_item(img_path) in ckpt and os.path.isfile(output_path):
+            seen_outputs.add(output_path)
+            result.resumed.append(output_path)
+        else:
+            seen_outputs.add(output_path)
+            key = cache.key("convert", img_path, key_params) if cache is not None else None
+            if key is not None and cache.fetch(key, output_dir) is not CACHE_MISS:
+                result.cached.append(output_path)
+            else:
+                tasks.append((img_path, output_path, fmt, key))
+
+    total = len(image_files)
+    done = len(result.skipped) + len(result.cached) + len(result.resumed)
+    report(progress, done, total, PROCESSING)
+
+    jobs = [task[:3] + (encode,) for task in tasks]
+    workers = min(workers or default_process_count(), len(tasks))
+    if workers <= 1:
+        outcomes = map(_convert_task, jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # map 按提交顺序返回结果；分块减少几千个小任务的进程间通信开销
+        chunksize = max(1, min(32, len(tasks) // (workers * 4)))
+        outcomes = executor.map(_convert_task, jobs, chunksize=chunksize)
+
+    recorder = current_recorder()
+    try:
+        for (img_path, output_path, _, key), (error, decode_s, encode_s) in zip(tasks, outcomes):
+            if recorder is not None:
+                recorder.add("decode", decode_s)
+                recorder.add("encode_write", encode_s)
+            if error is None:
+                result.succeeded.append(output_path)
+                if ckpt is not None:
+                    ckpt.mark(_checkpoint_item(img_path))
+                if key is not None:
+                    cache.store(key, "convert", img_path, dict(key_params, output_dir=output_dir),
+                                [os.path.basename(output_path)], output_path)
+            else:
+                result.failed.append((img_path, error))
+            done += 1
+            report(progress, done, total, PROCESSING)
+            check_cancel(cancel)
+    except BaseException:
+        if ckpt is not None:
+            ckpt.save()
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    if ckpt is not None:
+        if result.failed:
+            ckpt.save()
+        else:
+            ckpt.finish()
+    return result
+
+
+def grid_crop(img_path, output_dir, cols, rows, fmt="png", progress=None, overlap=0, workers=None, encode=None,
+              sink="files"):
+    """
+    按 cols x rows 网格裁剪，输出为 {原名}_{行:02d}_{列:02d}.{fmt}，
+    返回 (张数, 单张宽, 单张高)。按区域读取、并行编码，见 tiles.crop_grid。
+    encode 为编码参数（encoders.encode_options 的结果），默认 balanced 预设。
+    sink 为 tar / zip 时打包成一个归档加索引（见 sinks 模块）。
+    """
+    from .tiles import crop_grid
+    return crop_grid(img_path, output_dir, cols, rows, fmt, overlap, workers, progress=progress, encode=encode,
+                     sink=sink)
+
+
+# EXIF 方向为 5~8 时图片要转 90 度，显示尺寸是文件里宽高对调
+_ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def _orientation(img):
+    return img.getexif().get(0x0112, 1)
+
+
+def gif_frame_size(first_path, max_side=None):
+    """合成 GIF 的统一尺寸：第一张图按 EXIF 方向摆正后的尺寸（只读文件头），max_side 限制最长边"""
+    with Image.open(first_path) as img:
+        w, h = img.size
+        if _orientation(img) in _ROTATED_ORIENTATIONS:
+            w, h = h, w
+    if max_side and max(w, h) > max_side:
+        scale = max_side / max(w, h)
+        w, h = max(1, round(w * scale)), max(1, round(h * scale))
+    return w, h
+
+
+def _contain_size(w, h, size):
+    """保持宽高比放进 size 的最大尺寸（与 ImageOps.contain 的取整相同）"""
+    if w * size[1] > h * size[0]:
+        return size[0], max(1, round(h / w * size[0]))
+    if w * size[1] < h * size[0]:
+        return max(1, round(w / h * size[1])), size[1]
+    return size
+
+
+def load_frame(path, size, recorder=None):
+    """
+    解码一张图片，按 EXIF 方向摆正，保持宽高比缩放到 size 以内，居中放在 size 大小的透明画布上，返回 RGBA 图片。
+    JPEG 用 draft 直接按 1/2、1/4、1/8 解码（不小于目标尺寸的最小比例），其余格式解码后
+    先整数倍 reduce 再精确缩放，都不做全尺寸重采样。recorder 用于在线程池里记阶段耗时。
+    """
+    with Image.open(path) as img:
+        orientation = _orientation(img)
+        rotated = orientation in _ROTATED_ORIENTATIONS
+        w, h = (img.height, img.width) if rotated else img.size
+        fit = _contain_size(w, h, size)
+        with stage("decode", recorder=recorder):
+            img.draft(None, fit[::-1] if rotated else fit)
+            img.load()
+        with stage("resize", recorder=recorder):
+            if orientation != 1:
+                img = ImageOps.exif_transpose(img)
+            if img.size != fit:
+                img = img.resize(fit, Image.Resampling.BICUBIC, reducing_gap=2.0)
+            if img.mode != "RGBA":
+                img = img.convert("RGBA")
+            if fit != size:
+                canvas = Image.new("RGBA", size, (0, 0, 0, 0))
+                canvas.paste(img, ((size[0] - fit[0]) // 2, (size[1] - fit[1]) // 2))
+                img = canvas
+    return img
+
+
+def iter_loaded_frames(paths, size, workers=None):
+    """
+    用线程池并行解码 + 缩放（Pillow 解码和缩放时释放 GIL），按输入顺序产出。
+    最多 workers * 2 张在途，内存只与单帧尺寸有关，与图片数量无关。
+    """
+    workers = workers or default_writer_count()
+    recorder = current_recorder()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = collections.deque()
+    paths = iter(paths)
+    try:
+        for path in itertools.islice(paths, workers * 2):
+            pending.append(pool.submit(load_frame, path, size, recorder))
+        while pending:
+            with stage("decode_wait"):
+                img = pending.popleft().result()
+            for path in itertools.islice(paths, 1):
+                pending.append(pool.submit(load_frame, path, size, recorder))
+            yield img
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def make_gif(image_files, output_path, duration=100, loop=True, palette="global", dither="none",
+             delta=True, progress=None, max_side=None, workers=None, anim_format=None, anim_encode=None,
+             compare_gif=False):
+    """
+    按顺序把图片合成为 GIF，返回输出路径。
+    所有图片按 EXIF 方向摆正，保持宽高比缩放到第一张的尺寸以内（max_side 限制最长边），空出的边透明；
+    并行解码、逐帧送进流式编码器，内存占用与图片数量无关。
+    anim_format 为 webp / apng 时合成动画 WebP / APNG（未给出时按输出文件的扩展名判断，默认 gif），
+    anim_encode 与 compare_gif 同 video_to_gif。
+    """
+    if not image_files:
+        raise MediaError("请先添加图片")
+    if not output_path:
+        raise MediaError("请选择输出路径（需要是一个 .gif 文件名）")
+    if os.path.isdir(output_path):
+        raise MediaError("输出路径是文件夹，请选择一个 .gif 文件名（例如：out.gif）")
+    if duration <= 0:
+        raise MediaError("请输入有效的帧间隔（正整数，单位毫秒）")
+
+    from .animated import GifComparison, open_animation_writer
+    from .gif import sample_image_files
+
+    anim_format = anim_format or guess_animation_format(output_path)
+    if anim_format not in ANIMATION_FORMATS:
+        raise MediaError(f"不支持的动画格式: {anim_format}")
+    ext = os.path.splitext(output_path)[1].lower()
+    if ext != ANIMATION_EXTS[anim_format] and not (anim_format == "apng" and ext == ".apng"):
+        output_path += ANIMATION_EXTS[anim_format]
+    compare_gif = compare_gif and anim_format != "gif"
+    out_dir = os.path.dirname(output_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    with stage("gif_palette"):
+        needs_palette = palette == "global" and (anim_format == "gif" or compare_gif)
+        sample_frames = sample_image_files(image_files) if needs_palette else None
+
+    total = len(image_files)
+    size = gif_frame_size(image_files[0], max_side)
+    loop = 0 if loop else 1
+    gif_options = {"palette": palette, "sample_frames": sample_frames, "dither": dither}
+    writer = open_animation_writer(anim_format, output_path, duration, loop, anim_encode, delta, **gif_options)
+    if compare_gif:
+        writer = GifComparison(writer, anim_format, duration, loop, delta, **gif_options)
+    with writer:
+        for i, img in enumerate(iter_loaded_frames(image_files, size, workers)):
+            writer.add_frame(img)
+            report(progress, i + 1, total, PROCESSING)
+    return output_path
@@ -0,0 +1,412 @@
+"""
+视频任务队列：多文件、多操作，CPU 密集与 I/O 密集分开限流
+
+- CPU 池：抽帧、转 GIF（解码 + 编码）、单张图片转换（监视文件夹时图片也走队列）
+- I/O 池：提取音频（主要是等待 ffmpeg / moviepy 子进程和磁盘）
+
+支持优先级（数值大的先执行）、逐任务状态、取消、失败重试；
+输出相同文件的任务不会同时运行。抽帧任务带 checkpoint=True 时记断点清单，
+取消或中断后重新提交同样的任务会接着抽。stats() 给出整体吞吐（文件/分钟、帧/秒）；
+每个任务结束后 job.report 为分阶段计时报告（见 profiling.JobProfile）。
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from .common import ANIMATION_EXTS, Cancelled, MediaError, media_name
+from .profiling import JobProfile
+
+
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+
+# 操作 -> 所属线程池
+JOB_POOLS = {
+    "extract": "cpu",
+    "to-gif": "cpu",
+    "convert": "cpu",
+    "to-mp3": "io",
+    "to-audio": "io",
+}
+
+
+def default_cpu_workers():
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def _output_key(op, input_path, params):
+    """同一个 key 的任务会写同一批输出文件，不能同时运行"""
+    output_dir = os.path.abspath(params.get("output_dir", "."))
+    name = media_name(input_path)
+    if op == "extract":
+        return ("extract", output_dir, name)
+    if op == "to-gif":
+        return ("file", os.path.join(output_dir, name + ANIMATION_EXTS[params.get("anim_format", "gif")]))
+    if op == "to-mp3":
+        return ("file", os.path.join(output_dir, f"{name}.mp3"))
+    if op == "convert":
+        return ("file", os.path.join(output_dir, f"{name}.{params.get('fmt', 'webp').strip().lower()}"))
+    if op == "to-audio" and params.get("audio_format", "auto") != "auto":
+        return ("file", os.path.join(output_dir, f"{name}.{params['audio_format']}"))
+    return (op, output_dir, name)
+
+
+def job_outputs(op, input_path, params, result, since):
+    """任务写出的文件路径（用于统计输出字节数），列不出来时返回 None"""
+    from .cache import output_files
+    try:
+        names = output_files(op, input_path, params, result, since)
+    except (OSError, MediaError, KeyError, TypeError):
+        return None
+    return [os.path.join(params["output_dir"], name) for name in names]
+
+
+def run_video_job(op, input_path, params, progress=None, cancel=None):
+    """执行单个视频操作或单张图片转换，返回结果（输出路径或帧数）"""
+    output_dir = params["output_dir"]
+    if op == "extract":
+        from .video import extract_frames
+        return extract_frames(
+            input_path, output_dir, params.get("count", 100), params.get("fmt", "jpg"),
+            params.get("strategy", "auto"), params.get("writers"), progress, cancel=cancel,
+            mode=params.get("mode", "uniform"), threshold=params.get("threshold", 0.35),
+            dedup=params.get("dedup"), dedup_threshold=params.get("dedup_threshold", 5),
+            checkpoint=params.get("checkpoint", False), segments=params.get("segments", 1),
+            sink=params.get("sink", "files"),
+        )
+    if op == "to-gif":
+        from .video import video_to_gif
+        return video_to_gif(
+            input_path, output_dir, params.get("fps", 10), params.get("scale", 0.5),
+            params.get("palette", "global"), params.get("dither", "none"), params.get("delta", True),
+            progress, cancel=cancel, start=params.get("start"), end=params.get("end"),
+            duration=params.get("duration"), backend=params.get("backend", "opencv"),
+            segments=params.get("segments", 1), anim_format=params.get("anim_format", "gif"),
+            anim_encode=params.get("anim_encode"), compare_gif=params.get("compare_gif", False),
+        )
+    if op == "to-mp3":
+        from .video import video_to_mp3
+        return video_to_mp3(input_path, output_dir, progress, cancel=cancel)
+    if op == "to-audio":
+        # 只用到 ffmpeg 子进程，不加载 cv2
+        from .audio import extract_audio
+        return extract_audio(input_path, output_dir, params.get("audio_format", "auto"),
+                             params.get("copy", True), progress, cancel)
+    if op == "convert":
+        from .images import convert_images
+        result = convert_images([input_path], output_dir, params.get("fmt", "webp"), progress, workers=1,
+                                cancel=cancel, encode=params.get("encode"))
+        if result.failed or result.skipped:
+            raise MediaError((result.failed or result.skipped)[0][1])
+        return (result.succeeded or result.resumed or result.cached)[0]
+    raise ValueError(f"未知操作: {op}")
+
+
+class Job:
+    """一个输入文件上的一个操作"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, op, input_path, params, priority=0, max_retries=0):
+        self.id = next(Job._ids)
+        self.op = op
+        self.input_path = input_path
+        self.params = params
+        self.priority = priority
+        self.max_retries = max_retries
+        self.pool = JOB_POOLS[op]
+        self.output_key = _output_key(op, input_path, params)
+
+        self.status = "queued"
+        self.attempts = 0
+        self.done = 0           # 进度：已处理单位数（帧）
+        self.total = None
+        self.message = ""       # 可能是 ProgressTemplate，显示时用 format_progress
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.cached = False     # 结果是否直接取自结果缓存
+        self.report = None      # 结束后的分阶段计时报告
+
+    @property
+    def percent(self):
+        if self.status == "done":
+            return 100.0
+        if self.total:
+            return min(100.0, self.done / self.total * 100)
+        return 0.0
+
+    def __repr__(self):
+        return f"<Job #{self.id} {self.op} {os.path.basename(self.input_path)} {self.status}>"
+
+
+class JobScheduler:
+    """
+    用法：
+        scheduler = JobScheduler(cpu_workers=2, io_workers=4)
+        scheduler.submit("extract", "a.mp4", output_dir="out", count=100)
+        scheduler.wait()
+        scheduler.shutdown()
+
+    on_update(job) 在工作线程里调用，状态或进度变化时触发。
+    给出 cache（cache.ResultCache）时，输入和参数都没变的任务直接从缓存还原输出。
+    profile / trace_memory 为每个任务打开 cProfile / tracemalloc，结果写进 job.report。
+    """
+
+    def __init__(self, cpu_workers=None, io_workers=2, on_update=None, runner=run_video_job, cache=None,
+                 profile=False, trace_memory=False):
+        self.limits = {"cpu": cpu_workers or default_cpu_workers(), "io": max(1, io_workers)}
+        self.on_update = on_update
+        self.runner = runner
+        self.cache = cache
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.jobs = {}
+
+        self._cond = threading.Condition()
+        self._queues = {"cpu": [], "io": []}
+        self._seq = itertools.count()
+        self._busy_outputs = set()
+        self._running = 0
+        self._closed = False
+
+        self._first_start = None
+        self._last_finish = None
+        self._frames = 0
+        self._files = 0
+        self._cached = 0
+
+        self._threads = []
+        for pool, count in self.limits.items():
+            for _ in range(count):
+                t = threading.Thread(target=self._worker, args=(pool,), daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    # ---------- 提交 / 取消 / 重试 ----------
+    def submit(self, op, input_path, priority=0, max_retries=0, **params):
+        if op not in JOB_POOLS:
+            raise ValueError(f"未知操作: {op}")
+        job = Job(op, input_path, params, priority, max_retries)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("任务队列已关闭")
+            self.jobs[job.id] = job
+            self._push(job)
+        self._notify(job)
+        return job
+
+    def _push(self, job):
+        heapq.heappush(self._queues[job.pool], (-job.priority, next(self._seq), job))
+        self._cond.notify_all()
+
+    def cancel(self, job_id):
+        """排队中的任务直接取消；运行中的任务在下一帧之间停止。返回是否发出了取消"""
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.status not in ("queued", "running"):
+                return False
+            job.cancel_event.set()
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished = time.monotonic()
+                self._cond.notify_all()
+        self._notify(job)
+        return True
+
+    def retry(self, job_id):
+        """把失败或已取消的任务重新排队"""
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.status not in ("failed", "cancelled"):
+                return False
+            job.status = "queued"
+            job.error = None
+            job.done, job.total = 0, None
+            job.cancel_event = threading.Event()
+            self._push(job)
+        self._notify(job)
+        return True
+
+    def set_priority(self, job_id, priority):
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != "queued":
+                return False
+            job.priority = priority
+            queue = self._queues[job.pool]
+            queue[:] = [(-j.priority, seq, j) for _, seq, j in queue]
+            heapq.heapify(queue)
+        self._notify(job)
+        return True
+
+    # ---------- 调度 ----------
+    def _take(self, pool):
+        """取出该池中优先级最高、且输出不与运行中任务冲突的任务（调用方持有锁）"""
+        queue = self._queues[pool]
+        skipped = []
+        job = None
+        while queue:
+            item = heapq.heappop(queue)
+            candidate = item[2]
+            if candidate.status != "queued":
+                continue  # 已取消
+            if candidate.output_key in self._busy_outputs:
+                skipped.append(item)
+                continue
+            job = candidate
+            break
+        for item in skipped:
+            heapq.heappush(queue, item)
+        return job
+
+    def _worker(self, pool):
+        while True:
+            with self._cond:
+                job = None
+                while not self._closed:
+                    job = self._take(pool)
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                if job is None:
+                    return
+                job.status = "running"
+                job.attempts += 1
+                job.started = time.monotonic()
+                self._busy_outputs.add(job.output_key)
+                self._running += 1
+                if self._first_start is None:
+                    self._first_start = job.started
+            self._notify(job)
+            self._run(job)
+
+    def _run(self, job):
+        def progress(done, total, message):
+            job.done, job.total, job.message = done, total, message
+            self._notify(job)
+
+        def call():
+            return self.runner(job.op, job.input_path, job.params, progress, job.cancel_event)
+
+        status, result, error = "done", None, None
+        prof = JobProfile(job.op, [job.input_path], self.profile, self.trace_memory)
+        try:
+            with prof:
+                if self.cache is not None:
+                    result, job.cached = self.cache.run(job.op, job.input_path, job.params, call)
+                    if job.cached:
+                        job.message = "缓存命中"
+                else:
+                    result = call()
+        except Cancelled:
+            status = "cancelled"
+        except Exception as e:
+            status, error = "failed", e
+        outputs = job_outputs(job.op, job.input_path, job.params, result, prof.started) if status == "done" else None
+        report = prof.report(result, outputs, id=job.id, attempt=job.attempts, cached=job.cached)
+
+        with self._cond:
+            self._busy_outputs.discard(job.output_key)
+            self._running -= 1
+            job.finished = time.monotonic()
+            job.report = report
+            if status == "failed" and job.attempts <= job.max_retries and not job.cancel_event.is_set():
+                # 自动重试：放回队尾（同优先级中最后）
+                job.status = "queued"
+                job.error = error
+                job.done, job.total = 0, None
+                self._push(job)
+            else:
+                job.status, job.result, job.error = status, result, error
+                self._last_finish = job.finished
+                if status == "done":
+                    self._files += 1
+                    self._cached += job.cached
+                    if job.pool == "cpu":
+                        self._frames += job.done
+            self._cond.notify_all()
+        self._notify(job)
+
+    def _notify(self, job):
+        if self.on_update is not None:
+            try:
+                self.on_update(job)
+            except Exception:
+                pass
+
+    def clear_finished(self):
+        """从列表中移除已结束（完成、失败、取消）的任务，返回移除数量"""
+        with self._cond:
+            finished = [i for i, j in self.jobs.items() if j.status not in ("queued", "running")]
+            for i in finished:
+                del self.jobs[i]
+        return len(finished)
+
+    # ---------- 查询 / 结束 ----------
+    def pending(self):
+        with self._cond:
+            return sum(1 for j in self.jobs.values() if j.status in ("queued", "running"))
+
+    def wait(self, timeout=None):
+        """等待所有任务结束（完成、失败或取消），超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while any(j.status in ("queued", "running") for j in self.jobs.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self):
+        """整体统计：各状态任务数，以及从第一个任务开始到现在（或最后完成）的吞吐"""
+        with self._cond:
+            counts = {state: 0 for state in JOB_STATES}
+            running_frames = 0
+            for j in self.jobs.values():
+                counts[j.status] += 1
+                if j.status == "running" and j.pool == "cpu":
+                    running_frames += j.done
+            if self._first_start is None:
+                elapsed = 0.0
+            elif self._running or counts["queued"]:
+                elapsed = time.monotonic() - self._first_start
+            else:
+                elapsed = self._last_finish - self._first_start
+            frames = self._frames + running_frames
+            files = self._files
+            cached = self._cached
+
+        minutes = elapsed / 60
+        return {
+            "counts": counts,
+            "elapsed": elapsed,
+            "files": files,
+            "cached": cached,
+            "frames": frames,
+            "files_per_min": files / minutes if minutes > 0 else 0.0,
+            "frames_per_s": frames / elapsed if elapsed > 0 else 0.0,
+            "workers": dict(self.limits),
+        }
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """关闭队列；wait 时先等排队任务跑完，cancel_pending 时取消所有未完成任务"""
+        if wait and not cancel_pending:
+            self.wait()
+        with self._cond:
+            if cancel_pending:
+                for job in self.jobs.values():
+                    if job.status in ("queued", "running"):
+                        job.cancel_event.set()
+                        if job.status == "queued":
+                            job.status = "cancelled"
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
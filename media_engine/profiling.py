@@ -0,0 +1,413 @@
+"""
+处理过程计时：各阶段（解码、缩放、颜色转换、转 PIL、GIF 量化、编码写盘……）的累计耗时和次数，
+可选 cProfile / tracemalloc，结束时生成 JSON 任务报告。
+
+处理函数里用 stage("decode") 包住对应的调用；不在 JobProfile 里运行时 stage 什么也不做，
+开销只是一次 ContextVar 读取。写入线程池里的阶段记到创建线程池时的记录器上
+（AsyncImageWriter 等在创建时取 current_recorder()），所以与主线程的阶段在时间上会重叠，
+各阶段占比之和可以超过 100%。
+"""
+
+import contextlib
+import contextvars
+import os
+import sys
+import threading
+import time
+import unicodedata
+
+
+# 阶段名 -> 显示名
+STAGE_LABELS = {
+    "seek": "定位",
+    "decode": "解码",
+    "retrieve": "取帧",
+    "resize": "缩放",
+    "color_convert": "颜色转换",
+    "to_pil": "转 PIL",
+    "decode_wait": "等待解码",
+    "scene_detect": "镜头检测",
+    "dedup_hash": "去重哈希",
+    "gif_palette": "调色板",
+    "gif_quantize": "GIF 量化",
+    "gif_write": "GIF 写盘",
+    "anim_encode": "动画编码",
+    "anim_write": "动画写盘",
+    "crop": "裁剪",
+    "encode_write": "编码写盘",
+    "write_wait": "等待写入",
+    "ffmpeg": "ffmpeg",
+}
+
+# 只计次数、不计时的计数器 -> 显示名
+COUNTER_LABELS = {
+    "frame_alloc": "帧数组分配",
+}
+
+# 操作 -> (计数的阶段, 单位)，用于计算吞吐；GIF 以外的动画格式改按 anim_encode 计数
+ITEM_STAGES = {
+    "extract": ("encode_write", "帧"),
+    "to-gif": ("gif_quantize", "帧"),
+    "convert": ("encode_write", "张"),
+    "grid-crop": ("encode_write", "张"),
+    "make-gif": ("gif_quantize", "张"),
+}
+
+_current = contextvars.ContextVar("media_engine_recorder", default=None)
+_NULL = contextlib.nullcontext()
+
+
+class StageRecorder:
+    """各阶段累计耗时与次数，可在多个线程里同时记录"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}    # 名字 -> [秒, 次数]
+        self.notes = {}     # annotate() 记下的附加项，原样放进报告
+
+    def add(self, name, seconds, count=1):
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                self.stages[name] = [seconds, count]
+            else:
+                entry[0] += seconds
+                entry[1] += count
+
+    def snapshot(self):
+        with self._lock:
+            return {name: tuple(v) for name, v in self.stages.items()}
+
+
+class _StageTimer:
+    __slots__ = ("recorder", "name", "count", "start")
+
+    def __init__(self, recorder, name, count):
+        self.recorder = recorder
+        self.name = name
+        self.count = count
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.add(self.name, time.perf_counter() - self.start, self.count)
+        return False
+
+
+def current_recorder():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def recording(recorder):
+    """在 with 块里把 recorder 设为当前记录器（子进程里单独计时，结束后把 snapshot 交回父进程）"""
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+
+def merge_stages(snapshot, recorder=None):
+    """把另一个记录器（例如子进程）的 snapshot 累加到 recorder（默认当前记录器）上"""
+    rec = recorder or _current.get()
+    if rec is not None:
+        for name, (seconds, count) in snapshot.items():
+            rec.add(name, seconds, count)
+
+
+def stage(name, count=1, recorder=None):
+    """with stage("resize"): ... 把耗时记到 recorder（默认当前任务的记录器）上；没有记录器时不计时"""
+    rec = recorder or _current.get()
+    if rec is None:
+        return _NULL
+    return _StageTimer(rec, name, count)
+
+
+def tally(name, n=1, recorder=None):
+    """计数器加 n（见 COUNTER_LABELS），与阶段记在同一个记录器上，报告里单独列出"""
+    rec = recorder or _current.get()
+    if rec is not None:
+        rec.add(name, 0.0, n)
+
+
+def annotate(name, value, recorder=None):
+    """在当前任务的报告里附加一项 name: value（例如与 GIF 的对比）；没有记录器时忽略"""
+    rec = recorder or _current.get()
+    if rec is not None:
+        with rec._lock:
+            rec.notes[name] = value
+
+
+def peak_rss():
+    """本进程（或其最大的子进程）的峰值常驻内存，字节；平台不支持时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux 的 ru_maxrss 会把 fork 时父进程的峰值带进来，本进程自己的峰值以 VmHWM 为准
+    own = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    own = int(line.split()[1])
+    except OSError:
+        pass
+    if own is None:
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = max(own, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux 单位为 KB，macOS 为字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _file_bytes(paths):
+    total = 0
+    for path in paths or ():
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+class JobProfile:
+    """
+    用法：
+        prof = JobProfile("extract", [path], profile=True)
+        with prof:
+            result = extract_frames(...)
+        report = prof.report(result, output_paths)
+
+    with 块里（以及它启动的写入线程里）经过的 stage() 都会被记录。
+    profile=True 时对当前线程做 cProfile；trace_memory=True 时用 tracemalloc 统计 Python 分配峰值
+    （进程级，几个任务同时运行时互相包含）。出错时 report() 照样可用，status 为 failed / cancelled。
+    """
+
+    def __init__(self, op, inputs, profile=False, trace_memory=False, top=25):
+        self.op = op
+        self.inputs = list(inputs)
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.top = top
+        self.recorder = StageRecorder()
+        self.status = "running"
+        self.error = None
+        self.wall = None
+        self._profiler = None
+        self._profile_error = None
+        self._started_tracemalloc = False
+        self._traced_peak = None
+
+    def __enter__(self):
+        self.started = time.time()
+        self._token = _current.set(self.recorder)
+        if self.trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+        if self.profile:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError as e:   # 同一时刻只能有一个 profiler
+                self._profiler, self._profile_error = None, str(e)
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall = time.perf_counter() - self._t0
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self.trace_memory:
+            import tracemalloc
+            self._traced_peak = tracemalloc.get_traced_memory()[1]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        _current.reset(self._token)
+
+        from .common import Cancelled
+        if exc_type is None:
+            self.status = "done"
+        else:
+            self.status = "cancelled" if issubclass(exc_type, (Cancelled, KeyboardInterrupt)) else "failed"
+            self.error = str(exc)
+        return False
+
+    def report(self, result=None, outputs=None, **extra):
+        """生成任务报告（dict，可直接 json.dump）；outputs 为输出文件列表，用于统计写出字节数"""
+        wall = self.wall if self.wall is not None else 0.0
+        stages, counters = {}, {}
+        for name, (seconds, count) in sorted(self.recorder.snapshot().items(), key=lambda kv: -kv[1][0]):
+            if name in COUNTER_LABELS:
+                counters[name] = count
+                continue
+            stages[name] = {
+                "seconds": round(seconds, 4),
+                "count": count,
+                "share": round(seconds / wall, 4) if wall > 0 else None,
+                "ms_per_call": round(seconds * 1000 / count, 3) if count else None,
+            }
+
+        items, unit = _count_items(self.op, result, stages)
+        rss = peak_rss()
+        data = {
+            "op": self.op,
+            "inputs": self.inputs,
+            "status": self.status,
+            "error": self.error,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_s": round(wall, 4),
+            "stages": stages,
+            "counters": counters,
+            "throughput": {
+                "items": items,
+                "unit": unit,
+                "per_s": round(items / wall, 2) if items and wall > 0 else None,
+            },
+            "bytes_in": _file_bytes(self.inputs),
+            "bytes_out": _file_bytes(outputs),
+            "peak_rss_mb": round(rss / 1024 / 1024, 1) if rss is not None else None,
+        }
+        if self.trace_memory:
+            data["traced_peak_mb"] = round((self._traced_peak or 0) / 1024 / 1024, 1)
+        if self.profile:
+            data["profile"] = self._profile_rows() if self._profiler is not None else {"error": self._profile_error}
+        data.update(self.recorder.notes)
+        data.update(extra)
+        return data
+
+    def _profile_rows(self):
+        import pstats
+        stats = pstats.Stats(self._profiler).stats
+        rows = sorted(stats.items(), key=lambda kv: -kv[1][3])[:self.top]
+        return [
+            {"function": f"{os.path.basename(filename)}:{line}({func})", "calls": nc,
+             "tottime_s": round(tt, 4), "cumtime_s": round(ct, 4)}
+            for (filename, line, func), (cc, nc, tt, ct, _) in rows
+        ]
+
+
+def _count_items(op, result, stages):
+    stage_name, unit = ITEM_STAGES.get(op, (None, None))
+    if op == "extract" and isinstance(result, int):
+        return result, unit             # 关键帧模式由 ffmpeg 直接写图，没有 encode_write 阶段
+    if op == "grid-crop" and isinstance(result, tuple):
+        return result[0], unit
+    if op == "convert" and hasattr(result, "succeeded"):
+        return len(result.succeeded), unit
+    if stage_name in stages:
+        return stages[stage_name]["count"], unit
+    if op in ("to-gif", "make-gif") and "anim_encode" in stages:
+        return stages["anim_encode"]["count"], unit
+    return None, unit
+
+
+def merge_reports(reports):
+    """把一批任务的报告合并成一份（耗时、各阶段、字节数相加），用于批次汇总"""
+    reports = [r for r in reports if r]
+    merged = {"op": "batch", "jobs": len(reports), "wall_s": 0.0, "stages": {}, "counters": {},
+              "throughput": {"items": 0, "unit": None, "per_s": None},
+              "bytes_in": 0, "bytes_out": 0, "peak_rss_mb": None}
+    for r in reports:
+        merged["wall_s"] += r["wall_s"]
+        merged["bytes_in"] += r["bytes_in"]
+        merged["bytes_out"] += r["bytes_out"]
+        for name, s in r["stages"].items():
+            entry = merged["stages"].setdefault(name, {"seconds": 0.0, "count": 0})
+            entry["seconds"] += s["seconds"]
+            entry["count"] += s["count"]
+        for name, n in r.get("counters", {}).items():
+            merged["counters"][name] = merged["counters"].get(name, 0) + n
+        if r["throughput"]["items"]:
+            merged["throughput"]["items"] += r["throughput"]["items"]
+            merged["throughput"]["unit"] = merged["throughput"]["unit"] or r["throughput"]["unit"]
+        if r.get("peak_rss_mb") is not None:
+            merged["peak_rss_mb"] = max(merged["peak_rss_mb"] or 0, r["peak_rss_mb"])
+        compare = r.get("compare")
+        if compare:
+            total = merged.setdefault("compare", {"format": compare["format"], "bytes": 0, "encode_s": 0.0,
+                                                  "gif_bytes": 0, "gif_encode_s": 0.0})
+            if compare["format"] not in total["format"].split("/"):
+                total["format"] += "/" + compare["format"]
+            for key in ("bytes", "encode_s", "gif_bytes", "gif_encode_s"):
+                total[key] += compare[key]
+    compare = merged.get("compare")
+    if compare:
+        # 比值按合计的体积和耗时算
+        compare["size_ratio"] = compare["bytes"] / compare["gif_bytes"] if compare["gif_bytes"] else None
+        compare["time_ratio"] = compare["encode_s"] / compare["gif_encode_s"] if compare["gif_encode_s"] else None
+    wall = merged["wall_s"]
+    for s in merged["stages"].values():
+        s["share"] = s["seconds"] / wall if wall > 0 else None
+        s["ms_per_call"] = round(s["seconds"] * 1000 / s["count"], 3) if s["count"] else None
+    items = merged["throughput"]["items"]
+    if items and wall > 0:
+        merged["throughput"]["per_s"] = items / wall
+    return merged
+
+
+def summary_line(report, top=3):
+    """一行摘要：用时 | 占比最高的几个阶段 | 吞吐 | 读写字节 | 内存峰值"""
+    from .cache import format_size
+
+    parts = [f"用时 {report['wall_s']:.2f} 秒"]
+    stages = sorted(report["stages"].items(), key=lambda kv: -kv[1]["seconds"])[:top]
+    if stages:
+        parts.append("，".join(
+            f"{STAGE_LABELS.get(name, name)} {s['share']:.0%}" if s.get("share") is not None
+            else f"{STAGE_LABELS.get(name, name)} {s['seconds']:.2f}s"
+            for name, s in stages
+        ))
+    throughput = report["throughput"]
+    if throughput["per_s"]:
+        parts.append(f"{throughput['per_s']:.1f} {throughput['unit']}/秒")
+    parts.append(f"读 {format_size(report['bytes_in'])} / 写 {format_size(report['bytes_out'])}")
+    if report.get("peak_rss_mb") is not None:
+        parts.append(f"内存峰值 {report['peak_rss_mb']:.0f} MB")
+    compare = report.get("compare")
+    if compare and compare.get("size_ratio") is not None:
+        parts.append(f"{compare['format']} 体积为 GIF 的 {compare['size_ratio']:.0%}")
+    return " | ".join(parts)
+
+
+def _ljust(text, width):
+    # 中文按两个字符宽度对齐
+    shown = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+    return text + " " * max(0, width - shown)
+
+
+def format_report(report, out=None):
+    """多行文本：摘要 + 各阶段明细（+ cProfile 排行）"""
+    out = out or sys.stderr
+    print(f"  {summary_line(report)}", file=out)
+    for name, s in report["stages"].items():
+        share = f"{s['share']:>6.1%}" if s.get("share") is not None else "     -"
+        per_call = f"{s['ms_per_call']:>9.3f}" if s.get("ms_per_call") is not None else "        -"
+        print(f"    {_ljust(STAGE_LABELS.get(name, name), 10)}{s['seconds']:>8.3f}s {share}  x{s['count']:<6}"
+              f"{per_call} ms/次", file=out)
+    for name, n in report.get("counters", {}).items():
+        print(f"    {_ljust(COUNTER_LABELS.get(name, name), 10)}{n:>8} 次", file=out)
+    compare = report.get("compare")
+    if compare:
+        from .cache import format_size
+        ratios = "，".join(f"{label} {compare[key]:.0%}" for label, key in (("体积", "size_ratio"), ("耗时", "time_ratio"))
+                          if compare.get(key) is not None)
+        print(f"    与 GIF 对比  {compare['format']} {format_size(compare['bytes'])} / 编码 {compare['encode_s']:.2f}s，"
+              f"GIF {format_size(compare['gif_bytes'])} / 编码 {compare['gif_encode_s']:.2f}s"
+              + (f"（{ratios}）" if ratios else ""), file=out)
+    if report.get("traced_peak_mb") is not None:
+        print(f"    tracemalloc 峰值 {report['traced_peak_mb']:.1f} MB", file=out)
+    rows = report.get("profile")
+    if isinstance(rows, dict):
+        print(f"    cProfile 不可用: {rows['error']}", file=out)
+    elif rows:
+        print("    cProfile（累计耗时前 10）:", file=out)
+        for row in rows[:10]:
+            print(f"      {row['cumtime_s']:>8.3f}s {row['tottime_s']:>8.3f}s  x{row['calls']:<7} {row['function']}",
+                  file=out)
@@ -0,0 +1,275 @@
+"""
+分段并行：把视频时间轴切成若干段，每段在独立进程里用自己的 VideoCapture 解码，
+采样、缩放、颜色转换和编码都在段内完成，父进程只按顺序合并结果：
+
+- 抽帧：各段直接按全局序号写图片，父进程汇总进度、记断点清单
+- 转 GIF：各段写出只含帧数据的片段（共用父进程构建的全局调色板，每段第一帧为完整帧），
+  父进程按顺序拼成一个 GIF
+
+段的起点对齐到关键帧（ffprobe 能列出关键帧时），每段从自己的关键帧开始解码，
+不会为了定位而重复解码上一段的帧。子进程只在共享计数器上累加进度、检查共享的取消标志。
+"""
+
+import bisect
+import multiprocessing
+import os
+import shutil
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .common import Cancelled, MediaError, media_name, report
+from .profiling import merge_stages, stage
+
+
+# 每段至少覆盖这么多帧：再短的话进程启动和定位的开销比省下的解码时间还多
+MIN_SEGMENT_FRAMES = 300
+
+# 父进程汇总进度的间隔（秒）
+POLL_INTERVAL = 0.1
+
+
+def default_segment_count():
+    return max(1, os.cpu_count() or 1)
+
+
+def probe_keyframes(video_path, fps):
+    """
+    用 ffprobe 列出关键帧的帧号（只读包头，不解码），失败返回 None。
+    帧号按 (pts_time - 流的 start_time) * fps 计算：TS / MKV 等起始时间不为 0 的文件，
+    OpenCV 的帧号也是从流的第一帧算起的。
+    """
+    if not fps or not shutil.which("ffprobe"):
+        return None
+
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=start_time:packet=pts_time,flags",
+        "-of", "csv",
+        video_path
+    ]
+    try:
+        p = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if p.returncode != 0:
+        return None
+
+    # 每行以段名开头："packet,0.033333,K__" / "stream,1.400000"（流信息在包之后输出）
+    start = 0.0
+    key_times = []
+    for line in p.stdout.splitlines():
+        section, _, rest = line.partition(",")
+        try:
+            if section == "stream":
+                start = float(rest.split(",")[0])
+            elif section == "packet":
+                pts, _, flags = rest.partition(",")
+                if "K" in flags:
+                    key_times.append(float(pts))
+        except ValueError:
+            continue
+    frames = {int(round((t - start) * fps)) for t in key_times}
+    return sorted(f for f in frames if f >= 0) or None
+
+
+def plan_segments(items, count, keyframes=None):
+    """
+    items 为按帧号升序的 [(标记, 帧号)]，切成最多 count 段，返回 [(起始帧号, 段内 items)]。
+    按帧号跨度均分（顺序解码的代价与跨度成正比）；给出 keyframes 时，
+    每段起点取不晚于分界处的最近关键帧，空段去掉。
+    """
+    if not items:
+        return []
+    first, last = items[0][1], items[-1][1]
+    span = last - first + 1
+    count = max(1, min(count, len(items), -(-span // MIN_SEGMENT_FRAMES)))
+
+    bounds = [first + span * k // count for k in range(count)]
+    if keyframes:
+        snapped = []
+        for b in bounds:
+            k = bisect.bisect_right(keyframes, b) - 1
+            snapped.append(keyframes[k] if k >= 0 else 0)
+        bounds = snapped
+    bounds = sorted(set(bounds))
+
+    segments = [(b, []) for b in bounds]
+    for item in items:
+        k = max(0, bisect.bisect_right(bounds, item[1]) - 1)
+        segments[k][1].append(item)
+    return [seg for seg in segments if seg[1]]
+
+
+# ---- 子进程 ----
+
+_progress = None    # 共享计数器：每段一格，只由该段的进程写
+_stop = None        # 共享取消标志
+
+
+def _init_worker(progress, stop):
+    global _progress, _stop
+    _progress, _stop = progress, stop
+
+
+def _tick(slot):
+    _progress[slot] += 1
+
+
+def _check_stop():
+    if _stop.is_set():
+        raise Cancelled()
+
+
+def _open_at(video_path, start):
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise MediaError("无法打开视频文件")
+    if start > 0:
+        with stage("seek"):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    return cap
+
+
+def _extract_segment(slot, video_path, output_dir, start, items, video_name, fmt, strategy, writers):
+    """抽一段：返回 (已处理的位置, 各阶段耗时)"""
+    from .profiling import StageRecorder, recording
+    from .video import iter_video_frames
+    from .writers import AsyncImageWriter
+
+    recorder = StageRecorder()
+    done = []
+    with recording(recorder):
+        cap = _open_at(video_path, start if strategy == "sequential" else 0)
+        try:
+            with AsyncImageWriter(workers=writers, on_written=done.append) as writer:
+                for j, _, frame in iter_video_frames(cap, [idx for _, idx in items], strategy, start):
+                    _check_stop()
+                    pos = items[j][0]
+                    if frame is not None:
+                        name = f"{video_name}_{pos + 1:04d}.{fmt}"
+                        with stage("write_wait"):
+                            writer.put(os.path.join(output_dir, name), frame, pos)
+                    else:
+                        done.append(pos)
+                    _tick(slot)
+        finally:
+            cap.release()
+    return done, recorder.snapshot()
+
+
+def _gif_segment(slot, video_path, part_path, start, items, scale, duration_ms, palette, global_palette,
+                 delta, dither):
+    """转一段 GIF 帧数据到 part_path：返回 (帧数, 实际写入帧数, 各阶段耗时)"""
+    from .framebuf import FrameBuffers
+    from .gif import StreamingGifWriter
+    from .profiling import StageRecorder, recording
+    from .video import iter_video_frames
+
+    recorder = StageRecorder()
+    with recording(recorder):
+        buffers = FrameBuffers(scale)
+        cap = _open_at(video_path, start)
+        try:
+            with StreamingGifWriter(part_path, duration_ms, loop=None, palette=palette, delta=delta,
+                                    dither=dither, global_palette=global_palette, header=False) as writer:
+                indices = [idx for _, idx in items]
+                for _, _, frame in iter_video_frames(cap, indices, "sequential", start, buffers):
+                    _check_stop()
+                    if frame is None:
+                        break
+                    writer.add_frame(buffers.to_rgb(frame))
+                    _tick(slot)
+        finally:
+            cap.release()
+    return writer.frame_count, writer.written_frames, recorder.snapshot()
+
+
+# ---- 父进程 ----
+
+def run_segments(worker, tasks, workers, progress=None, cancel=None, total=None, done=0, message="处理中",
+                 on_done=None):
+    """
+    在 workers 个进程里执行 worker(段号, *task)，返回按 tasks 顺序排列的结果。
+    父进程每 POLL_INTERVAL 秒汇总各段计数器报告进度；每段完成时调用 on_done(段号, 结果)。
+    cancel 置位或任一段出错时通知其余段停下，等它们退出后抛出。
+    """
+    ctx = multiprocessing.get_context("spawn")
+    counters = ctx.Array("q", len(tasks), lock=False)
+    stop = ctx.Event()
+    results = [None] * len(tasks)
+
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(tasks))), mp_context=ctx,
+                             initializer=_init_worker, initargs=(counters, stop)) as pool:
+        futures = {pool.submit(worker, k, *task): k for k, task in enumerate(tasks)}
+        pending = set(futures)
+        try:
+            while pending:
+                finished, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    k = futures[future]
+                    results[k] = future.result()
+                    if on_done is not None:
+                        on_done(k, results[k])
+                n = done + sum(counters)
+                report(progress, n, total, f"{message}: {n}/{total}" if total else message)
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled()
+        except BaseException:
+            stop.set()
+            for future in pending:
+                future.cancel()
+            raise
+    return results
+
+
+def extract_segments(video_path, output_dir, items, fmt, strategy, segments, writers=None, fps=None,
+                     progress=None, cancel=None, done=0, total=None, checkpoint=None):
+    """
+    items 为 [(位置, 帧号)]，分 segments 段并行抽取，图片命名为 {视频名}_{位置+1:04d}.{fmt}。
+    每个进程默认只开一个写入线程（并行度已经来自多个进程）。
+    """
+    plan = plan_segments(items, segments, probe_keyframes(video_path, fps))
+    video_name = media_name(video_path)
+    tasks = [(video_path, output_dir, start, seg, video_name, fmt, strategy, writers or 1) for start, seg in plan]
+
+    def on_done(k, result):
+        positions, stages = result
+        merge_stages(stages)
+        if checkpoint is not None:
+            for pos in positions:
+                checkpoint.mark(pos)
+
+    run_segments(_extract_segment, tasks, segments, progress, cancel, total, done, "处理中", on_done)
+
+
+def gif_segments(video_path, output_path, indices, size, scale, duration_ms, segments, palette="global",
+                 global_palette=None, delta=True, dither="none", fps=None, progress=None, cancel=None):
+    """
+    把 indices 这些帧分 segments 段并行转成 GIF 帧数据，再按顺序拼成 output_path。
+    palette="global" 时 global_palette 为 build_gif_palette 的结果，各段共用。
+    """
+    plan = plan_segments(list(enumerate(indices)), segments, probe_keyframes(video_path, fps))
+    parts = [f"{output_path}.seg{k:03d}" for k in range(len(plan))]
+    tasks = [(video_path, parts[k], start, seg, scale, duration_ms, palette, global_palette, delta, dither)
+             for k, (start, seg) in enumerate(plan)]
+    try:
+        results = run_segments(_gif_segment, tasks, segments, progress, cancel, len(indices), 0,
+                               "正在转换为GIF", lambda k, result: merge_stages(result[-1]))
+        if not sum(result[0] for result in results):
+            raise MediaError("没有读取到任何帧，无法生成 GIF")
+
+        from .gif import concat_gif_segments
+
+        # 逐帧调色板模式下每帧都带局部调色板，文件头里的全局调色板用不到
+        with stage("gif_write"):
+            concat_gif_segments(output_path, size, global_palette[0] if global_palette else bytes(6), parts)
+    finally:
+        for part in parts:
+            for path in (part, part + ".part"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,445 @@
+"""
+打包输出：抽帧、网格裁剪的结果不再一张一个文件，而是写进少数几个大文件，外加一份索引。
+
+- tar / zip：编码后的图片按原文件名存入未压缩的归档，索引记每张的数据偏移和长度，
+  直接 seek + read 就能取出一张，不用解包；归档本身也能用常规工具打开
+- npy：原始 RGB 像素写进一个 (N, 高, 宽, 3) 的 uint8 数组（np.load(mmap_mode="r") 按行随机读取），
+  适合直接喂给训练代码；只用于尺寸一致的视频帧
+- sprite：缩略图按网格拼成若干张拼图（每张最多 SPRITE_COLS x SPRITE_ROWS 格），索引记每格位置
+
+索引为 {前缀}.index.json：容器文件、格式，以及每一项的名字、位置和来源信息
+（视频帧的帧号、时间；切片的行列、区域）。PackedReader 按索引随机读取单项。
+所有容器先写 .part 临时文件，close() 成功后才改名并写出索引；写入方法线程安全，可在写入线程池里直接调用。
+"""
+
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+import zipfile
+
+import numpy as np
+
+from .common import MediaError
+
+
+INDEX_VERSION = 1
+
+# 拼图每格宽度（像素，高度按比例）和每张拼图的格数
+SPRITE_CELL_WIDTH = 160
+SPRITE_COLS = 10
+SPRITE_ROWS = 10
+
+
+def index_path(output_dir, prefix):
+    return os.path.join(output_dir, f"{prefix}.index.json")
+
+
+def _encode(image, fmt, encode=None):
+    """BGR 数组（cv2）或 PIL 图片 -> 编码后的字节"""
+    if isinstance(image, np.ndarray):
+        import cv2
+        ok, buf = cv2.imencode(f".{fmt}", image)
+        if not ok:
+            raise MediaError(f"图片编码失败: {fmt}")
+        return buf.tobytes()
+    from .encoders import save_image
+    out = io.BytesIO()
+    save_image(image, out, fmt, encode)
+    return out.getvalue()
+
+
+def _to_rgb_array(image):
+    if isinstance(image, np.ndarray):
+        import cv2
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return np.asarray(image.convert("RGB"))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class FileSink:
+    """默认输出：每项一个文件（与原有行为一致）"""
+
+    kind = "files"
+
+    def __init__(self, output_dir, fmt, encode=None):
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.encode = encode
+
+    def write(self, name, image, meta=None):
+        path = os.path.join(self.output_dir, name)
+        if isinstance(image, np.ndarray):
+            import cv2
+            if not cv2.imwrite(path, image):
+                raise MediaError(f"写入图片失败: {path}")
+        else:
+            from .encoders import save_image
+            save_image(image, path, self.fmt, self.encode)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class _PackedSink(FileSink):
+    """打包输出的公共部分：索引、临时文件、线程锁"""
+
+    suffix = None
+
+    def __init__(self, output_dir, prefix, fmt, encode=None, source=None):
+        super().__init__(output_dir, fmt, encode)
+        self.prefix = prefix
+        self.source = source
+        self.items = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.path = os.path.join(output_dir, f"{prefix}.{self.suffix}") if self.suffix else None
+
+    def _containers(self):
+        """[(临时文件, 最终文件)]"""
+        return [(self.path + ".part", self.path)]
+
+    def _finish(self):
+        """关闭容器文件；子类实现"""
+
+    def _index_extra(self):
+        return {}
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            self._finish()
+            containers = self._containers()
+            for tmp, final in containers:
+                os.replace(tmp, final)
+            data = {
+                "version": INDEX_VERSION,
+                "kind": self.kind,
+                "format": self.fmt,
+                "source": self.source,
+                "files": [os.path.basename(final) for _, final in containers],
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                **self._index_extra(),
+                "items": sorted(self.items, key=lambda item: (item.get("index", 0), item["name"])),
+            }
+            path = index_path(self.output_dir, self.prefix)
+            with open(path + ".part", "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(path + ".part", path)
+
+    def abort(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            try:
+                self._finish()
+            except Exception:
+                pass
+            for tmp, _ in self._containers():
+                _remove(tmp)
+
+
+class TarSink(_PackedSink):
+    kind = "tar"
+    suffix = "tar"
+
+    def __init__(self, output_dir, prefix, fmt, encode=None, source=None):
+        super().__init__(output_dir, prefix, fmt, encode, source)
+        self._tar = tarfile.open(self.path + ".part", "w", format=tarfile.PAX_FORMAT)
+
+    def write(self, name, image, meta=None):
+        data = _encode(image, self.fmt, self.encode)
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        with self._lock:
+            self._tar.addfile(info, io.BytesIO(data))
+            # 数据块在成员的最后，按 512 字节补齐
+            offset = self._tar.offset - (len(data) + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+            self.items.append({"name": name, "offset": offset, "size": len(data), **(meta or {})})
+
+    def _finish(self):
+        self._tar.close()
+
+
+class ZipSink(_PackedSink):
+    kind = "zip"
+    suffix = "zip"
+
+    def __init__(self, output_dir, prefix, fmt, encode=None, source=None):
+        super().__init__(output_dir, prefix, fmt, encode, source)
+        self._zip = zipfile.ZipFile(self.path + ".part", "w", zipfile.ZIP_STORED, allowZip64=True)
+        self._headers = {}
+
+    def write(self, name, image, meta=None):
+        data = _encode(image, self.fmt, self.encode)
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        with self._lock:
+            self._zip.writestr(info, data)
+            self._headers[name] = info.header_offset
+            self.items.append({"name": name, "offset": None, "size": len(data), **(meta or {})})
+
+    def _finish(self):
+        self._zip.close()
+        # 数据偏移 = 本地文件头偏移 + 30 + 文件名长度 + 扩展字段长度，从写好的文件里读回
+        with open(self.path + ".part", "rb") as f:
+            for item in self.items:
+                header = self._headers[item["name"]]
+                f.seek(header + 26)
+                lengths = f.read(4)
+                name_len, extra_len = int.from_bytes(lengths[:2], "little"), int.from_bytes(lengths[2:], "little")
+                item["offset"] = header + 30 + name_len + extra_len
+
+
+class NpySink(_PackedSink):
+    """
+    capacity 为最多的帧数，按 meta["index"] 写到对应的行；
+    实际写入的行数少于 capacity 时（例如去重），close() 截掉末尾没用到的行。
+    """
+
+    kind = "npy"
+    suffix = "npy"
+
+    def __init__(self, output_dir, prefix, capacity, source=None):
+        super().__init__(output_dir, prefix, "npy", source=source)
+        self.capacity = capacity
+        self._array = None
+
+    def write(self, name, image, meta=None):
+        meta = dict(meta or {})
+        row = meta.pop("index")
+        rgb = _to_rgb_array(image)
+        with self._lock:
+            if self._array is None:
+                self._array = np.lib.format.open_memmap(self.path + ".part", mode="w+", dtype=np.uint8,
+                                                        shape=(self.capacity,) + rgb.shape)
+            elif rgb.shape != self._array.shape[1:]:
+                raise MediaError(f"帧尺寸不一致，无法写入同一个 npy 数组: {rgb.shape} != {self._array.shape[1:]}")
+            self.items.append({"name": name, "index": row, **meta})
+            array = self._array
+        array[row] = rgb    # 各行互不重叠，拷贝不用持锁
+
+    def _finish(self):
+        if self._array is None:
+            # 一帧都没有：写一个空数组
+            with open(self.path + ".part", "wb") as f:
+                np.save(f, np.zeros((0, 0, 0, 3), np.uint8))
+            return
+        array, self._array = self._array, None
+        array.flush()
+        used = max((item["index"] for item in self.items), default=-1) + 1
+        header = np.lib.format.header_data_from_array_1_0(array[:used]) if used < len(array) else None
+        del array   # 最后一个引用，解除映射后才能改文件
+        if header is not None:
+            _shrink_npy(self.path + ".part", header)
+
+    def _index_extra(self):
+        return {"channels": "RGB"}
+
+
+def _shrink_npy(path, header):
+    """
+    把 .npy 的形状改成 header（header_data_from_array_1_0 的格式）：按原文件的版本重写头部，
+    新头部长度不同时把数据前移，再截掉多余的行
+    """
+    fmt = np.lib.format
+    with open(path, "r+b") as f:
+        if fmt.read_magic(f) == (1, 0):
+            read_header, write_header = fmt.read_array_header_1_0, fmt.write_array_header_1_0
+        else:
+            read_header, write_header = fmt.read_array_header_2_0, fmt.write_array_header_2_0
+        read_header(f)
+        offset = f.tell()
+
+        buf = io.BytesIO()
+        write_header(buf, header)
+        new_header = buf.getvalue()
+        nbytes = int(np.prod(header["shape"])) * np.dtype(header["descr"]).itemsize
+
+        if len(new_header) != offset:
+            # 新头部只会更短：从前往后分块拷贝，不会覆盖还没读的数据
+            done = 0
+            while done < nbytes:
+                f.seek(offset + done)
+                chunk = f.read(min(1 << 24, nbytes - done))
+                f.seek(len(new_header) + done)
+                f.write(chunk)
+                done += len(chunk)
+        f.seek(0)
+        f.write(new_header)
+        f.truncate(len(new_header) + nbytes)
+
+
+class SpriteSink(_PackedSink):
+    """
+    缩略图拼图：第 i 项放在第 i // 格数 张拼图的第 i % 格数 格（按 meta["index"]）。
+    一张拼图的格子填满就编码写出并释放，同时在内存里的只有写入线程正在填的几张。
+    """
+
+    kind = "sprite"
+
+    def __init__(self, output_dir, prefix, fmt, capacity, source=None, cell_width=SPRITE_CELL_WIDTH,
+                 cols=SPRITE_COLS, rows=SPRITE_ROWS):
+        super().__init__(output_dir, prefix, fmt, source=source)
+        self.capacity = capacity
+        self.cell_width = cell_width
+        self.cols = cols
+        self.rows = rows
+        self.cell = None        # (宽, 高)
+        self._pages = {}        # 页号 -> [画布, 已填格数]
+        self._written = []
+
+    def _page_name(self, page):
+        return f"{self.prefix}_{page:03d}.{self.fmt}"
+
+    def _page_cells(self, page):
+        per_page = self.cols * self.rows
+        return min(per_page, self.capacity - page * per_page)
+
+    def write(self, name, image, meta=None):
+        import cv2
+
+        meta = dict(meta or {})
+        i = meta.pop("index")
+        frame = image if isinstance(image, np.ndarray) else cv2.cvtColor(np.asarray(image.convert("RGB")),
+                                                                         cv2.COLOR_RGB2BGR)
+        with self._lock:
+            if self.cell is None:
+                h, w = frame.shape[:2]
+                cw = min(w, self.cell_width)
+                self.cell = (cw, max(1, round(h * cw / w)))
+        cw, ch = self.cell
+        thumb = cv2.resize(frame, (cw, ch), interpolation=cv2.INTER_AREA)
+
+        page, slot = divmod(i, self.cols * self.rows)
+        y, x = divmod(slot, self.cols)
+        with self._lock:
+            entry = self._pages.get(page)
+            if entry is None:
+                cells = self._page_cells(page)
+                height = -(-cells // self.cols) * ch
+                entry = self._pages[page] = [np.zeros((height, min(cells, self.cols) * cw, 3), np.uint8), 0]
+            entry[0][y * ch:(y + 1) * ch, x * cw:(x + 1) * cw] = thumb
+            entry[1] += 1
+            self.items.append({"name": name, "index": i, "sheet": self._page_name(page),
+                               "x": x * cw, "y": y * ch, "w": cw, "h": ch, **meta})
+            if entry[1] >= self._page_cells(page):
+                self._write_page(page)
+
+    def _write_page(self, page):
+        import cv2
+
+        canvas, _ = self._pages.pop(page)
+        tmp = os.path.join(self.output_dir, self._page_name(page) + ".part")
+        ok, buf = cv2.imencode(f".{self.fmt}", canvas)
+        if not ok:
+            raise MediaError(f"拼图编码失败: {self.fmt}")
+        with open(tmp, "wb") as f:
+            f.write(buf.tobytes())
+        self._written.append(page)
+
+    def _finish(self):
+        # 没填满的页（去重、读取失败）照样写出
+        for page in sorted(self._pages):
+            self._write_page(page)
+
+    def _containers(self):
+        return [(os.path.join(self.output_dir, self._page_name(p) + ".part"),
+                 os.path.join(self.output_dir, self._page_name(p))) for p in sorted(self._written)]
+
+    def _index_extra(self):
+        return {"cell": list(self.cell) if self.cell else None, "cols": self.cols, "rows": self.rows}
+
+
+def open_sink(kind, output_dir, prefix, fmt, capacity=None, encode=None, source=None):
+    """
+    按 kind（见 OUTPUT_SINKS）创建输出。files 时图片直接写到 output_dir；
+    npy / sprite 需要 capacity（最多几项），写入时 meta 里要有 "index"（从 0 开始的位置）。
+    """
+    if kind == "files":
+        return FileSink(output_dir, fmt, encode)
+    if kind == "tar":
+        return TarSink(output_dir, prefix, fmt, encode, source)
+    if kind == "zip":
+        return ZipSink(output_dir, prefix, fmt, encode, source)
+    if kind in ("npy", "sprite") and not capacity:
+        raise MediaError(f"{kind} 输出需要给出最多几项")
+    if kind == "npy":
+        return NpySink(output_dir, prefix, capacity, source)
+    if kind == "sprite":
+        return SpriteSink(output_dir, prefix, fmt, capacity, source)
+    raise MediaError(f"未知输出方式: {kind}")
+
+
+def packed_files(output_dir, prefix):
+    """打包输出产生的文件名：索引 + 索引里列出的容器文件"""
+    path = index_path(output_dir, prefix)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return [os.path.basename(path)] + data["files"]
+
+
+class PackedReader:
+    """
+    按索引随机读取打包输出中的单项（不解包）：
+        reader = PackedReader("out/movie_frames.index.json")
+        reader.read("movie_0042.jpg")   # tar / zip：编码后的字节；npy：RGB 数组（内存映射）；sprite：PIL 图片
+    """
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as f:
+            self.index = json.load(f)
+        self.dir = os.path.dirname(os.path.abspath(path))
+        self.kind = self.index["kind"]
+        self.items = {item["name"]: item for item in self.index["items"]}
+        self._array = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def names(self):
+        return [item["name"] for item in self.index["items"]]
+
+    def read(self, name):
+        try:
+            item = self.items[name]
+        except KeyError:
+            raise MediaError(f"索引中没有 {name}")
+        if self.kind in ("tar", "zip"):
+            with open(os.path.join(self.dir, self.index["files"][0]), "rb") as f:
+                f.seek(item["offset"])
+                return f.read(item["size"])
+        if self.kind == "npy":
+            if self._array is None:
+                self._array = np.load(os.path.join(self.dir, self.index["files"][0]), mmap_mode="r")
+            return self._array[item["index"]]
+        if self.kind == "sprite":
+            from PIL import Image
+            with Image.open(os.path.join(self.dir, item["sheet"])) as sheet:
+                return sheet.crop((item["x"], item["y"], item["x"] + item["w"], item["y"] + item["h"]))
+        raise MediaError(f"未知输出方式: {self.kind}")
@@ -0,0 +1,80 @@
+"""
+启动耗时检查：测量空操作命令（--version）的冷启动时间，并给出 -X importtime 导入耗时排行。
+
+命令行：python -m media_engine startup [--budget 100] [--module media_engine.cli]
+超出预算时返回非零退出码，可以直接放进 CI 防止启动性能回退。
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+
+DEFAULT_BUDGET_MS = 100
+
+
+def _engine_env():
+    # 子进程里同样要能找到 media_engine（从源码目录直接运行时它不在 site-packages）
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    return env
+
+
+def measure_startup(runs=5, command=None):
+    """多次冷启动运行 command（默认 python -m media_engine --version），返回各次耗时（毫秒）"""
+    command = command or [sys.executable, "-m", "media_engine", "--version"]
+    env = _engine_env()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def import_time_report(module="media_engine.cli"):
+    """
+    用 -X importtime 导入 module，返回 [(累计微秒, 自身微秒, 模块名), ...]，按累计耗时降序。
+    """
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=_engine_env(), capture_output=True, text=True,
+    )
+    if p.returncode != 0:
+        raise RuntimeError(p.stderr.strip() or f"无法导入 {module}")
+
+    rows = []
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        rows.append((int(parts[1]), int(parts[0]), parts[2].strip()))
+    rows.sort(reverse=True)
+    return rows
+
+
+def run_startup_check(budget_ms=DEFAULT_BUDGET_MS, runs=5, module="media_engine.cli", top=15, out=None):
+    """打印启动耗时与导入排行，返回是否在预算内"""
+    out = out or sys.stdout
+    timings = measure_startup(runs)
+    best = min(timings)
+    median = sorted(timings)[len(timings) // 2]
+    ok = median <= budget_ms
+
+    print(f"--version 冷启动: 最快 {best:.1f} ms，中位数 {median:.1f} ms（预算 {budget_ms} ms）"
+          f" -> {'通过' if ok else '超出预算'}", file=out)
+
+    # 重量级依赖不应该出现在空操作的导入链里
+    rows = import_time_report(module)
+    heavy = sorted({name.split(".")[0] for _, _, name in rows} & {"cv2", "numpy", "PIL", "moviepy", "tkinter"})
+    if heavy:
+        print(f"警告: 导入 {module} 时加载了 {', '.join(heavy)}", file=out)
+
+    print(f"\n导入 {module} 耗时排行（累计 / 自身，毫秒）:", file=out)
+    for cumulative, self_us, name in rows[:top]:
+        print(f"  {cumulative / 1000:8.1f} {self_us / 1000:8.1f}  {name}", file=out)
+    return ok and not heavy
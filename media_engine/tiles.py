@@ -0,0 +1,371 @@
+"""
+大图网格裁剪：按区域解码 + 并行编码，内存只与切片大小有关，与原图大小无关
+
+两种读取方式：
+- 条带读取：原图是未压缩数据（BMP、未压缩 TIFF 等）或由多个条带/瓦片组成时，
+  每次只解码与当前这一行切片相交的数据
+- 内存映射中间文件：JPEG / PNG / WebP 这类整幅压缩的图片无法从中间开始解码，
+  解码一次写进临时目录中的内存映射原始像素文件，之后按区域切片；
+  这部分页面由文件支撑，内存紧张时系统可以换出，不会像整幅解码那样常驻内存
+
+两者都依赖 Pillow 的内部接口，第一次使用前先用小图自检（见 partial_decode_supported），
+不通过时所有图片都整幅解码后用 Image.crop 切片。
+"""
+
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .common import PROCESSING, TILE_SINKS, MediaError, media_name, report
+from .encoders import encode_options
+from .profiling import current_recorder, stage
+from .sinks import open_sink
+
+
+# 内存映射中间文件支持的模式及 Pillow 内部每像素字节数（RGB 在内部按 4 字节存放）
+_MAPPED_PIXEL_SIZE = {"L": 1, "P": 1, "RGB": 4, "RGBA": 4, "CMYK": 4}
+
+# 未压缩 raw 数据每像素的位数，用于计算行跨度
+_RAW_BITS = {
+    "1": 1, "L": 8, "P": 8,
+    "RGB": 24, "BGR": 24,
+    "RGBA": 32, "BGRA": 32, "RGBX": 32, "BGRX": 32, "ABGR": 32, "XBGR": 32, "CMYK": 32,
+    "BGR;15": 16, "BGR;16": 16, "I;16": 16, "I;16B": 16,
+}
+
+
+_internals_ok = None    # partial_decode_supported() 的自检结果
+
+
+def grid_boxes(width, height, cols, rows, overlap=0):
+    """
+    按 cols x rows 切分，返回 [(行, 列, (left, top, right, bottom)), ...]（行列从 0 开始）。
+    单元格尺寸为 width // cols、height // rows（与原有行为一致，多出的边角舍弃）；
+    overlap > 0 时每块向四周各扩展 overlap 像素，超出原图的部分截掉。
+    """
+    cell_w = width // cols
+    cell_h = height // rows
+    boxes = []
+    for row in range(rows):
+        for col in range(cols):
+            left = col * cell_w
+            top = row * cell_h
+            boxes.append((row, col, (
+                max(0, left - overlap),
+                max(0, top - overlap),
+                min(width, left + cell_w + overlap),
+                min(height, top + cell_h + overlap),
+            )))
+    return boxes
+
+
+class _BandSource:
+    """只解码与给定行区间相交的条带 / raw 行"""
+
+    kind = "band"
+
+    def __init__(self, path, tiles, size, mode):
+        self.path = path
+        self.tiles = tiles
+        self.size = size
+        self.mode = mode
+        self._band = None
+        self._band_rows = (0, 0)
+
+    @classmethod
+    def probe(cls, path, im):
+        tiles = list(im.tile)
+        if len(tiles) > 1 or (len(tiles) == 1 and tiles[0][0] == "raw"
+                              and cls._raw_layout(tiles[0], im.size) is not None):
+            return cls(path, tiles, im.size, im.mode)
+        return None
+
+    @staticmethod
+    def _raw_layout(tile, size):
+        args = tile[3]
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        if tile[1] != (0, 0) + tuple(size):
+            return None
+        if not stride:
+            bits = _RAW_BITS.get(rawmode)
+            if bits is None:
+                return None
+            stride = (size[0] * bits + 7) // 8
+        return rawmode, stride, orientation or 1
+
+    def _band_tiles(self, y0, y1):
+        """返回 (条带起始行, 条带高度, 平移后的 tile 列表)"""
+        w, h = self.size
+        if len(self.tiles) == 1:
+            name, _, offset, _ = self.tiles[0]
+            rawmode, stride, orientation = self._raw_layout(self.tiles[0], self.size)
+            # 自下而上存放（BMP）时，第 y 行在文件中的位置是倒数第 y 行
+            first_row = h - y1 if orientation < 0 else y0
+            tile = (name, (0, 0, w, y1 - y0), offset + first_row * stride, (rawmode, stride, orientation))
+            return y0, y1 - y0, [tile]
+
+        hit = [t for t in self.tiles if t[1][1] < y1 and t[1][3] > y0]
+        top = min(t[1][1] for t in hit)
+        bottom = max(t[1][3] for t in hit)
+        shifted = [
+            (name, (x0, ty0 - top, x1, ty1 - top), offset, args)
+            for name, (x0, ty0, x1, ty1), offset, args in hit
+        ]
+        return top, bottom - top, shifted
+
+    def _load_band(self, y0, y1):
+        top, height, tiles = self._band_tiles(y0, y1)
+        im = Image.open(self.path)
+        try:
+            # 内部接口：把图片尺寸和 tile 列表改成只覆盖这几行，load() 就只读这一段
+            im._size = (self.size[0], height)
+            im.tile = tiles
+            im.load()
+            band = im.crop((0, y0 - top, self.size[0], y1 - top))
+        finally:
+            im.close()
+        self._band = band
+        self._band_rows = (y0, y1)
+
+    def region(self, box):
+        left, top, right, bottom = box
+        y0, y1 = self._band_rows
+        if self._band is None or top < y0 or bottom > y1:
+            self._load_band(top, bottom)
+            y0 = top
+        return self._band.crop((left, top - y0, right, bottom - y0))
+
+    def next_row(self, top, bottom):
+        """提示即将读取的行范围，整行切片共用一次条带解码"""
+        y0, y1 = self._band_rows
+        if self._band is None or top < y0 or bottom > y1:
+            self._load_band(top, bottom)
+
+    def close(self):
+        self._band = None
+
+
+class _MappedSource:
+    """解码一次到内存映射的临时原始像素文件，之后按区域切片"""
+
+    kind = "mmap"
+
+    def __init__(self, path, im, tmp_dir=None):
+        self.path = path
+        self.size = im.size
+        self.mode = im.mode
+        self.palette = None
+        self.transparency = im.info.get("transparency")
+
+        w, h = im.size
+        pixel_size = _MAPPED_PIXEL_SIZE[im.mode]
+        fd, self._raw_path = tempfile.mkstemp(suffix=".raw", dir=tmp_dir)
+        os.close(fd)
+        try:
+            self._pixels = np.memmap(self._raw_path, dtype=np.uint8, mode="w+", shape=(h, w, pixel_size))
+            _decode_into(im, self._pixels)
+            # 调色板要在解码之后再取，提前访问会触发一次常规的整幅解码
+            if im.mode == "P":
+                self.palette = im.getpalette()
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def probe(cls, path, im, tmp_dir=None):
+        if im.mode not in _MAPPED_PIXEL_SIZE:
+            return None
+        return cls(path, im, tmp_dir)
+
+    def region(self, box):
+        left, top, right, bottom = box
+        pixels = self._pixels[top:bottom, left:right]
+        if self.mode == "RGB":
+            return Image.fromarray(np.ascontiguousarray(pixels[..., :3]), "RGB")
+        cell = Image.frombytes(self.mode, (right - left, bottom - top), np.ascontiguousarray(pixels).tobytes())
+        if self.palette is not None:
+            cell.putpalette(self.palette)
+            if self.transparency is not None:
+                cell.info["transparency"] = self.transparency
+        return cell
+
+    def next_row(self, top, bottom):
+        pass
+
+    def close(self):
+        # region() 返回的都是拷贝，去掉这个引用就解除映射，之后再删文件（Windows 上映射中的文件删不掉）
+        if getattr(self, "_pixels", None) is not None:
+            del self._pixels
+        try:
+            os.remove(self._raw_path)
+        except OSError:
+            pass
+
+
+def _decode_into(im, pixels):
+    """把 im 解码进 (高, 宽, 每像素字节数) 的 uint8 数组，而不是先在内存里分配整幅图"""
+    h, w, pixel_size = pixels.shape
+    # 内部接口：用数组作存储的 core 图像替换 im.im，解码器直接写进去
+    mapped = Image.core.map_buffer(pixels, im.size, "raw", 0, (im.mode, w * pixel_size, 1))
+    im.im = mapped
+    im.load()
+    if im.im is not mapped:
+        # Pillow 自己换成了别的存储（例如 raw 文件直接映射），拷贝过来即可
+        pixels[:] = np.asarray(im).reshape(h, w, -1)[..., :pixel_size]
+
+
+def partial_decode_supported():
+    """
+    条带读取和内存映射读取用到 Pillow 的内部接口（ImageFile._size / tile、Image.core.map_buffer），
+    第一次调用时用小图各试一次，结果与整幅解码后 Image.crop 相同才启用（结果缓存）
+    """
+    global _internals_ok
+    if _internals_ok is None:
+        try:
+            _internals_ok = _check_internals()
+        except Exception:
+            _internals_ok = False
+    return _internals_ok
+
+
+def _check_internals():
+    ys, xs = np.mgrid[0:6, 0:10]
+    sample = Image.fromarray(np.stack([xs * 20, ys * 40, xs + ys], axis=-1).astype(np.uint8), "RGB")
+    box = (2, 1, 9, 5)
+    expected = sample.crop(box).tobytes()
+
+    bmp = io.BytesIO()
+    sample.save(bmp, "BMP")
+    with Image.open(bmp) as im:
+        band = _BandSource.probe(bmp, im)
+    if band is None or band.region(box).tobytes() != expected:
+        return False
+
+    png = io.BytesIO()
+    sample.save(png, "PNG")
+    pixels = np.zeros((6, 10, _MAPPED_PIXEL_SIZE["RGB"]), np.uint8)
+    with Image.open(png) as im:
+        _decode_into(im, pixels)
+    return np.ascontiguousarray(pixels[1:5, 2:9, :3]).tobytes() == expected
+
+
+class _WholeSource:
+    """兜底：其他模式直接整幅解码"""
+
+    kind = "full"
+
+    def __init__(self, im):
+        im.load()
+        self._im = im
+        self.size = im.size
+        self.mode = im.mode
+
+    def region(self, box):
+        return self._im.crop(box)
+
+    def next_row(self, top, bottom):
+        pass
+
+    def close(self):
+        self._im.close()
+
+
+def open_tile_source(path, tmp_dir=None):
+    """
+    按图片的存储方式选择读取方式，返回带 region(box) / close() 的读取器；
+    partial_decode_supported() 不通过时总是整幅解码
+    """
+    im = Image.open(path)
+    if partial_decode_supported():
+        source = _BandSource.probe(path, im)
+        if source is not None:
+            im.close()
+            return source
+        source = _MappedSource.probe(path, im, tmp_dir)
+        if source is not None:
+            im.close()
+            return source
+    return _WholeSource(im)
+
+
+def _save_tile(out, name, cell, meta, recorder=None):
+    with stage("encode_write", recorder=recorder):
+        out.write(name, cell, meta)
+
+
+def crop_grid(img_path, output_dir, cols, rows, fmt="png", overlap=0, workers=None, tmp_dir=None, progress=None,
+              encode=None, sink="files"):
+    """
+    按 cols x rows 网格裁剪，输出为 {原名}_{行:02d}_{列:02d}.{fmt}（行列从 1 开始），
+    返回 (张数, 单张宽, 单张高)。逐行读取区域，切片交给线程池并行编码，
+    同时在途的切片数有上限，内存只与切片大小有关。
+    sink 为 tar / zip 时切片打包进 {原名}_tiles.{tar,zip}，索引 {原名}_tiles.index.json 记每块的行列和区域。
+    """
+    if cols <= 0 or rows <= 0:
+        raise MediaError("请输入有效的切割数量")
+    if overlap < 0:
+        raise MediaError("重叠像素不能为负数")
+    if sink not in TILE_SINKS:
+        raise MediaError(f"网格裁剪不支持输出方式: {sink}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    fmt = fmt.strip().lower()
+    if encode is None:
+        encode = encode_options(fmt)
+    name = media_name(img_path)
+
+    with stage("decode"):
+        source = open_tile_source(img_path, tmp_dir)
+    recorder = current_recorder()
+    try:
+        w, h = source.size
+        cell_w = w // cols
+        cell_h = h // rows
+        if cell_w <= 0 or cell_h <= 0:
+            raise MediaError(f"图片尺寸 {w} x {h} 不足以切成 {cols} x {rows}")
+
+        workers = workers or max(1, min(8, os.cpu_count() or 1))
+        max_pending = workers * 2
+        boxes = grid_boxes(w, h, cols, rows, overlap)
+        total = len(boxes)
+        count = 0
+
+        out = open_sink(sink, output_dir, f"{name}_tiles", fmt, total, encode, os.path.abspath(img_path))
+        with out, ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            current_row = None
+            for row, col, box in boxes:
+                if row != current_row:
+                    current_row = row
+                    row_boxes = [b for r, _, b in boxes if r == row]
+                    with stage("decode"):
+                        source.next_row(min(b[1] for b in row_boxes), max(b[3] for b in row_boxes))
+
+                tile_name = f"{name}_{row+1:02d}_{col+1:02d}.{fmt}"
+                meta = {"index": row * cols + col, "row": row + 1, "col": col + 1, "box": list(box)}
+                with stage("crop"):
+                    cell = source.region(box)
+                pending.append(executor.submit(_save_tile, out, tile_name, cell, meta, recorder))
+
+                # 在途切片过多时先等最早的完成，限制内存
+                while len(pending) >= max_pending:
+                    with stage("write_wait"):
+                        pending.pop(0).result()
+                    count += 1
+                    report(progress, count, total, PROCESSING)
+
+            for future in pending:
+                with stage("write_wait"):
+                    future.result()
+                count += 1
+                report(progress, count, total, PROCESSING)
+    finally:
+        source.close()
+
+    return count, cell_w, cell_h
@@ -0,0 +1,609 @@
+"""
+视频处理：抽帧、提取音频、转 GIF（或动画 WebP / APNG）
+"""
+
+import contextlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import time
+
+import cv2
+from PIL import Image
+
+from .common import (
+    ANIMATION_EXTS, ANIMATION_FORMATS, EXTRACT_MODES, EXTRACT_STRATEGIES, GIF_BACKENDS, GIF_DITHER_MODES,
+    GIF_PALETTE_MODES, OUTPUT_SINKS, PROCESSING, MediaError, check_cancel, media_name, report, resolve_time_range,
+)
+from .dedup import FrameDeduper
+from .framebuf import FrameBuffers, gif_size, resize_interpolation
+from .profiling import annotate, stage
+from .scenes import detect_scenes, pick_scenes
+from .writers import AsyncImageWriter
+
+
+# 取不到关键帧间隔时的兜底值（x264 默认 keyint）
+DEFAULT_GOP_SIZE = 250
+
+# scenes 方式在检测时把选中的帧留在内存里的上限（字节），超过时检测完再解码一遍取帧
+SCENE_FRAME_BUDGET = 512 * 1024 * 1024
+
+
+def probe_gop_size(video_path, max_packets=2000):
+    """用 ffprobe 统计开头若干个视频包中的关键帧间隔，失败返回 None"""
+    if not shutil.which("ffprobe"):
+        return None
+
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=flags",
+        "-read_intervals", f"%+#{max_packets}",
+        "-of", "json",
+        video_path
+    ]
+    try:
+        p = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        if p.returncode != 0:
+            return None
+        packets = json.loads(p.stdout or "{}").get("packets", [])
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+    key_positions = [i for i, pkt in enumerate(packets) if "K" in pkt.get("flags", "")]
+    if len(key_positions) < 2:
+        # 整段只有一个关键帧：视为 GOP 覆盖全部已读包
+        return len(packets) if packets else None
+
+    gaps = [b - a for a, b in zip(key_positions, key_positions[1:])]
+    return max(1, int(round(sum(gaps) / len(gaps))))
+
+
+def plan_frame_indices(total_frames, count):
+    """均匀抽取 count 帧的帧号（与原有算法一致）"""
+    if count > total_frames:
+        count = total_frames
+    return [int(i * total_frames / count) for i in range(count)]
+
+
+def choose_extract_strategy(indices, gop_size=None):
+    """
+    估算两种方式需要解码的帧数，选更便宜的那个：
+    - 顺序解码：从 0 解码到最后一个目标帧
+    - 逐帧定位：每个目标帧平均要从关键帧往后解码约半个 GOP
+    """
+    if not indices:
+        return "sequential"
+
+    gop = gop_size or DEFAULT_GOP_SIZE
+    sequential_cost = max(indices) + 1
+    seek_cost = len(indices) * (gop / 2 + 1)
+    return "seek" if seek_cost < sequential_cost else "sequential"
+
+
+def iter_video_frames(cap, indices, strategy, start=0, buffers=None):
+    """
+    按给定策略依次产出 (序号, 帧号, 帧)，读取失败时帧为 None。
+    indices 需为升序；start 为 cap 当前所在的帧号（顺序解码从这里往后 grab）。
+    给出 buffers（FrameBuffers）时帧解码进它的缓冲环，产出的帧只在接下来几帧内有效。
+    """
+    if strategy == "seek":
+        for i, frame_idx in enumerate(indices):
+            with stage("seek"):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            if buffers is not None:
+                yield i, frame_idx, buffers.read(cap)
+                continue
+            with stage("decode"):
+                ret, frame = cap.read()
+            yield i, frame_idx, frame if ret else None
+        return
+
+    if strategy != "sequential":
+        raise MediaError(f"未知抽帧策略: {strategy}")
+
+    pos = start      # 下一次 grab 将得到的帧号
+    eof = False
+    last_idx, last_frame = None, None
+    for i, frame_idx in enumerate(indices):
+        if frame_idx == last_idx:
+            yield i, frame_idx, last_frame
+            continue
+
+        # 只解码不转换，跳过不需要的帧
+        while not eof and pos < frame_idx:
+            with stage("decode"):
+                if not cap.grab():
+                    eof = True
+            pos += 1
+
+        frame = None
+        if not eof:
+            with stage("decode"):
+                grabbed = cap.grab()
+            if grabbed and buffers is not None:
+                frame = buffers.retrieve(cap)
+            elif grabbed:
+                with stage("retrieve"):
+                    ret, frame = cap.retrieve()
+                if not ret:
+                    frame = None
+            else:
+                eof = True
+            pos += 1
+
+        last_idx, last_frame = frame_idx, frame
+        yield i, frame_idx, frame
+
+
+def sample_video_frames(video_path, count=8, scale=1.0, start_frame=0, end_frame=None):
+    """在视频（或 [start_frame, end_frame) 片段）里均匀定位取几帧（RGB PIL 图片），用于构建全局调色板"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if end_frame is None:
+            end_frame = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        samples = []
+        for offset in plan_frame_indices(max(end_frame - start_frame, 1), count):
+            frame_idx = start_frame + offset
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            if scale != 1.0:
+                h, w = frame.shape[:2]
+                frame = cv2.resize(frame, gif_size(w, h, scale), interpolation=resize_interpolation(scale))
+            samples.append(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        return samples
+    finally:
+        cap.release()
+
+
+def extract_frames(video_path, output_dir, count, fmt="jpg", strategy="auto", writers=None, progress=None,
+                   cancel=None, mode="uniform", threshold=0.35, dedup=None, dedup_threshold=5, checkpoint=False,
+                   segments=1, sink="files"):
+    """
+    抽帧，输出为 {视频名}_{序号:04d}.{fmt}，返回实际写出的帧数。
+    mode 见 EXTRACT_MODES：uniform 均匀抽取 count 帧；keyframes / scenes 最多 count 帧，
+    scenes 的 threshold 为镜头切换阈值（0~1，越小越敏感）。
+    dedup 为 "ahash" / "dhash" 时，与上一张保留帧汉明距离不超过 dedup_threshold 的帧不写出，
+    序号连续编排，并写出清单 {视频名}_frames.json（保留帧的时间及其替代的帧）。
+    cancel（threading.Event）置位后在帧与帧之间停止并抛出 Cancelled。
+    checkpoint 为 True 时边写边记清单（见 checkpoint 模块），中断后用相同参数重跑只补抽缺的帧；
+    去重（序号取决于前面保留了哪些帧）和关键帧方式（ffmpeg 一次写完）不记清单。
+    segments > 1 时把要抽的帧按关键帧切成最多 segments 段，在多个进程里并行解码写图（见 segments 模块）；
+    去重需要按顺序比较，不分段。
+    scenes 方式在检测镜头时就留下选中的帧（总大小不超过 SCENE_FRAME_BUDGET 时），不再解码第二遍，也不分段。
+    sink 见 OUTPUT_SINKS：不是 files 时打包写成 {视频名}_frames.{tar,zip,npy} 或拼图，
+    另写索引 {视频名}_frames.index.json（见 sinks 模块）；打包输出不记断点清单、不分段。
+    """
+    if count <= 0:
+        raise MediaError("请输入有效的抽帧数量")
+    if strategy not in EXTRACT_STRATEGIES:
+        raise MediaError(f"未知抽帧策略: {strategy}")
+    if mode not in EXTRACT_MODES:
+        raise MediaError(f"未知抽帧方式: {mode}")
+    if sink not in OUTPUT_SINKS:
+        raise MediaError(f"未知输出方式: {sink}")
+    deduper = FrameDeduper(dedup, dedup_threshold) if dedup else None
+
+    os.makedirs(output_dir, exist_ok=True)
+    fmt = fmt.strip().lower()
+    if mode == "keyframes":
+        return extract_keyframes(video_path, output_dir, count, fmt, progress, cancel, writers, deduper, sink)
+
+    cap = cv2.VideoCapture(video_path)
+    scene_frames = None
+    try:
+        if mode == "scenes":
+            if not cap.isOpened():
+                raise MediaError("无法打开视频文件")
+            frame_bytes = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) * int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) * 3
+            if 0 < frame_bytes * count <= SCENE_FRAME_BUDGET:
+                # 检测时就留下要写的帧，省掉第二遍解码
+                cuts, scene_frames = detect_scenes(cap, threshold, progress=progress, cancel=cancel, keep=count)
+            else:
+                cuts = detect_scenes(cap, threshold, progress=progress, cancel=cancel)
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            indices = pick_scenes(cuts, count)
+        else:
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if total_frames <= 0:
+                raise MediaError("无法读取视频帧数，请确认视频文件是否损坏或编码不受支持")
+            indices = plan_frame_indices(total_frames, count)
+
+        count = len(indices)
+        video_name = media_name(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or None
+
+        ckpt = None
+        positions = range(count)
+        if checkpoint and deduper is None and sink == "files":
+            from .checkpoint import Checkpoint, checkpoint_path, input_fingerprint
+            params = {"count": count, "fmt": fmt, "mode": mode, "threshold": threshold if mode == "scenes" else None}
+            ckpt = Checkpoint(checkpoint_path(output_dir, f"{video_name}.extract"), "extract", params,
+                              input_fingerprint(video_path))
+            for i in list(ckpt.done):
+                if not os.path.isfile(os.path.join(output_dir, f"{video_name}_{i + 1:04d}.{fmt}")):
+                    ckpt.discard(i)
+            positions = [i for i in range(count) if i not in ckpt]
+        todo = [indices[i] for i in positions]
+        skipped = count - len(todo)
+
+        if strategy == "auto" and scene_frames is None:
+            strategy = choose_extract_strategy(todo, probe_gop_size(video_path))
+
+        if segments > 1 and deduper is None and sink == "files" and todo and scene_frames is None:
+            from .segments import extract_segments
+
+            cap.release()
+            with ckpt or contextlib.nullcontext():
+                extract_segments(video_path, output_dir, list(zip(positions, todo)), fmt, strategy, segments,
+                                 writers, fps, progress, cancel, skipped, count, ckpt)
+            return count
+
+        start = 0
+        if skipped and todo and strategy == "sequential":
+            # 续抽：直接定位到第一个缺的帧，不再从头 grab
+            start = todo[0]
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+        written = 0
+        with ckpt or contextlib.nullcontext(), _open_frame_sink(sink, video_path, output_dir, fmt, count) as out, \
+                AsyncImageWriter(workers=writers, on_written=ckpt.mark if ckpt else None, sink=out) as writer:
+            if scene_frames is not None:
+                frames = ((j, frame_idx, scene_frames.get(frame_idx)) for j, frame_idx in enumerate(todo))
+            else:
+                frames = iter_video_frames(cap, todo, strategy, start)
+            for j, frame_idx, frame in frames:
+                check_cancel(cancel)
+                i = positions[j]
+                if frame is not None:
+                    # 不去重时序号与抽取位置一一对应（读取失败的位置留空），去重时连续编号
+                    number = i + 1 if deduper is None else len(deduper.kept) + 1
+                    name = f"{video_name}_{number:04d}.{fmt}"
+                    if deduper is None:
+                        keep = True
+                    else:
+                        with stage("dedup_hash"):
+                            keep = deduper.add(frame, frame_idx, frame_idx / fps if fps else None, name)
+                    if keep:
+                        with stage("write_wait"):
+                            writer.put(os.path.join(output_dir, name), frame, i if ckpt else None,
+                                       _frame_meta(number, frame_idx, frame_idx / fps if fps else None))
+                        written += 1
+                elif ckpt is not None:
+                    ckpt.mark(i)
+                done = skipped + j + 1
+                report(progress, done, count, PROCESSING)
+
+            report(progress, count, count, "等待写入完成...")
+    finally:
+        cap.release()
+
+    if deduper is None:
+        return count
+    _write_dedup_manifest(deduper, video_path, output_dir, mode, fmt)
+    return written
+
+
+def _open_frame_sink(sink, video_path, output_dir, fmt, capacity):
+    """files 时返回 None（AsyncImageWriter 直接写文件），否则返回打包输出"""
+    if sink == "files":
+        return contextlib.nullcontext()
+    from .sinks import open_sink
+    return open_sink(sink, output_dir, f"{media_name(video_path)}_frames", fmt, capacity,
+                     source=os.path.abspath(video_path))
+
+
+def _frame_meta(number, frame_idx, seconds):
+    """打包输出索引里一帧的信息：位置、帧号、时间（秒）"""
+    return {"index": number - 1, "frame": frame_idx, "time": None if seconds is None else round(seconds, 3)}
+
+
+def _write_dedup_manifest(deduper, video_path, output_dir, mode, fmt):
+    path = os.path.join(output_dir, f"{media_name(video_path)}_frames.json")
+    return deduper.write_manifest(path, video=os.path.abspath(video_path), mode=mode, format=fmt)
+
+
+def extract_keyframes(video_path, output_dir, count, fmt="jpg", progress=None, cancel=None, writers=None,
+                      deduper=None, sink="files"):
+    """
+    只解码关键帧（ffmpeg -skip_frame nokey，非关键帧连解码都不做），最多 count 张，
+    关键帧多于 count 时按时间间隔均匀挑选。返回实际写出的张数。
+    不去重、输出为单独文件时由 ffmpeg 直接写图片；否则帧经管道传回，去重后写出或打包。
+    """
+    from .ffmpeg import iter_ffmpeg_frames, probe_duration, run_ffmpeg
+
+    vf = None
+    duration = probe_duration(video_path)
+    if duration:
+        # 把时长分成 count 个时间段，每段只取落在其中的第一个关键帧
+        slot = f"{duration / count:.4f}"
+        vf = f"select=isnan(prev_selected_t)+gt(floor(t/{slot})\\,floor(prev_selected_t/{slot}))"
+    input_args = ["-skip_frame", "nokey", "-i", video_path]
+
+    if deduper is not None or sink != "files":
+        video_name = media_name(video_path)
+        written = 0
+        frames = iter_ffmpeg_frames(input_args, vf, cancel)
+        try:
+            with _open_frame_sink(sink, video_path, output_dir, fmt, count) as out, \
+                    AsyncImageWriter(workers=writers, sink=out) as writer:
+                for i, (seconds, frame) in enumerate(frames):
+                    if i >= count:
+                        break
+                    name = f"{video_name}_{written + 1:04d}.{fmt}"
+                    if deduper is None:
+                        keep = True
+                    else:
+                        with stage("dedup_hash"):
+                            keep = deduper.add(frame, None, seconds, name)
+                    if keep:
+                        with stage("write_wait"):
+                            writer.put(os.path.join(output_dir, name), frame,
+                                       meta=_frame_meta(written + 1, None, seconds))
+                        written += 1
+                    report(progress, i + 1, count, f"正在抽取关键帧... 保留 {written} 张")
+        finally:
+            frames.close()
+        if deduper is not None:
+            _write_dedup_manifest(deduper, video_path, output_dir, "keyframes", fmt)
+        return written
+
+    pattern = os.path.join(output_dir, f"{media_name(video_path).replace('%', '%%')}_%04d.{fmt}")
+    args = input_args + ["-an", "-sn", "-dn", "-vsync", "0"]
+    if vf:
+        args += ["-vf", vf]
+    args += ["-frames:v", str(count)]
+    if fmt in ("jpg", "jpeg"):
+        args += ["-q:v", "2"]
+    args.append(pattern)
+
+    state = run_ffmpeg(args, progress=progress, cancel=cancel, message="正在抽取关键帧", frames=count)
+    written = int(state.get("frame", 0) or 0)
+    report(progress, written, written, f"已抽取 {written} 个关键帧")
+    return written
+
+
+def video_to_mp3(video_path, output_dir, progress=None, cancel=None):
+    """
+    提取音轨为 {视频名}.mp3，返回输出路径。
+    有 ffmpeg 时源音轨本身是 MP3 就直接流复制，否则转码；没有 ffmpeg 才用 moviepy。
+    """
+    if shutil.which("ffmpeg"):
+        from .audio import extract_audio
+        return extract_audio(video_path, output_dir, "mp3", progress=progress, cancel=cancel)
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"{media_name(video_path)}.mp3")
+    report(progress, 0, None, "正在提取音频...")
+    try:
+        from moviepy.editor import VideoFileClip
+    except ImportError:
+        raise MediaError("请安装 ffmpeg 并加入 PATH，或者安装 moviepy: pip install moviepy")
+    video = VideoFileClip(video_path)
+    try:
+        if video.audio is None:
+            raise MediaError("该视频没有音轨，无法导出 MP3")
+        video.audio.write_audiofile(output_path)
+    finally:
+        video.close()
+    return output_path
+
+
+def video_to_gif(video_path, output_dir, fps=10, scale=0.5, palette="global", dither="none",
+                 delta=True, progress=None, cancel=None, start=None, end=None, duration=None, backend="opencv",
+                 segments=1, reuse_buffers=True, anim_format="gif", anim_encode=None, compare_gif=False):
+    """
+    按目标帧率采样、缩放后流式写成 {视频名}.gif，返回输出路径。
+    anim_format 为 webp / apng 时改写成 {视频名}.webp / .png（不做调色板量化，anim_encode 为
+    encode_options(anim_format, ...) 的结果，见 animated 模块）；调色板、抖动和分段只对 GIF 有效。
+    compare_gif=True 时同样的帧再编码一份 GIF（不保留），体积和编码耗时的对比记进任务报告的 "compare"。
+    start / end / duration（秒或 "mm:ss" 等）只转换其中一段：先定位到开始处，到结束处就停止解码。
+    backend="ffmpeg" 时由 ffmpeg 的 fps/scale/palettegen/paletteuse 滤镜一次完成解码、采样和量化。
+    cancel 置位后停止，不留下不完整的 GIF。
+    segments > 1 时（opencv 方式且帧数已知）按关键帧分段在多个进程里并行解码、量化，再按顺序拼接。
+    解码、缩放、颜色转换使用预分配的帧缓冲（见 framebuf 模块）；reuse_buffers=False 时每帧新分配，用于对比。
+    """
+    if not isinstance(fps, int) or fps <= 0:
+        raise MediaError("FPS 必须是正整数")
+    if scale <= 0:
+        raise MediaError("缩放比例必须是大于 0 的数字（例如 0.5）")
+    if backend not in GIF_BACKENDS:
+        raise MediaError(f"未知 GIF 转换方式: {backend}")
+    if palette not in GIF_PALETTE_MODES:
+        raise MediaError(f"未知调色板模式: {palette}")
+    if dither not in GIF_DITHER_MODES:
+        raise MediaError(f"未知抖动方式: {dither}")
+    if anim_format not in ANIMATION_FORMATS:
+        raise MediaError(f"不支持的动画格式: {anim_format}")
+    start, end = resolve_time_range(start, end, duration)
+    compare_gif = compare_gif and anim_format != "gif"
+    label = anim_format.upper()
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, media_name(video_path) + ANIMATION_EXTS[anim_format])
+    report(progress, 0, None, f"正在转换为{label}...")
+
+    if backend == "ffmpeg":
+        args = (video_path, output_path, fps, scale, palette, dither, delta, start, end, progress, cancel)
+        if not compare_gif:
+            _video_to_gif_ffmpeg(*args, anim_format, anim_encode)
+            return output_path
+        # 两次完整的 ffmpeg 管线，耗时都包含解码
+        from .animated import compare_entry
+
+        t0 = time.perf_counter()
+        _video_to_gif_ffmpeg(*args, anim_format, anim_encode)
+        seconds = time.perf_counter() - t0
+        gif_path = output_path + ".compare.gif"
+        try:
+            t0 = time.perf_counter()
+            _video_to_gif_ffmpeg(video_path, gif_path, *args[2:])
+            annotate("compare", compare_entry(anim_format, os.path.getsize(output_path), seconds,
+                                              os.path.getsize(gif_path), time.perf_counter() - t0))
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(gif_path)
+        return output_path
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise MediaError("无法打开视频文件")
+
+    try:
+        original_fps = cap.get(cv2.CAP_PROP_FPS)
+        if original_fps is None or original_fps <= 0:
+            original_fps = fps  # 取不到就用目标 fps 兜底
+
+        step = max(1, int(round(original_fps / fps)))
+        duration_ms = max(1, int(1000 / fps))
+
+        # 片段换算成帧号；帧数未知时只能一直读到结尾
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        start_frame = int(round(start * original_fps))
+        end_frame = total_frames if total_frames > 0 else None
+        if end is not None:
+            end_frame = min(end_frame or math.inf, int(math.ceil(end * original_fps)))
+        if end_frame is not None and start_frame >= end_frame:
+            raise MediaError("开始时间超出视频长度")
+        expected = math.ceil((end_frame - start_frame) / step) if end_frame is not None else None
+
+        sample_frames = None
+        if palette == "global" and (anim_format == "gif" or compare_gif):
+            report(progress, 0, expected, "正在构建全局调色板...")
+            with stage("gif_palette"):
+                sample_frames = sample_video_frames(video_path, scale=scale, start_frame=start_frame,
+                                                    end_frame=end_frame)
+
+        # 各段必须共用同一个全局调色板：取不到样本帧时不分段
+        if segments > 1 and anim_format == "gif" and end_frame is not None and (palette != "global" or sample_frames):
+            from .gif import build_gif_palette
+            from .segments import gif_segments
+
+            global_palette = None
+            if palette == "global":
+                with stage("gif_palette"):
+                    global_palette = build_gif_palette(sample_frames)
+            size = gif_size(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), scale)
+            gif_segments(video_path, output_path, list(range(start_frame, end_frame, step)), size, scale,
+                         duration_ms, segments, palette, global_palette, delta, dither, original_fps,
+                         progress, cancel)
+            return output_path
+
+        if start_frame > 0:
+            # 从开始处之前的关键帧解码到开始帧，不再从第 0 帧读起
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        # 逐帧编码写入，不在内存里攒整段视频
+        from .animated import GifComparison, open_animation_writer
+
+        buffers = FrameBuffers(scale, reuse=reuse_buffers)
+        gif_options = {"palette": palette, "sample_frames": sample_frames, "dither": dither}
+        writer = open_animation_writer(anim_format, output_path, duration_ms, 0, anim_encode, delta, **gif_options)
+        if compare_gif:
+            writer = GifComparison(writer, anim_format, duration_ms, 0, delta, **gif_options)
+        with writer:
+            idx = 0
+            while end_frame is None or start_frame + idx < end_frame:
+                check_cancel(cancel)
+
+                # 按步长采样：不需要的帧只 grab（解码）不 retrieve（转换）
+                if idx % step != 0:
+                    idx += 1
+                    with stage("decode"):
+                        grabbed = cap.grab()
+                    if not grabbed:
+                        break
+                    continue
+                idx += 1
+                frame = buffers.read(cap)
+                if frame is None:
+                    break
+
+                writer.add_frame(buffers.to_rgb(frame))
+                report(progress, writer.frame_count, expected, f"正在转换为{label}... 已写入 {writer.frame_count} 帧")
+    finally:
+        cap.release()
+    return output_path
+
+
+# 本工具的抖动方式 -> ffmpeg paletteuse 的 dither 参数
+_FFMPEG_DITHER = {
+    "none": "none",
+    "ordered": "bayer:bayer_scale=3",
+    "floyd": "floyd_steinberg",
+}
+
+
+def ffmpeg_gif_filter(fps, scale, palette="global", dither="none", delta=True):
+    """
+    生成 fps -> scale -> split -> palettegen / paletteuse 滤镜图。
+    与自带编码器一致：最多 255 色并保留一个透明色，差分帧只重画变化的矩形。
+    """
+    scale_expr = "" if scale == 1.0 else f",scale=trunc(iw*{scale}):trunc(ih*{scale}):flags=area"
+    if palette == "global":
+        gen = "palettegen=max_colors=255:reserve_transparent=1:stats_mode=full"
+        use = f"paletteuse=dither={_FFMPEG_DITHER[dither]}"
+    else:
+        gen = "palettegen=max_colors=255:reserve_transparent=1:stats_mode=single"
+        use = f"paletteuse=dither={_FFMPEG_DITHER[dither]}:new=1"
+    if delta:
+        use += ":diff_mode=rectangle"
+    return f"[0:v]fps={fps}{scale_expr},split[a][b];[a]{gen}[p];[b][p]{use}"
+
+
+def ffmpeg_anim_args(anim_format, fps, scale, encode=None, loop=0):
+    """WebP / APNG：fps -> scale 滤镜加编码器参数（不生成调色板）"""
+    from .encoders import encode_options
+
+    options = encode if encode is not None else encode_options(anim_format)
+    scale_expr = "" if scale == 1.0 else f",scale=trunc(iw*{scale}):trunc(ih*{scale}):flags=area"
+    args = ["-vf", f"fps={fps}{scale_expr}"]
+    if anim_format == "webp":
+        return args + ["-c:v", "libwebp_anim", "-lossless", str(int(options.get("lossless", False))),
+                       "-quality", str(options.get("quality", 80)),
+                       "-compression_level", str(options.get("method", 4)), "-loop", str(loop), "-f", "webp"]
+    return args + ["-c:v", "apng", "-pix_fmt", "rgb24", "-pred", "mixed",
+                   "-compression_level", str(options.get("compress_level", 6)), "-plays", str(loop), "-f", "apng"]
+
+
+def _video_to_gif_ffmpeg(video_path, output_path, fps, scale, palette, dither, delta, start, end,
+                         progress, cancel, anim_format="gif", encode=None):
+    from .ffmpeg import probe_duration, run_ffmpeg
+
+    length = probe_duration(video_path)
+    if length is not None and start >= length:
+        raise MediaError("开始时间超出视频长度")
+    stop = end if length is None else min(end if end is not None else length, length)
+    span = stop - start if stop is not None else None
+    frames = math.ceil(span * fps) if span else None
+
+    args = []
+    if start > 0:
+        args += ["-ss", f"{start:.3f}"]   # 输入端定位：跳到开始处之前的关键帧，只解码需要的部分
+    if end is not None:
+        args += ["-t", f"{end - start:.3f}"]
+    args += ["-i", video_path, "-an", "-sn"]
+    if anim_format != "gif":
+        args += ffmpeg_anim_args(anim_format, fps, scale, encode)
+    else:
+        args += ["-filter_complex", ffmpeg_gif_filter(fps, scale, palette, dither, delta), "-loop", "0"]
+        if not delta:
+            args += ["-gifflags", "-offsetting-transdiff"]
+        args += ["-f", "gif"]
+
+    # 写到临时文件，完成后再改名，失败或取消时不留下不完整的文件
+    part_path = output_path + ".part"
+    args += [part_path]
+    try:
+        run_ffmpeg(args, span, progress, cancel, f"正在转换为{anim_format.upper()}", frames=frames)
+        os.replace(part_path, output_path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
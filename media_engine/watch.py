@@ -0,0 +1,346 @@
+"""
+监视文件夹：持续监视输入目录，新文件写完后按扩展名规则提交到任务队列，处理完移到 done / failed 目录。
+
+- 发现新文件：Linux 上用 inotify（ctypes 调 libc，不需要第三方库），只关心新建、写完关闭和移入；
+  其他平台或 inotify 不可用时轮询，只重新列出修改时间变了的目录，不是每轮都扫描整个目录
+- 写完判定：连续 settle 秒大小和修改时间都不变才算就绪（收到“写完关闭”也照样检查，上传可能分几次写）
+- 路由：第一条扩展名匹配的规则给出若干个 (操作, 参数)，都交给 JobScheduler（CPU / I/O 池各自限并发）；
+  在途文件达到 max_pending 时暂不提交，就绪的文件先排着
+- 收尾：一个文件的任务全部成功时移到 done 目录，有失败时移到 failed 目录；被取消的留在原处，下次启动时重新处理
+
+不递归子目录，以 . 开头的文件（上传工具的临时文件、断点清单等）忽略。
+"""
+
+import os
+import shutil
+import time
+
+from .common import IMAGE_EXTS, VIDEO_EXTS, MediaError
+
+
+# inotify 事件（<sys/inotify.h>）
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+
+# 目录修改时间离现在不到这么多秒时，下一轮轮询照样列出（有的文件系统时间戳粒度粗，同一秒内的新文件不改变它）
+_COARSE_MTIME_S = 2.0
+
+
+class WatchRule:
+    """扩展名属于 exts 的文件，提交 jobs 中的每个 (操作, 参数)；参数里必须有 output_dir"""
+
+    def __init__(self, exts, jobs):
+        self.exts = tuple(ext.lower() for ext in exts)
+        self.jobs = [(op, dict(params)) for op, params in jobs]
+
+    def matches(self, path):
+        return path.lower().endswith(self.exts)
+
+
+def default_rules(output_dir, video_ops=("extract", "to-mp3"), image_format="webp", count=100):
+    """
+    视频 -> video_ops（抽帧写到 output_dir/frames，音频写到 output_dir/audio，转 GIF 写到 output_dir/gif），
+    图片 -> 转换为 image_format（写到 output_dir/{image_format}）；image_format 为 None 时不处理图片。
+    """
+    subdirs = {"extract": "frames", "to-gif": "gif", "to-mp3": "audio", "to-audio": "audio"}
+    video_jobs = []
+    for op in video_ops:
+        params = {"output_dir": os.path.join(output_dir, subdirs[op])}
+        if op == "extract":
+            params.update(count=count, checkpoint=True)
+        video_jobs.append((op, params))
+    rules = [WatchRule(VIDEO_EXTS, video_jobs)] if video_jobs else []
+    if image_format:
+        rules.append(WatchRule(IMAGE_EXTS, [
+            ("convert", {"output_dir": os.path.join(output_dir, image_format), "fmt": image_format}),
+        ]))
+    return rules
+
+
+def _ignored(name):
+    return name.startswith(".")
+
+
+class _PollingSource:
+    """轮询：记住每个目录的修改时间和文件名，目录变了才重新列出，返回新出现的文件"""
+
+    def __init__(self, dirs, interval=1.0):
+        self.dirs = dirs
+        self.interval = interval
+        self._mtimes = {}
+        self._names = {d: set() for d in dirs}
+
+    def _list(self, d):
+        try:
+            with os.scandir(d) as it:
+                names = {e.name for e in it if not _ignored(e.name) and e.is_file()}
+        except OSError:
+            return []
+        added = names - self._names[d]
+        self._names[d] = names
+        return [os.path.join(d, name) for name in sorted(added)]
+
+    def initial(self):
+        return self.changes(0)
+
+    def changes(self, timeout):
+        if timeout:
+            time.sleep(timeout)
+        found = []
+        now = time.time()
+        for d in self.dirs:
+            try:
+                mtime = os.stat(d).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != self._mtimes.get(d) or now - mtime / 1e9 < _COARSE_MTIME_S:
+                self._mtimes[d] = mtime
+                found += self._list(d)
+        return found
+
+    def forget(self, path):
+        """文件已移走：同名的新文件再出现时要当作新文件"""
+        self._names.get(os.path.dirname(path), set()).discard(os.path.basename(path))
+
+    def close(self):
+        pass
+
+
+class _InotifySource:
+    """Linux inotify：只读事件，不列目录；事件队列溢出时退回一次整目录列出"""
+
+    def __init__(self, dirs):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.dirs = {}
+        try:
+            for d in dirs:
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(d), _WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f"无法监视目录: {d}")
+                self.dirs[wd] = d
+        except OSError:
+            self.close()
+            raise
+        self._poller = _PollingSource(list(self.dirs.values()))
+
+    def initial(self):
+        return self._poller.initial()
+
+    def changes(self, timeout):
+        import select
+        import struct
+
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self._fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+
+        found = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = struct.unpack_from("iIII", data, pos)
+            name = data[pos + 16:pos + 16 + length].rstrip(b"\0")
+            pos += 16 + length
+            if mask & _IN_Q_OVERFLOW:
+                return self._poller.changes(0) + found
+            d = self.dirs.get(wd)
+            if d is None or mask & _IN_ISDIR or not name:
+                continue
+            name = os.fsdecode(name)
+            if not _ignored(name):
+                found.append(os.path.join(d, name))
+        return found
+
+    def forget(self, path):
+        self._poller.forget(path)
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def open_source(dirs, poll=False, interval=1.0):
+    """poll=False 时优先 inotify，不可用（非 Linux、监视数达到上限等）时退回轮询"""
+    if not poll:
+        try:
+            return _InotifySource(dirs)
+        except (OSError, AttributeError):
+            pass
+    return _PollingSource(dirs, interval)
+
+
+class FolderWatcher:
+    """
+    用法：
+        scheduler = JobScheduler(cpu_workers=2, io_workers=2)
+        watcher = FolderWatcher(["inbox"], default_rules("out"), scheduler, done_dir="done", failed_dir="failed")
+        watcher.run(stop_event)          # 或 watcher.run(once=True)：处理完当前已有的文件就返回
+        scheduler.shutdown()
+
+    on_file(path, status, message) 在 run() 所在线程里调用，status 为 ready / done / failed / skipped。
+    done_dir / failed_dir 默认为第一个监视目录下的 done / failed（子目录不在监视范围内）。
+    """
+
+    def __init__(self, dirs, rules, scheduler, done_dir=None, failed_dir=None, settle=2.0, interval=0.5,
+                 max_pending=None, poll=False, on_file=None):
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        if not self.dirs:
+            raise MediaError("请指定要监视的目录")
+        for d in self.dirs:
+            if not os.path.isdir(d):
+                raise MediaError(f"监视目录不存在: {d}")
+        for rule in rules:
+            for _, params in rule.jobs:
+                if os.path.abspath(params["output_dir"]) in self.dirs:
+                    raise MediaError("输出目录不能是监视目录（输出会被当成新文件再处理一遍）")
+
+        self.rules = rules
+        self.scheduler = scheduler
+        self.done_dir = done_dir or os.path.join(self.dirs[0], "done")
+        self.failed_dir = failed_dir or os.path.join(self.dirs[0], "failed")
+        self.settle = settle
+        self.interval = interval
+        self.max_pending = max_pending or sum(scheduler.limits.values()) * 4
+        self.poll = poll
+        self.on_file = on_file
+
+        self._source = None
+        self._pending = {}                  # 路径 -> (大小, 修改时间, 稳定起始时间)
+        self._ready = {}                    # 就绪待提交的路径（按就绪顺序）
+        self._inflight = {}                 # 路径 -> [Job]
+        self._started = None
+        self.counts = {"done": 0, "failed": 0, "skipped": 0}
+
+    def _notify(self, path, status, message=""):
+        if status in self.counts:
+            self.counts[status] += 1
+        if self.on_file is not None:
+            self.on_file(path, status, message)
+
+    def _track(self, path):
+        if path in self._pending or path in self._inflight or path in self._ready:
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        # 第一次看到时按修改时间算起：启动前就在目录里的文件不用再等 settle 秒
+        self._pending[path] = (st.st_size, st.st_mtime_ns, min(time.time(), st.st_mtime_ns / 1e9))
+
+    def _check_pending(self):
+        now = time.time()
+        for path, (size, mtime, since) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]     # 上传中途被删或改名
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                self._pending[path] = (st.st_size, st.st_mtime_ns, now)
+            elif now - since >= self.settle:
+                del self._pending[path]
+                self._ready[path] = None
+
+    def _route(self, path):
+        for rule in self.rules:
+            if rule.matches(path):
+                return rule
+        return None
+
+    def _submit_ready(self):
+        while self._ready and len(self._inflight) < self.max_pending:
+            path = next(iter(self._ready))
+            del self._ready[path]
+            rule = self._route(path)
+            if rule is None:
+                # 不认识的文件留在原处
+                self._notify(path, "skipped", "没有匹配的规则")
+                continue
+            self._inflight[path] = [self.scheduler.submit(op, path, **params) for op, params in rule.jobs]
+            self._notify(path, "ready", f"{len(rule.jobs)} 个任务")
+
+    def _collect_finished(self):
+        for path, jobs in list(self._inflight.items()):
+            if any(job.status in ("queued", "running") for job in jobs):
+                continue
+            del self._inflight[path]
+            if any(job.status == "cancelled" for job in jobs):
+                continue
+            failed = [job for job in jobs if job.status == "failed"]
+            try:
+                target = _move_unique(path, self.failed_dir if failed else self.done_dir)
+            except OSError as e:
+                self._notify(path, "failed", f"无法移动输入文件: {e}")
+                continue
+            self._source.forget(path)
+            if failed:
+                self._notify(path, "failed", "；".join(f"{job.op}: {job.error}" for job in failed) + f" -> {target}")
+            else:
+                self._notify(path, "done", f"{len(jobs)} 个任务 -> {target}")
+
+    @property
+    def idle(self):
+        return not (self._pending or self._ready or self._inflight)
+
+    def stats(self):
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        finished = self.counts["done"] + self.counts["failed"]
+        return {
+            "pending": len(self._pending) + len(self._ready),
+            "inflight": len(self._inflight),
+            "done": self.counts["done"],
+            "failed": self.counts["failed"],
+            "skipped": self.counts["skipped"],
+            "elapsed": elapsed,
+            "files_per_min": finished / elapsed * 60 if elapsed > 0 else 0.0,
+            "source": "poll" if isinstance(self._source, _PollingSource) else "inotify",
+        }
+
+    def run(self, stop=None, once=False, on_tick=None):
+        """
+        监视直到 stop（threading.Event）置位；once=True 时处理完启动时已有的文件（以及期间到达的）就返回。
+        on_tick(stats) 每轮调用一次，用于刷新状态。
+        """
+        self._started = time.monotonic()
+        self._source = open_source(self.dirs, self.poll, self.interval)
+        try:
+            for path in self._source.initial():
+                self._track(path)
+            while stop is None or not stop.is_set():
+                self._check_pending()
+                self._submit_ready()
+                self._collect_finished()
+                if on_tick is not None:
+                    on_tick(self.stats())
+                if once and self.idle:
+                    break
+                for path in self._source.changes(self.interval):
+                    self._track(path)
+        finally:
+            self._source.close()
+
+
+def _move_unique(path, dest_dir):
+    """移到 dest_dir，重名时加 _1、_2……，返回新路径"""
+    os.makedirs(dest_dir, exist_ok=True)
+    stem, ext = os.path.splitext(os.path.basename(path))
+    target = os.path.join(dest_dir, stem + ext)
+    n = 0
+    while os.path.exists(target):
+        n += 1
+        target = os.path.join(dest_dir, f"{stem}_{n}{ext}")
+    shutil.move(path, target)
+    return target
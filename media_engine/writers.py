@@ -0,0 +1,95 @@
+"""
+抽帧结果的异步写图：解码线程只入队，编码与写盘由写入线程池完成
+"""
+
+import os
+import queue
+import threading
+
+import cv2
+
+from .common import MediaError, default_writer_count
+from .profiling import current_recorder, stage
+
+
+class AsyncImageWriter:
+    """
+    解码线程只负责 put，JPEG/PNG 编码与写盘交给写入线程池（cv2 编码时会释放 GIL）。
+    队列有上限：写入跟不上时 put 会阻塞，从而限制内存占用。
+    任一写入失败后，put / close 会把错误抛回调用方。
+    on_written(tag) 在写入线程里、图片写完后调用（tag 为 put 时给出的值，None 时不调用）。
+    给出 sink（见 sinks 模块）时图片交给 sink.write(文件名, 帧, meta) 打包，而不是写成单独的文件。
+    """
+
+    def __init__(self, workers=None, max_pending=None, on_written=None, sink=None):
+        self.workers = workers or default_writer_count()
+        self.on_written = on_written
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=max_pending or self.workers * 2)
+        self.error = None
+        self.written = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        # 写入线程不继承调用方的上下文，创建时记下当前任务的计时器
+        self._recorder = current_recorder()
+        self._threads = [
+            threading.Thread(target=self._worker, daemon=True)
+            for _ in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.error is not None:
+                    continue  # 已出错：只消费不写，避免生产者卡死
+                path, frame, tag, meta = item
+                with stage("encode_write", recorder=self._recorder):
+                    if self.sink is not None:
+                        self.sink.write(os.path.basename(path), frame, meta)
+                    elif not cv2.imwrite(path, frame):
+                        raise MediaError(f"写入图片失败: {path}")
+                with self._lock:
+                    self.written += 1
+                if tag is not None and self.on_written is not None:
+                    self.on_written(tag)
+            except Exception as e:
+                with self._lock:
+                    if self.error is None:
+                        self.error = e
+            finally:
+                self.queue.task_done()
+
+    def put(self, path, frame, tag=None, meta=None):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((path, frame, tag, meta))
+
+    def close(self):
+        """等待所有排队的图片写完，有错误则抛出"""
+        if not self._closed:
+            self._closed = True
+            for _ in self._threads:
+                self.queue.put(None)
+            for t in self._threads:
+                t.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # 上游已出错：照样收尾线程，但保留原始异常
+            try:
+                self.close()
+            except Exception:
+                pass
+        return False
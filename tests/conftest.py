@@ -0,0 +1,57 @@
+"""测试用的合成输入：cv2.VideoWriter 写的小视频、numpy 图片，不需要 ffmpeg"""
+
+import cv2
+import numpy as np
+import pytest
+
+
+def write_video(path, frames, fps=25):
+    """BGR 帧列表写成 MJPG .avi（每帧都是关键帧，定位和顺序解码得到的帧相同）"""
+    h, w = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (w, h))
+    assert writer.isOpened()
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def gradient_frames(count, width=96, height=64):
+    """每帧平移的渐变 + 移动色块，相邻帧各不相同"""
+    ys, xs = np.mgrid[0:height, 0:width]
+    frames = []
+    for i in range(count):
+        frame = np.empty((height, width, 3), np.uint8)
+        frame[..., 0] = (xs * 4 + i * 3) % 256
+        frame[..., 1] = (ys * 4 + i * 5) % 256
+        frame[..., 2] = (i * 7) % 256
+        x = i * 2 % (width - 16)
+        frame[8:24, x:x + 16] = (255, 255, 255)
+        frames.append(frame)
+    return frames
+
+
+def scene_frames(shots, length, width=96, height=64, seed=0):
+    """shots 个镜头，每个镜头 length 帧的纯色底 + 移动竖条，镜头之间颜色突变"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(shots):
+        color = rng.integers(0, 256, 3).astype(np.uint8)
+        for k in range(length):
+            frame = np.full((height, width, 3), color, np.uint8)
+            x = k * 3 % (width - 8)
+            frame[:, x:x + 8] = 255 - color
+            frames.append(frame)
+    return frames
+
+
+@pytest.fixture
+def video(tmp_path):
+    """60 帧 96x64 的测试视频"""
+    return write_video(str(tmp_path / "clip.avi"), gradient_frames(60))
+
+
+@pytest.fixture
+def scene_video(tmp_path):
+    """8 个镜头，每个 1 秒（25 帧）"""
+    return write_video(str(tmp_path / "shots.avi"), scene_frames(8, 25))
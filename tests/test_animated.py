@@ -0,0 +1,170 @@
+import io
+import os
+
+import numpy as np
+import PIL
+import pytest
+from PIL import Image, ImageSequence
+
+from conftest import gradient_frames
+from media_engine.animated import GifComparison, StreamingApngWriter, StreamingWebpWriter, open_animation_writer
+from media_engine.common import MediaError
+from media_engine.profiling import JobProfile, StageRecorder, format_report, merge_reports, recording
+
+
+def _frames(count):
+    return [f[:, :, ::-1].copy() for f in gradient_frames(count)]
+
+
+def _read(path):
+    frames = []
+    with Image.open(path) as im:
+        for frame in ImageSequence.Iterator(im):
+            # WebP 的帧时长在解码该帧之后才写进 info
+            pixels = np.asarray(frame.convert("RGBA")).copy()
+            frames.append((frame.info["duration"], pixels))
+    return frames
+
+
+def _write(writer, frames):
+    with writer:
+        for frame in frames:
+            writer.add_frame(frame)
+    return writer
+
+
+@pytest.mark.parametrize("delta", [True, False])
+def test_apng_round_trip_is_lossless(tmp_path, delta):
+    path = str(tmp_path / "out.png")
+    frames = _frames(6)
+    writer = _write(StreamingApngWriter(path, 70, delta=delta), frames)
+    assert writer.written_frames == 6
+    assert not os.path.exists(path + ".part")
+    decoded = _read(path)
+    assert [d for d, _ in decoded] == [70] * 6
+    for (_, got), want in zip(decoded, frames):
+        assert np.array_equal(got[..., :3], want)
+
+
+def test_apng_merges_identical_frames(tmp_path):
+    path = str(tmp_path / "out.png")
+    a, b = _frames(2)
+    writer = _write(StreamingApngWriter(path, 40), [a, a, a, b])
+    assert (writer.frame_count, writer.written_frames) == (4, 2)
+    assert [d for d, _ in _read(path)] == [120, 40]
+
+
+def test_apng_keeps_alpha(tmp_path):
+    path = str(tmp_path / "out.png")
+    first = Image.new("RGBA", (16, 16), (255, 0, 0, 255))
+    first.paste((0, 0, 0, 0), (0, 0, 8, 16))
+    second = first.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    _write(StreamingApngWriter(path, 100), [first, second])
+    decoded = _read(path)
+    assert np.array_equal(decoded[0][1], np.asarray(first))
+    assert np.array_equal(decoded[1][1], np.asarray(second))
+
+
+def test_webp_round_trip(tmp_path):
+    path = str(tmp_path / "out.webp")
+    frames = _frames(5)
+    encode = {"quality": 100, "method": 0, "lossless": True}
+    writer = _write(StreamingWebpWriter(path, 90, encode=encode), frames)
+    assert writer.streaming
+    assert writer.frame_count == 5
+    decoded = _read(path)
+    assert [d for d, _ in decoded] == [90] * 5
+    for (_, got), want in zip(decoded, frames):
+        assert np.array_equal(got[..., :3], want)
+
+
+class _OldSignatureEncoder:
+    def add(self, *args):
+        raise TypeError("add() takes exactly 5 arguments")
+
+
+def _old_pillow(monkeypatch):
+    monkeypatch.setattr(PIL, "__version__", "10.4.0")
+
+
+def _constructor_mismatch(monkeypatch):
+    def open_encoder(self, size):
+        raise TypeError("an integer is required")
+    monkeypatch.setattr(StreamingWebpWriter, "_open_encoder", open_encoder)
+
+
+def _add_mismatch(monkeypatch):
+    monkeypatch.setattr(StreamingWebpWriter, "_open_encoder", lambda self, size: _OldSignatureEncoder())
+
+
+@pytest.mark.parametrize("break_encoder", [_old_pillow, _constructor_mismatch, _add_mismatch])
+def test_webp_falls_back_to_image_save(tmp_path, monkeypatch, break_encoder):
+    break_encoder(monkeypatch)
+    path = str(tmp_path / "out.webp")
+    frames = _frames(4)
+    encode = {"quality": 100, "method": 0, "lossless": True}
+    with StreamingWebpWriter(path, 60, encode=encode) as writer:
+        for frame in frames:
+            writer.add_frame(frame)
+            # 帧数组被调用方复用时，已缓存的帧不受影响
+            frame[:] = 0
+    assert not writer.streaming
+    assert writer.frame_count == 4
+    decoded = _read(path)
+    assert [d for d, _ in decoded] == [60] * 4
+    for (_, got), want in zip(decoded, _frames(4)):
+        assert np.array_equal(got[..., :3], want)
+
+
+@pytest.mark.parametrize("fmt", ["webp", "apng"])
+def test_writer_without_frames_leaves_nothing(tmp_path, fmt):
+    path = str(tmp_path / "out.anim")
+    writer = open_animation_writer(fmt, path, 100)
+    with pytest.raises(MediaError):
+        writer.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_unknown_animation_format(tmp_path):
+    with pytest.raises(MediaError):
+        open_animation_writer("avif", str(tmp_path / "out.avif"), 100)
+
+
+def test_gif_comparison_records_both_outputs(tmp_path):
+    path = str(tmp_path / "out.png")
+    recorder = StageRecorder()
+    with recording(recorder):
+        _write(GifComparison(StreamingApngWriter(path, 50), "apng", 50), _frames(4))
+    entry = recorder.notes["compare"]
+    assert entry["format"] == "apng"
+    assert entry["bytes"] == os.path.getsize(path)
+    assert entry["gif_bytes"] > 0
+    assert entry["size_ratio"] == pytest.approx(entry["bytes"] / entry["gif_bytes"], rel=1e-3)
+    # 临时 GIF 不保留
+    assert os.listdir(tmp_path) == ["out.png"]
+
+
+def test_gif_comparison_abort_removes_both(tmp_path):
+    path = str(tmp_path / "out.webp")
+    with pytest.raises(RuntimeError):
+        with GifComparison(StreamingWebpWriter(path, 50), "webp", 50) as writer:
+            writer.add_frame(_frames(1)[0])
+            raise RuntimeError("中断")
+    assert os.listdir(tmp_path) == []
+
+
+def test_merged_report_totals_comparison(tmp_path):
+    reports = []
+    for name in ("a", "b"):
+        path = str(tmp_path / f"{name}.png")
+        with JobProfile("to-gif", []) as prof:
+            _write(GifComparison(StreamingApngWriter(path, 50), "apng", 50), _frames(3))
+        reports.append(prof.report(path, [path]))
+    merged = merge_reports(reports)
+    compare = merged["compare"]
+    assert compare["bytes"] == sum(r["compare"]["bytes"] for r in reports)
+    assert compare["gif_bytes"] == sum(r["compare"]["gif_bytes"] for r in reports)
+    assert compare["size_ratio"] == pytest.approx(compare["bytes"] / compare["gif_bytes"])
+    out = io.StringIO()
+    format_report(merged, out)
+    assert "与 GIF 对比" in out.getvalue()
@@ -0,0 +1,107 @@
+import os
+import subprocess
+
+import pytest
+
+from media_engine import audio
+from media_engine.audio import AUTO_CONTAINERS, COPY_CODECS, ENCODE_ARGS, MUXERS, plan_audio_extract
+from media_engine.common import AUDIO_FORMATS, Cancelled, MediaError
+
+
+@pytest.mark.parametrize("codec, container", [
+    ("aac", "m4a"), ("alac", "m4a"), ("mp3", "mp3"), ("opus", "opus"), ("vorbis", "ogg"), ("flac", "flac"),
+])
+def test_auto_copies_into_matching_container(codec, container):
+    assert plan_audio_extract(codec) == (container, True)
+
+
+def test_auto_transcodes_unknown_codec_to_mp3():
+    assert plan_audio_extract("wmav2") == ("mp3", False)
+    assert plan_audio_extract(None) == ("mp3", False)
+
+
+@pytest.mark.parametrize("codec, fmt, expected", [
+    ("mp3", "mp3", ("mp3", True)),
+    ("aac", "mp3", ("mp3", False)),
+    ("opus", "ogg", ("ogg", True)),
+    ("pcm_s16le", "wav", ("wav", True)),
+    ("aac", "wav", ("wav", False)),
+])
+def test_fixed_format(codec, fmt, expected):
+    assert plan_audio_extract(codec, fmt) == expected
+
+
+def test_copy_disabled_always_transcodes():
+    assert plan_audio_extract("aac", "auto", copy=False) == ("m4a", False)
+    assert plan_audio_extract("mp3", "mp3", copy=False) == ("mp3", False)
+
+
+def test_unknown_format():
+    with pytest.raises(MediaError):
+        plan_audio_extract("aac", "wma")
+
+
+def test_tables_cover_every_container():
+    containers = set(AUDIO_FORMATS) - {"auto"}
+    assert set(COPY_CODECS) == containers
+    assert set(ENCODE_ARGS) == containers
+    assert set(MUXERS) == containers
+    # auto 选出的容器必须能直接复制该编码
+    for codec, container in AUTO_CONTAINERS.items():
+        assert codec in COPY_CODECS[container]
+
+
+FFMPEG_INFO = """\
+Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'clip.mp4':
+  Duration: 00:01:02.50, start: 0.000000, bitrate: 1205 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p, 1280x720, 1070 kb/s, 25 fps
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 44100 Hz, stereo, fltp, 128 kb/s (default)
+At least one output file must be specified
+"""
+
+
+def test_probe_falls_back_to_ffmpeg_output(monkeypatch):
+    monkeypatch.setattr(audio.shutil, "which", lambda name: "/usr/bin/ffmpeg" if name == "ffmpeg" else None)
+    monkeypatch.setattr(audio.subprocess, "run", lambda cmd, **kw: subprocess.CompletedProcess(cmd, 1, "", FFMPEG_INFO))
+    info = audio.probe_audio("clip.mp4")
+    assert info == {"codec": "aac", "duration": 62.5, "sample_rate": 44100, "channels": 2, "bit_rate": 128000}
+
+
+def test_probe_without_audio_track(monkeypatch):
+    text = FFMPEG_INFO.replace("  Stream #0:1", "  Data #0:1")
+    monkeypatch.setattr(audio.shutil, "which", lambda name: "/usr/bin/ffmpeg" if name == "ffmpeg" else None)
+    monkeypatch.setattr(audio.subprocess, "run", lambda cmd, **kw: subprocess.CompletedProcess(cmd, 1, "", text))
+    assert audio.probe_audio("clip.mp4") is None
+
+
+def _fake_extract(monkeypatch, fail):
+    calls = []
+
+    def run_ffmpeg(args, duration=None, progress=None, cancel=None, message=""):
+        calls.append(args)
+        with open(args[-1], "wb") as f:
+            f.write(b"new")
+        if fail is not None:
+            raise fail
+
+    monkeypatch.setattr(audio, "probe_audio", lambda path: {"codec": "aac", "duration": 1.0})
+    monkeypatch.setattr(audio, "run_ffmpeg", run_ffmpeg)
+    return calls
+
+
+def test_extract_writes_part_then_replaces(monkeypatch, tmp_path):
+    calls = _fake_extract(monkeypatch, None)
+    out = audio.extract_audio("clip.mp4", str(tmp_path))
+    assert out == str(tmp_path / "clip.m4a")
+    assert calls[0][-3:] == ["-f", "ipod", out + ".part"]
+    assert os.listdir(tmp_path) == ["clip.m4a"]
+
+
+@pytest.mark.parametrize("error", [MediaError("ffmpeg 出错"), Cancelled()])
+def test_failed_extract_keeps_existing_output(monkeypatch, tmp_path, error):
+    (tmp_path / "clip.m4a").write_bytes(b"old")
+    _fake_extract(monkeypatch, error)
+    with pytest.raises(type(error)):
+        audio.extract_audio("clip.mp4", str(tmp_path))
+    assert os.listdir(tmp_path) == ["clip.m4a"]
+    assert (tmp_path / "clip.m4a").read_bytes() == b"old"
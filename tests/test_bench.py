@@ -0,0 +1,68 @@
+import pytest
+
+from media_engine.bench import DEFAULT_TOLERANCE, MIN_TIME_DELTA, compare_results
+
+
+def _case(wall_s=1.0, peak_rss_mb=100.0, output_bytes=1000, **extra):
+    return {"pipeline": "extract", "wall_s": wall_s, "peak_rss_mb": peak_rss_mb, "output_bytes": output_bytes,
+            **extra}
+
+
+def _rows(current, baseline):
+    return {(name, metric): (change, regressed)
+            for name, metric, _, _, change, regressed in compare_results({"cases": current}, {"cases": baseline})}
+
+
+def test_unchanged_is_not_regression():
+    rows = _rows({"a": _case()}, {"a": _case()})
+    assert set(rows) == {("a", "wall_s"), ("a", "peak_rss_mb"), ("a", "output_bytes")}
+    assert not any(regressed for _, regressed in rows.values())
+
+
+def test_slower_beyond_tolerance_flagged():
+    rows = _rows({"a": _case(wall_s=1.0 * (1 + DEFAULT_TOLERANCE) + 0.1)}, {"a": _case()})
+    assert rows["a", "wall_s"][1]
+    assert not rows["a", "peak_rss_mb"][1]
+
+
+def test_within_tolerance_not_flagged():
+    rows = _rows({"a": _case(wall_s=1.1, output_bytes=1100)}, {"a": _case()})
+    assert not rows["a", "wall_s"][1] and not rows["a", "output_bytes"][1]
+
+
+def test_faster_not_flagged():
+    rows = _rows({"a": _case(wall_s=0.5)}, {"a": _case()})
+    assert rows["a", "wall_s"] == (-0.5, False)
+
+
+def test_timing_jitter_on_tiny_cases_ignored():
+    # 相对变化很大，但绝对差值不到 MIN_TIME_DELTA
+    rows = _rows({"a": _case(wall_s=0.01 + MIN_TIME_DELTA / 2)}, {"a": _case(wall_s=0.01)})
+    assert rows["a", "wall_s"][0] > DEFAULT_TOLERANCE
+    assert not rows["a", "wall_s"][1]
+
+
+def test_memory_regression_needs_absolute_delta():
+    rows = _rows({"a": _case(peak_rss_mb=28.0), "b": _case(peak_rss_mb=200.0)},
+                 {"a": _case(peak_rss_mb=20.0), "b": _case(peak_rss_mb=100.0)})
+    assert not rows["a", "peak_rss_mb"][1]
+    assert rows["b", "peak_rss_mb"][1]
+
+
+def test_output_growth_flagged():
+    rows = _rows({"a": _case(output_bytes=2000)}, {"a": _case()})
+    assert rows["a", "output_bytes"] == (1.0, True)
+
+
+@pytest.mark.parametrize("current, baseline", [
+    ({"a": {"pipeline": "extract", "error": "x"}}, {"a": _case()}),
+    ({"a": _case()}, {"a": {"pipeline": "extract", "error": "x"}}),
+    ({"a": _case()}, {"b": _case()}),
+])
+def test_errors_and_missing_cases_skipped(current, baseline):
+    assert _rows(current, baseline) == {}
+
+
+def test_missing_metric_skipped():
+    rows = _rows({"a": _case(peak_rss_mb=None)}, {"a": _case()})
+    assert ("a", "peak_rss_mb") not in rows and ("a", "wall_s") in rows
@@ -0,0 +1,124 @@
+import os
+import time
+
+import pytest
+
+from media_engine.cache import ResultCache, parse_size
+from media_engine.common import MediaError
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"), max_bytes=1024 ** 3)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "in" / "clip.mp4"
+    path.parent.mkdir()
+    path.write_bytes(b"video" * 100)
+    return str(path)
+
+
+PARAMS = {"output_dir": "out", "count": 10, "fmt": "jpg", "mode": "uniform", "threshold": 0.35, "dedup": None,
+          "dedup_threshold": 5, "sink": "files"}
+
+
+def test_key_stable_and_ignores_speed_params(cache, source):
+    key = cache.key("extract", source, PARAMS)
+    assert key == cache.key("extract", source, dict(PARAMS, strategy="seek", writers=8, output_dir="other"))
+    gif = cache.key("to-gif", source, dict(PARAMS, fps=10))
+    assert gif == cache.key("to-gif", source, dict(PARAMS, fps=10, segments=4))
+
+
+def test_key_changes_with_output_params(cache, source):
+    key = cache.key("extract", source, PARAMS)
+    assert key != cache.key("extract", source, dict(PARAMS, count=11))
+    assert key != cache.key("to-gif", source, PARAMS)
+
+
+def test_key_changes_when_input_modified(cache, source):
+    key = cache.key("extract", source, PARAMS)
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert cache.key("extract", source, PARAMS) != key
+
+
+def test_content_hash_key_survives_touch_and_move(tmp_path, source):
+    cache = ResultCache(str(tmp_path / "cache"), content_hash=True)
+    key = cache.key("extract", source, PARAMS)
+    other = tmp_path / "moved"
+    other.mkdir()
+    moved = str(other / "clip.mp4")
+    os.replace(source, moved)
+    os.utime(moved)
+    assert cache.key("extract", moved, PARAMS) == key
+
+
+def test_key_unknown_op(cache, source):
+    with pytest.raises(MediaError):
+        cache.key("transcode", source, PARAMS)
+
+
+def _store(cache, tmp_path, name, size):
+    out = tmp_path / f"out_{name}"
+    out.mkdir()
+    (out / f"{name}.bin").write_bytes(b"x" * size)
+    src = tmp_path / f"{name}.mp4"
+    src.write_bytes(name.encode())
+    params = {"output_dir": str(out)}
+    key = cache.key("to-mp3", str(src), params)
+    cache.store(key, "to-mp3", str(src), params, [f"{name}.bin"], str(out / f"{name}.bin"))
+    return key, params
+
+
+def test_run_hit_restores_output(cache, tmp_path, source):
+    out = tmp_path / "out"
+    calls = []
+
+    def run():
+        calls.append(1)
+        out.mkdir(exist_ok=True)
+        path = out / "clip.mp3"
+        path.write_bytes(b"mp3")
+        return str(path)
+
+    params = {"output_dir": str(out)}
+    result, hit = cache.run("to-mp3", source, params, run)
+    assert not hit
+    os.remove(result)
+    result2, hit = cache.run("to-mp3", source, params, run)
+    assert hit and result2 == result and len(calls) == 1
+    assert open(result2, "rb").read() == b"mp3"
+
+
+def test_evict_removes_least_recently_used(cache, tmp_path):
+    keys = {}
+    for name in ("a", "b", "c"):
+        keys[name], params = _store(cache, tmp_path, name, 1000)
+        time.sleep(0.01)
+    # 用一次 a：b 成为最久未用的
+    assert cache.fetch(keys["a"], str(tmp_path / "restore")) is not None
+
+    removed, freed = cache.evict(max_bytes=2000)
+    assert (removed, freed) == (1, 1000)
+    remaining = {entry["key"] for entry in cache.entries()}
+    assert remaining == {keys["a"], keys["c"]}
+    assert not os.path.exists(cache._object_dir(keys["b"]))
+
+    assert cache.evict(max_bytes=0) == (2, 2000)
+    assert cache.stats()["entries"] == 0
+
+
+def test_store_evicts_over_limit(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1500)
+    _store(cache, tmp_path, "a", 1000)
+    time.sleep(0.01)
+    _store(cache, tmp_path, "b", 1000)
+    assert [entry["size"] for entry in cache.entries()] == [1000]
+    assert cache.stats()["size"] <= 1500
+
+
+@pytest.mark.parametrize("text, value", [("500", 500), ("1K", 1024), ("2G", 2 * 1024 ** 3), ("1.5M", 1572864)])
+def test_parse_size(text, value):
+    assert parse_size(text) == value
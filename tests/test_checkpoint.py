@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from media_engine.checkpoint import Checkpoint, checkpoint_path, pack_ranges, unpack_ranges
+
+
+@pytest.mark.parametrize("numbers, ranges", [
+    (set(), []),
+    ({3}, [[3, 3]]),
+    ({0, 1, 2, 5, 7, 8}, [[0, 2], [5, 5], [7, 8]]),
+    ([9, 1, 0, 10], [[0, 1], [9, 10]]),
+])
+def test_pack_ranges(numbers, ranges):
+    assert pack_ranges(numbers) == ranges
+    assert unpack_ranges(ranges) == set(numbers)
+
+
+def test_pack_ranges_roundtrip_large():
+    numbers = {n for n in range(10000) if n % 7 and n % 11}
+    assert unpack_ranges(pack_ranges(numbers)) == numbers
+
+
+def _open(path, params=None, fingerprint=None):
+    return Checkpoint(path, "extract", params or {"count": 10}, fingerprint or {"size": 1})
+
+
+def test_checkpoint_saved_on_error_and_resumed(tmp_path):
+    path = checkpoint_path(str(tmp_path), "clip.extract")
+    with pytest.raises(RuntimeError):
+        with _open(path) as ckpt:
+            for i in (0, 1, 2, 5):
+                ckpt.mark(i)
+            ckpt.mark("a.png")
+            raise RuntimeError("中断")
+
+    data = json.loads(open(path, encoding="utf-8").read())
+    assert data["indices"] == [[0, 2], [5, 5]]
+    assert data["files"] == ["a.png"]
+
+    resumed = _open(path)
+    assert resumed.resumed == 5
+    assert 5 in resumed and 3 not in resumed and "a.png" in resumed
+
+
+def test_checkpoint_removed_on_success(tmp_path):
+    path = checkpoint_path(str(tmp_path), "clip.extract")
+    with _open(path) as ckpt:
+        ckpt.mark(0)
+        ckpt.save()
+        assert (tmp_path / ".clip.extract.checkpoint.json").exists()
+    assert not (tmp_path / ".clip.extract.checkpoint.json").exists()
+
+
+@pytest.mark.parametrize("params, fingerprint", [
+    ({"count": 20}, None),                  # 参数变了
+    (None, {"size": 2}),                    # 输入文件变了
+])
+def test_checkpoint_invalidated(tmp_path, params, fingerprint):
+    path = checkpoint_path(str(tmp_path), "clip.extract")
+    ckpt = _open(path)
+    ckpt.mark(0)
+    ckpt.save()
+    assert _open(path).resumed == 1
+    assert _open(path, params, fingerprint).resumed == 0
+
+
+def test_checkpoint_params_tuple_equals_list(tmp_path):
+    path = checkpoint_path(str(tmp_path), "grid.crop")
+    ckpt = Checkpoint(path, "grid-crop", {"size": (4, 4)})
+    ckpt.mark("a")
+    ckpt.save()
+    assert Checkpoint(path, "grid-crop", {"size": [4, 4]}).resumed == 1
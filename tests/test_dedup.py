@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from media_engine.common import MediaError
+from media_engine.dedup import FrameDeduper, hamming
+
+from conftest import gradient_frames
+
+
+def _noisy(frame, amount, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(-amount, amount + 1, frame.shape)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def test_hamming():
+    assert hamming(0b1011, 0b0001) == 2
+    assert hamming(2 ** 64 - 1, 0) == 64
+
+
+@pytest.mark.parametrize("method", ["ahash", "dhash"])
+def test_identical_frames_dropped(method):
+    frame = gradient_frames(1)[0]
+    deduper = FrameDeduper(method, threshold=0)
+    assert deduper.add(frame, 0, 0.0, "a_0001.png")
+    assert not deduper.add(frame.copy(), 1, 0.04, "a_0002.png")
+    assert deduper.dropped == 1
+    assert deduper.kept[0]["replaced"] == [{"index": 1, "time": 0.04, "distance": 0}]
+
+
+@pytest.mark.parametrize("method", ["ahash", "dhash"])
+def test_slight_noise_within_threshold(method):
+    frame = gradient_frames(1)[0]
+    deduper = FrameDeduper(method, threshold=5)
+    assert deduper.add(frame, 0, None, "a")
+    assert not deduper.add(_noisy(frame, 2), 1, None, "b")
+
+
+@pytest.mark.parametrize("method", ["ahash", "dhash"])
+def test_different_frames_kept(method):
+    a = np.zeros((64, 96, 3), np.uint8)
+    a[:, :48] = 255
+    b = a[:, ::-1].copy()
+    deduper = FrameDeduper(method, threshold=5)
+    assert deduper.add(a, 0, None, "a")
+    assert deduper.add(b, 1, None, "b")
+    assert len(deduper.kept) == 2 and deduper.dropped == 0
+
+
+def test_threshold_compares_with_last_kept():
+    # 缓慢变化：每帧与上一帧很像，但与上一张保留帧的差异累积到阈值以上时保留
+    frames = gradient_frames(40)
+    strict = FrameDeduper("dhash", threshold=0)
+    loose = FrameDeduper("dhash", threshold=64)
+    for i, frame in enumerate(frames):
+        strict.add(frame, i, None, str(i))
+        loose.add(frame, i, None, str(i))
+    assert len(loose.kept) == 1 and loose.dropped == 39
+    assert len(strict.kept) > len(loose.kept)
+
+
+@pytest.mark.parametrize("method, threshold", [("md5", 5), ("dhash", -1), ("dhash", 65)])
+def test_invalid_arguments(method, threshold):
+    with pytest.raises(MediaError):
+        FrameDeduper(method, threshold)
@@ -0,0 +1,95 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from media_engine.common import ENCODE_PRESETS, MediaError
+from media_engine.encoders import PRESETS, encode_options, estimate_presets, save_image
+
+
+def test_balanced_matches_pillow_defaults():
+    assert encode_options("png") == {"compress_level": 6, "optimize": False}
+    assert encode_options("webp")["method"] == 4
+
+
+def test_presets_keep_quality():
+    for name in ("JPEG", "WEBP"):
+        assert len({PRESETS[p][name]["quality"] for p in ENCODE_PRESETS}) == 1
+
+
+def test_overrides_apply_only_to_matching_format():
+    assert encode_options("jpg", "fast", quality=90, compress_level=3)["quality"] == 90
+    assert "compress_level" not in encode_options("jpg", quality=90, compress_level=3)
+    assert encode_options("png", "smallest", quality=90) == {"compress_level": 9, "optimize": True}
+    # None 表示沿用预设
+    assert encode_options("webp", "smallest", method=None)["method"] == 6
+
+
+def test_formats_without_knobs():
+    assert encode_options("bmp", "smallest") == {}
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"preset": "tiny"},
+    {"quality": 0},
+    {"subsampling": "4:1:1"},
+    {"optimize": 1},
+])
+def test_invalid_options(kwargs):
+    with pytest.raises(MediaError):
+        encode_options("jpg", **kwargs)
+
+
+def test_unknown_format():
+    with pytest.raises(MediaError):
+        encode_options("tga")
+
+
+def test_save_image_converts_for_jpeg():
+    buf = io.BytesIO()
+    save_image(Image.new("RGBA", (8, 8), (10, 20, 30, 128)), buf, "jpg", encode_options("jpg"))
+    buf.seek(0)
+    with Image.open(buf) as im:
+        assert (im.format, im.mode) == ("JPEG", "RGB")
+
+
+def _write_images(tmp_path, count, size=(120, 80)):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        # 平滑渐变加少量噪声：不同压缩级别的输出大小有明显差别
+        ys, xs = np.mgrid[0:size[1], 0:size[0]]
+        base = np.stack([xs * 2 + i, ys * 3, xs + ys], axis=-1) % 256
+        noise = rng.integers(0, 8, base.shape)
+        path = str(tmp_path / f"img_{i}.png")
+        Image.fromarray((base + noise).clip(0, 255).astype(np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_estimate_presets_scales_samples_to_batch(tmp_path):
+    paths = _write_images(tmp_path, 6)
+    calls = []
+    estimates = estimate_presets(paths, "png", samples=3, workers=2, progress=lambda *a: calls.append(a))
+    assert [e["preset"] for e in estimates] == list(ENCODE_PRESETS)
+    assert [done for done, _, _ in calls] == [1, 2, 3]
+
+    by_preset = {e["preset"]: e for e in estimates}
+    assert by_preset["smallest"]["bytes"] < by_preset["fast"]["bytes"]
+
+    # 所有图片同尺寸：整批大小 = 样本平均 x 张数，与实际逐张编码的结果一致
+    for preset in ENCODE_PRESETS:
+        actual = 0
+        for path in paths:
+            buf = io.BytesIO()
+            with Image.open(path) as im:
+                save_image(im, buf, "png", encode_options("png", preset))
+            actual += buf.tell()
+        assert by_preset[preset]["bytes"] == pytest.approx(actual, rel=0.05)
+        assert by_preset[preset]["seconds"] == pytest.approx(by_preset[preset]["cpu_seconds"] / 2)
+
+
+def test_estimate_presets_needs_input():
+    with pytest.raises(MediaError):
+        estimate_presets([], "png")
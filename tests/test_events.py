@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from media_engine.events import EventBus, EventPump
+
+
+def test_progress_coalesced_per_source():
+    bus = EventBus()
+    progress = bus.progress("a")
+    for i in range(100):
+        progress(i, 100, f"{i}")
+    bus.update("b", 1, 2)
+    events = bus.drain()
+    assert [(e.source, e.done) for e in events] == [("a", 99), ("b", 1)]
+    assert bus.drain() == []
+
+
+def test_other_events_not_coalesced_and_ordered():
+    bus = EventBus()
+    bus.post("a", "started", "开始")
+    bus.post("a", "log", "一")
+    bus.post("a", "log", "二")
+    bus.post("b", "failed", "失败")
+    assert [(e.source, e.kind, e.message) for e in bus.drain()] == [
+        ("a", "started", "开始"), ("a", "log", "一"), ("a", "log", "二"), ("b", "failed", "失败"),
+    ]
+
+
+def test_pending_progress_delivered_before_finish():
+    bus = EventBus()
+    bus.update("a", 5, 10)
+    bus.update("b", 1, 10)
+    bus.update("a", 10, 10)
+    bus.post("a", "finished", "完成")
+    events = bus.drain()
+    kinds = [(e.source, e.kind, e.done) for e in events]
+    # a 的最新进度在 a 完成之前；b 的进度发生在 a 的最后一次进度之前
+    assert kinds == [("b", "progress", 1), ("a", "progress", 10), ("a", "finished", None)]
+
+
+def test_post_rejects_progress_and_unknown_kinds():
+    bus = EventBus()
+    with pytest.raises(ValueError):
+        bus.post("a", "progress")
+    with pytest.raises(ValueError):
+        bus.post("a", "done")
+
+
+def test_dispatch_isolates_failing_handler():
+    bus = EventBus()
+    seen = []
+
+    def broken(event):
+        raise RuntimeError("订阅者出错")
+
+    bus.subscribe(broken)
+    bus.subscribe(seen.append)
+    bus.post("a", "log", "x")
+    assert bus.dispatch() == 1
+    assert [e.message for e in seen] == ["x"]
+
+
+def test_pump_delivers_everything_from_many_threads():
+    bus = EventBus()
+    seen = []
+    bus.subscribe(seen.append)
+
+    def worker(n):
+        progress = bus.progress(f"w{n}")
+        for i in range(200):
+            progress(i, 200)
+        bus.post(f"w{n}", "finished", f"w{n}")
+
+    with EventPump(bus, rate=200):
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    finished = [e.source for e in seen if e.kind == "finished"]
+    assert sorted(finished) == ["w0", "w1", "w2", "w3"]
+    for n in range(4):
+        mine = [e for e in seen if e.source == f"w{n}"]
+        assert mine[-1].kind == "finished"
+        done = [e.done for e in mine if e.kind == "progress"]
+        assert done == sorted(done) and len(done) < 200
+
+
+def test_progress_template_formatted_only_on_drain(monkeypatch):
+    from media_engine import events
+    from media_engine.common import PROCESSING, format_progress
+
+    formatted = []
+
+    def counting(message, done, total):
+        formatted.append(done)
+        return format_progress(message, done, total)
+
+    monkeypatch.setattr(events, "format_progress", counting)
+    bus = EventBus()
+    progress = bus.progress("a")
+    for i in range(1, 1001):
+        progress(i, 1000, PROCESSING)
+    assert formatted == []
+    [event] = bus.drain()
+    assert event.message == "处理中: 1000/1000"
+    assert formatted == [1000]
+    # 没有新进度时不再生成事件
+    assert bus.drain() == []
+
+
+def test_format_progress_leaves_plain_messages():
+    from media_engine.common import PROCESSING, format_progress
+
+    assert format_progress("正在检测镜头... 已找到 {3} 个", 1, 2) == "正在检测镜头... 已找到 {3} 个"
+    assert format_progress(PROCESSING, 3, 8) == "处理中: 3/8"
@@ -0,0 +1,115 @@
+import filecmp
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from media_engine import video
+from media_engine.common import Cancelled
+from media_engine.video import choose_extract_strategy, extract_frames, iter_video_frames, plan_frame_indices
+
+
+def test_plan_frame_indices_uniform():
+    assert plan_frame_indices(100, 4) == [0, 25, 50, 75]
+    assert plan_frame_indices(10, 3) == [0, 3, 6]
+
+
+def test_plan_frame_indices_caps_count():
+    assert plan_frame_indices(5, 20) == [0, 1, 2, 3, 4]
+
+
+def test_choose_strategy_dense_is_sequential():
+    # 每隔 2 帧取一帧：顺序解码 200 帧，逐帧定位要解码 100 x 半个 GOP
+    assert choose_extract_strategy(list(range(0, 200, 2)), gop_size=250) == "sequential"
+
+
+def test_choose_strategy_sparse_is_seek():
+    # 一小时的视频只取 10 帧，关键帧间隔短
+    assert choose_extract_strategy(plan_frame_indices(90000, 10), gop_size=30) == "seek"
+
+
+def test_choose_strategy_empty():
+    assert choose_extract_strategy([]) == "sequential"
+
+
+def _decode(path, indices, strategy):
+    cap = cv2.VideoCapture(path)
+    try:
+        return [(i, idx, None if f is None else f.copy()) for i, idx, f in iter_video_frames(cap, indices, strategy)]
+    finally:
+        cap.release()
+
+
+def test_iter_video_frames_seek_matches_sequential(video):
+    indices = [0, 1, 7, 7, 30, 59]
+    seek = _decode(video, indices, "seek")
+    sequential = _decode(video, indices, "sequential")
+    assert [(i, idx) for i, idx, _ in seek] == [(i, idx) for i, idx, _ in sequential]
+    for (_, _, a), (_, _, b) in zip(seek, sequential):
+        assert np.array_equal(a, b)
+
+
+def test_iter_video_frames_past_end_yields_none(video):
+    frames = _decode(video, [58, 59, 60, 75], "sequential")
+    assert [f is None for _, _, f in frames] == [False, False, True, True]
+
+
+def test_extract_seek_and_sequential_outputs_identical(video, tmp_path):
+    outputs = {}
+    for strategy in ("seek", "sequential"):
+        out = str(tmp_path / strategy)
+        assert extract_frames(video, out, 12, "png", strategy=strategy) == 12
+        outputs[strategy] = out
+    names = sorted(os.listdir(outputs["seek"]))
+    assert names == [f"clip_{i:04d}.png" for i in range(1, 13)]
+    assert names == sorted(os.listdir(outputs["sequential"]))
+    match, mismatch, errors = filecmp.cmpfiles(outputs["seek"], outputs["sequential"], names, shallow=False)
+    assert not mismatch and not errors
+
+
+def test_extract_resumes_from_checkpoint(video, tmp_path):
+    from media_engine.checkpoint import Checkpoint, checkpoint_path, input_fingerprint
+
+    reference = str(tmp_path / "reference")
+    extract_frames(video, reference, 20, "png")
+
+    out = str(tmp_path / "out")
+    cancel = threading.Event()
+
+    def progress(done, total, message):
+        if done >= 8:
+            cancel.set()
+
+    with pytest.raises(Cancelled):
+        extract_frames(video, out, 20, "png", strategy="sequential", progress=progress, cancel=cancel,
+                       checkpoint=True)
+    params = {"count": 20, "fmt": "png", "mode": "uniform", "threshold": None}
+    ckpt = Checkpoint(checkpoint_path(out, "clip.extract"), "extract", params, input_fingerprint(video))
+    assert 0 < ckpt.resumed < 20
+
+    # 续抽：已完成的文件不重写
+    done_file = os.path.join(out, "clip_0001.png")
+    mtime = os.stat(done_file).st_mtime_ns
+    assert extract_frames(video, out, 20, "png", checkpoint=True) == 20
+    assert os.stat(done_file).st_mtime_ns == mtime
+    assert not os.path.exists(checkpoint_path(out, "clip.extract"))
+
+    names = sorted(os.listdir(reference))
+    assert sorted(os.listdir(out)) == names
+    match, mismatch, errors = filecmp.cmpfiles(reference, out, names, shallow=False)
+    assert not mismatch and not errors
+
+
+def test_extract_scenes_single_pass_matches_two_pass(scene_video, tmp_path, monkeypatch):
+    one = str(tmp_path / "one")
+    assert extract_frames(scene_video, one, 4, "png", mode="scenes") == 4
+    # 预算为 0 时走检测完再解码一遍的路径
+    monkeypatch.setattr(video, "SCENE_FRAME_BUDGET", 0)
+    two = str(tmp_path / "two")
+    assert extract_frames(scene_video, two, 4, "png", mode="scenes") == 4
+    names = sorted(os.listdir(one))
+    assert names == [f"shots_{i:04d}.png" for i in range(1, 5)]
+    match, mismatch, errors = filecmp.cmpfiles(one, two, names, shallow=False)
+    assert len(match) == 4 and not mismatch and not errors
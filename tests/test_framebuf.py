@@ -0,0 +1,80 @@
+import filecmp
+
+import cv2
+import numpy as np
+import pytest
+
+from media_engine.framebuf import FrameBuffers
+from media_engine.video import video_to_gif
+
+
+def _convert_all(path, buffers):
+    """逐帧 read + to_rgb，返回每帧结果的拷贝和原始数组本身"""
+    cap = cv2.VideoCapture(path)
+    copies, arrays = [], []
+    try:
+        while True:
+            frame = buffers.read(cap)
+            if frame is None:
+                break
+            rgb = buffers.to_rgb(frame)
+            copies.append(rgb.copy())
+            arrays.append(rgb)
+    finally:
+        cap.release()
+    return copies, arrays
+
+
+def _reference(path, scale):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            h, w = frame.shape[:2]
+            frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    finally:
+        cap.release()
+    return frames
+
+
+@pytest.mark.parametrize("reuse", [True, False])
+def test_frames_match_plain_conversion(video, reuse):
+    copies, _ = _convert_all(video, FrameBuffers(scale=0.5, reuse=reuse))
+    reference = _reference(video, 0.5)
+    assert len(copies) == len(reference) == 60
+    for got, want in zip(copies, reference):
+        assert got.shape == (32, 48, 3)
+        assert np.array_equal(got, want)
+
+
+def test_reused_buffers_allocate_once(video):
+    buffers = FrameBuffers(scale=0.5, depth=2)
+    _, arrays = _convert_all(video, buffers)
+    assert buffers.frames == 60
+    # 2 个解码缓冲 + 1 个缩放缓冲 + 2 个 RGB 缓冲，与帧数无关
+    assert buffers.allocations == 5
+    # 轮流使用：隔 depth 帧复用同一个数组
+    assert arrays[0] is arrays[2]
+    assert arrays[0] is not arrays[1]
+
+
+def test_full_scale_skips_resize_buffer(video):
+    buffers = FrameBuffers(scale=1.0)
+    _convert_all(video, buffers)
+    assert buffers.allocations == 4
+
+
+def test_without_reuse_allocates_every_frame(video):
+    buffers = FrameBuffers(scale=0.5, reuse=False)
+    _convert_all(video, buffers)
+    assert buffers.allocations == 60 * 3
+
+
+def test_video_to_gif_same_output_with_and_without_reuse(video, tmp_path):
+    reused = video_to_gif(video, str(tmp_path / "reuse"), fps=10, scale=0.5)
+    fresh = video_to_gif(video, str(tmp_path / "fresh"), fps=10, scale=0.5, reuse_buffers=False)
+    assert filecmp.cmp(reused, fresh, shallow=False)
@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+
+from conftest import gradient_frames
+from media_engine.common import MediaError
+from media_engine.gif import StreamingGifWriter, build_gif_palette
+
+
+def _frames(count):
+    return [Image.fromarray(f[:, :, ::-1]) for f in gradient_frames(count)]
+
+
+def _read_gif(path):
+    with Image.open(path) as im:
+        return [(frame.info["duration"], frame.convert("RGBA").copy()) for frame in ImageSequence.Iterator(im)]
+
+
+def _error(got, want, factor=1):
+    """平均每像素误差；factor > 1 时先按块取平均，衡量抖动后的局部颜色"""
+    got, want = got.convert("RGB").reduce(factor), want.convert("RGB").reduce(factor)
+    return np.abs(np.asarray(got, np.int16) - np.asarray(want, np.int16)).mean()
+
+
+def _write(path, frames, duration=80, **kwargs):
+    with StreamingGifWriter(path, duration, **kwargs) as writer:
+        for frame in frames:
+            writer.add_frame(frame)
+    return writer
+
+
+def test_gif_round_trip(tmp_path):
+    path = str(tmp_path / "out.gif")
+    frames = _frames(6)
+    with StreamingGifWriter(path, 80) as writer:
+        for frame in frames:
+            writer.add_frame(frame)
+    assert writer.frame_count == 6
+    assert not os.path.exists(path + ".part")
+
+    decoded = _read_gif(path)
+    assert [d for d, _ in decoded] == [80] * 6
+    for (_, got), want in zip(decoded, frames):
+        assert got.size == want.size
+        # 只有 256 色，允许一定的量化误差
+        assert _error(got, want) < 12
+
+
+def test_gif_resizes_to_first_frame(tmp_path):
+    path = str(tmp_path / "out.gif")
+    with StreamingGifWriter(path, 100) as writer:
+        writer.add_frame(Image.new("RGB", (40, 30), "red"))
+        writer.add_frame(Image.new("RGB", (80, 20), "blue"))
+    with Image.open(path) as im:
+        assert im.size == (40, 30)
+        assert im.n_frames == 2
+
+
+def test_gif_without_frames_leaves_nothing(tmp_path):
+    path = str(tmp_path / "empty.gif")
+    writer = StreamingGifWriter(path, 100)
+    with pytest.raises(MediaError):
+        writer.close()
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + ".part")
+
+
+def test_gif_error_inside_context_removes_part(tmp_path):
+    path = str(tmp_path / "out.gif")
+    with pytest.raises(RuntimeError):
+        with StreamingGifWriter(path, 100) as writer:
+            writer.add_frame(_frames(1)[0])
+            raise RuntimeError("中断")
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("palette", ["global", "per-frame"])
+def test_gif_delta_decodes_same_as_full_frames(tmp_path, palette):
+    frames = _frames(8)
+    decoded = {}
+    for delta in (True, False):
+        path = str(tmp_path / f"{delta}.gif")
+        writer = _write(path, frames, palette=palette, delta=delta, sample_frames=frames[::3])
+        assert writer.frame_count == writer.written_frames == 8
+        decoded[delta] = _read_gif(path)
+    assert [d for d, _ in decoded[True]] == [80] * 8
+    # 差分帧叠加到上一帧后与整帧写出的画面逐像素相同
+    for (_, a), (_, b) in zip(decoded[True], decoded[False]):
+        assert a.tobytes() == b.tobytes()
+    for (_, got), want in zip(decoded[True], frames):
+        assert _error(got, want) < 12
+
+
+def test_gif_global_palette_from_samples():
+    frames = _frames(4)
+    palette, colors = build_gif_palette(frames)
+    assert len(palette) == 256 * 3
+    assert 0 < colors <= 255
+
+
+def test_gif_delta_merges_identical_frames(tmp_path):
+    path = str(tmp_path / "out.gif")
+    a, b = _frames(2)
+    writer = _write(path, [a, a.copy(), a.copy(), b], duration=50)
+    assert writer.frame_count == 4
+    assert writer.written_frames == 2
+    assert [d for d, _ in _read_gif(path)] == [150, 50]
+
+
+def test_gif_delta_is_smaller_for_static_background(tmp_path):
+    base = np.asarray(_frames(1)[0]).copy()
+    frames = []
+    for i in range(10):
+        frame = base.copy()
+        frame[40:50, i * 6:i * 6 + 10] = (255, 0, 0)
+        frames.append(Image.fromarray(frame))
+    full = str(tmp_path / "full.gif")
+    delta = str(tmp_path / "delta.gif")
+    _write(full, frames, delta=False)
+    _write(delta, frames, delta=True)
+    assert os.path.getsize(delta) < os.path.getsize(full)
+    for (_, got), want in zip(_read_gif(delta), frames):
+        assert _error(got, want) < 6
+
+
+def test_gif_falls_back_to_local_palette_on_scene_change(tmp_path):
+    path = str(tmp_path / "out.gif")
+    gray = Image.new("RGB", (64, 48), (128, 128, 128))
+    ramp = np.zeros((48, 64, 3), np.uint8)
+    ramp[..., 0] = np.linspace(0, 255, 64, dtype=np.uint8)
+    ramp[..., 2] = 255
+    colorful = Image.fromarray(ramp)
+    writer = _write(path, [gray, colorful], palette="global")
+    assert writer.local_palette_frames == 1
+    assert _error(_read_gif(path)[1][1], colorful) < 6
+
+
+def test_gif_dither_keeps_local_color(tmp_path):
+    frames = _frames(4)
+    errors = {}
+    for dither in ("none", "ordered", "floyd"):
+        path = str(tmp_path / f"{dither}.gif")
+        writer = _write(path, frames, dither=dither)
+        assert writer.written_frames == 4
+        decoded = [im for _, im in _read_gif(path)]
+        errors[dither] = np.mean([_error(got, want, 4) for got, want in zip(decoded, frames)])
+    # 抖动牺牲单个像素的精度，换取 4x4 块平均颜色更接近原图
+    assert errors["ordered"] < errors["none"]
+    assert errors["floyd"] < errors["none"]
+
+
+def test_gif_keeps_source_transparency(tmp_path):
+    path = str(tmp_path / "out.gif")
+    im = Image.new("RGBA", (32, 32), (255, 0, 0, 255))
+    im.paste((0, 0, 0, 0), (0, 0, 16, 32))
+    _write(path, [im, im.transpose(Image.Transpose.FLIP_LEFT_RIGHT)])
+    decoded = _read_gif(path)
+    assert decoded[0][1].getpixel((4, 4))[3] == 0
+    assert decoded[0][1].getpixel((24, 4)) == (255, 0, 0, 255)
+    assert decoded[1][1].getpixel((4, 4)) == (255, 0, 0, 255)
+    assert decoded[1][1].getpixel((24, 4))[3] == 0
+
+
+def test_gif_rejects_unknown_modes(tmp_path):
+    with pytest.raises(ValueError):
+        StreamingGifWriter(str(tmp_path / "a.gif"), 100, palette="octree")
+    with pytest.raises(ValueError):
+        StreamingGifWriter(str(tmp_path / "b.gif"), 100, dither="random")
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,48 @@
+import numpy as np
+from PIL import Image
+
+from media_engine.images import gif_frame_size, load_frame
+
+
+def _save(path, array, orientation=None):
+    img = Image.fromarray(array)
+    if orientation is None:
+        img.save(path)
+    else:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        img.save(path, exif=exif)
+    return str(path)
+
+
+def _stripes(width, height):
+    array = np.zeros((height, width, 3), np.uint8)
+    array[:, : width // 2] = (255, 0, 0)
+    array[:, width // 2:] = (0, 0, 255)
+    return array
+
+
+def test_load_frame_applies_exif_orientation(tmp_path):
+    # 文件里是 40x20、左红右蓝；方向 6 表示显示时顺时针转 90 度：20x40、上红下蓝
+    path = _save(tmp_path / "rotated.png", _stripes(40, 20), orientation=6)
+    assert gif_frame_size(path) == (20, 40)
+    frame = np.asarray(load_frame(path, (20, 40)))
+    assert frame.shape == (40, 20, 4)
+    assert (frame[:20, :, :3] == (255, 0, 0)).all() and (frame[20:, :, :3] == (0, 0, 255)).all()
+    assert (frame[..., 3] == 255).all()
+
+
+def test_load_frame_keeps_aspect_on_transparent_canvas(tmp_path):
+    path = _save(tmp_path / "wide.png", _stripes(40, 20))
+    frame = np.asarray(load_frame(path, (20, 20)))
+    # 缩到 20x10，上下各留 5 行透明
+    assert frame.shape == (20, 20, 4)
+    assert (frame[:5, :, 3] == 0).all() and (frame[15:, :, 3] == 0).all()
+    assert (frame[5:15, :, 3] == 255).all()
+    assert (frame[5:15, :8, :3] == (255, 0, 0)).all() and (frame[5:15, 12:, :3] == (0, 0, 255)).all()
+
+
+def test_load_frame_same_aspect_fills_size(tmp_path):
+    path = _save(tmp_path / "big.png", _stripes(80, 40))
+    frame = np.asarray(load_frame(path, (40, 20)))
+    assert frame.shape == (20, 40, 4) and (frame[..., 3] == 255).all()
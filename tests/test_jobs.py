@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+
+from media_engine.common import Cancelled
+from media_engine.jobs import JobScheduler
+
+
+class FakeRunner:
+    """代替真实的视频操作：记录执行顺序，可以挡住、失败或等待取消"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.failures = {}      # 输入路径 -> 还要失败的次数
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def __call__(self, op, input_path, params, progress, cancel):
+        with self.lock:
+            self.calls.append((op, input_path))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            self.started.set()
+            if params.get("block"):
+                while not self.gate.wait(0.01):
+                    if cancel.is_set():
+                        raise Cancelled()
+            for done in range(1, 4):
+                progress(done, 3, f"处理中: {done}/3")
+            if self.failures.get(input_path, 0) > 0:
+                self.failures[input_path] -= 1
+                raise RuntimeError("解码失败")
+            return input_path
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def runner():
+    runner = FakeRunner()
+    yield runner
+    runner.gate.set()
+
+
+def _scheduler(runner, cpu_workers=1):
+    return JobScheduler(cpu_workers=cpu_workers, io_workers=1, runner=runner)
+
+
+def test_higher_priority_runs_first(runner):
+    scheduler = _scheduler(runner)
+    scheduler.submit("extract", "busy.mp4", output_dir="out", block=True)
+    assert runner.started.wait(5)
+    scheduler.submit("extract", "low.mp4", output_dir="out", priority=0)
+    scheduler.submit("extract", "high.mp4", output_dir="out", priority=5)
+    late = scheduler.submit("extract", "late.mp4", output_dir="out", priority=1)
+    assert scheduler.set_priority(late.id, 10)
+    runner.gate.set()
+    assert scheduler.wait(5)
+    scheduler.shutdown()
+    assert [path for _, path in runner.calls] == ["busy.mp4", "late.mp4", "high.mp4", "low.mp4"]
+    assert all(job.status == "done" and job.percent == 100.0 for job in scheduler.jobs.values())
+
+
+def test_cancel_queued_and_running(runner):
+    scheduler = _scheduler(runner)
+    running = scheduler.submit("extract", "busy.mp4", output_dir="out", block=True)
+    assert runner.started.wait(5)
+    queued = scheduler.submit("to-gif", "next.mp4", output_dir="out")
+    assert scheduler.cancel(queued.id)
+    assert queued.status == "cancelled"
+    assert scheduler.cancel(running.id)
+    assert scheduler.wait(5)
+    scheduler.shutdown()
+    assert running.status == "cancelled"
+    # 排队中被取消的任务不会再执行
+    assert runner.calls == [("extract", "busy.mp4")]
+    assert not scheduler.cancel(running.id)
+
+
+def test_automatic_retry(runner):
+    runner.failures["flaky.mp4"] = 1
+    scheduler = _scheduler(runner)
+    job = scheduler.submit("extract", "flaky.mp4", output_dir="out", max_retries=1)
+    assert scheduler.wait(5)
+    scheduler.shutdown()
+    assert job.status == "done"
+    assert job.attempts == 2
+    assert job.result == "flaky.mp4"
+    assert scheduler.stats()["counts"]["done"] == 1
+
+
+def test_failed_job_can_be_retried(runner):
+    runner.failures["bad.mp4"] = 1
+    scheduler = _scheduler(runner)
+    job = scheduler.submit("to-mp3", "bad.mp4", output_dir="out")
+    assert scheduler.wait(5)
+    assert job.status == "failed"
+    assert isinstance(job.error, RuntimeError)
+    assert scheduler.retry(job.id)
+    assert scheduler.wait(5)
+    scheduler.shutdown()
+    assert job.status == "done"
+    assert job.attempts == 2
+    assert not scheduler.retry(job.id)
+
+
+def test_same_output_never_runs_concurrently(runner):
+    scheduler = _scheduler(runner, cpu_workers=3)
+    for _ in range(3):
+        scheduler.submit("extract", "same.mp4", output_dir="out")
+    assert scheduler.wait(5)
+    scheduler.shutdown()
+    assert len(runner.calls) == 3
+    assert runner.max_active == 1
+
+
+def test_unknown_operation(runner):
+    scheduler = _scheduler(runner)
+    with pytest.raises(ValueError):
+        scheduler.submit("to-avi", "a.mp4", output_dir="out")
+    scheduler.shutdown()
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+import pytest
+
+from media_engine.common import MediaError
+from media_engine.scenes import detect_scenes, frame_histogram, histogram_distance, pick_scenes
+
+
+def _detect(path, **kwargs):
+    cap = cv2.VideoCapture(path)
+    try:
+        return detect_scenes(cap, **kwargs)
+    finally:
+        cap.release()
+
+
+def test_histogram_distance_range():
+    black = frame_histogram(np.zeros((32, 32, 3), np.uint8))
+    white = frame_histogram(np.full((32, 32, 3), 255, np.uint8))
+    assert histogram_distance(black, black) == 0
+    assert histogram_distance(black, white) == pytest.approx(1.0)
+
+
+def test_detect_scenes_finds_every_shot(scene_video):
+    cuts = _detect(scene_video, analysis_fps=25)
+    assert [idx for idx, _ in cuts] == [0, 25, 50, 75, 100, 125, 150, 175]
+    assert cuts[0][1] == 1.0
+
+
+def test_pick_scenes_keeps_first_and_strongest():
+    cuts = [(0, 1.0), (10, 0.4), (20, 0.9), (30, 0.5), (40, 0.9)]
+    assert pick_scenes(cuts, 3) == [0, 20, 40]
+    assert pick_scenes(cuts, 10) == [0, 10, 20, 30, 40]
+
+
+@pytest.mark.parametrize("keep", [1, 3, 8, 20])
+def test_detect_scenes_keep_returns_picked_frames(scene_video, keep):
+    cuts, frames = _detect(scene_video, analysis_fps=25, keep=keep)
+    assert sorted(frames) == pick_scenes(cuts, keep)
+    cap = cv2.VideoCapture(scene_video)
+    try:
+        for idx, frame in frames.items():
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            ok, expected = cap.read()
+            assert ok and np.array_equal(frame, expected)
+    finally:
+        cap.release()
+
+
+def test_detect_scenes_rejects_bad_threshold(scene_video):
+    with pytest.raises(MediaError):
+        _detect(scene_video, threshold=1.5)
@@ -0,0 +1,71 @@
+import subprocess
+
+from media_engine import segments
+from media_engine.segments import MIN_SEGMENT_FRAMES, plan_segments, probe_keyframes
+
+
+def _items(indices):
+    return list(enumerate(indices))
+
+
+def test_plan_segments_empty():
+    assert plan_segments([], 4) == []
+
+
+def test_plan_segments_keeps_every_item_in_order():
+    items = _items(range(0, 3000, 3))
+    plan = plan_segments(items, 4)
+    assert len(plan) == 4
+    assert [item for _, seg in plan for item in seg] == items
+    for start, seg in plan:
+        assert start <= seg[0][1]
+
+
+def test_plan_segments_short_video_single_segment():
+    # 跨度不到 MIN_SEGMENT_FRAMES：分段不划算
+    plan = plan_segments(_items(range(0, MIN_SEGMENT_FRAMES - 1, 10)), 8)
+    assert len(plan) == 1
+
+
+def test_plan_segments_snaps_to_keyframes():
+    keyframes = [0, 250, 500, 750, 1000, 1250]
+    items = _items(range(0, 1200, 4))
+    plan = plan_segments(items, 4, keyframes)
+    assert [start for start, _ in plan] == [0, 250, 500, 750]
+    assert [item for _, seg in plan for item in seg] == items
+    for k, (start, seg) in enumerate(plan):
+        end = plan[k + 1][0] if k + 1 < len(plan) else None
+        assert all(start <= idx and (end is None or idx < end) for _, idx in seg)
+
+
+def test_plan_segments_drops_empty_segments():
+    # 两个关键帧之间没有要取的帧
+    keyframes = [0, 600, 1200]
+    items = _items([0, 10, 20, 1200, 1210])
+    plan = plan_segments(items, 3, keyframes)
+    assert all(seg for _, seg in plan)
+    assert [item for _, seg in plan for item in seg] == items
+
+
+FFPROBE_CSV = """\
+packet,1.400000,K__
+packet,1.440000,___
+packet,1.480000,___
+packet,11.400000,K__
+packet,11.440000,___
+packet,21.400000,K_
+stream,1.400000
+"""
+
+
+def test_probe_keyframes_subtracts_start_time(monkeypatch):
+    monkeypatch.setattr(segments.shutil, "which", lambda name: "/usr/bin/" + name)
+    monkeypatch.setattr(segments.subprocess, "run",
+                        lambda cmd, **kw: subprocess.CompletedProcess(cmd, 0, FFPROBE_CSV, ""))
+    # TS 等文件的第一帧时间戳不是 0，帧号仍从 0 算起
+    assert probe_keyframes("clip.ts", 25) == [0, 250, 500]
+
+
+def test_probe_keyframes_without_ffprobe(monkeypatch):
+    monkeypatch.setattr(segments.shutil, "which", lambda name: None)
+    assert probe_keyframes("clip.ts", 25) is None
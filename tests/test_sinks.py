@@ -0,0 +1,153 @@
+import io
+import json
+import os
+import tarfile
+import threading
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from media_engine.common import Cancelled, MediaError
+from media_engine.sinks import NpySink, PackedReader, _shrink_npy, index_path, open_sink, packed_files
+from media_engine.video import extract_frames
+
+from conftest import gradient_frames
+
+
+def _write_all(sink, frames, fmt="png"):
+    names = []
+    with sink:
+        for i, frame in enumerate(frames):
+            name = f"clip_{i + 1:04d}.{fmt}"
+            sink.write(name, frame, {"index": i, "frame": i * 10})
+            names.append(name)
+    return names
+
+
+@pytest.mark.parametrize("kind", ["tar", "zip"])
+def test_archive_offsets_read_back(tmp_path, kind):
+    frames = gradient_frames(5)
+    names = _write_all(open_sink(kind, str(tmp_path), "clip_frames", "png"), frames)
+
+    reader = PackedReader(index_path(str(tmp_path), "clip_frames"))
+    assert reader.names() == names
+    for name, frame in zip(names, frames):
+        data = reader.read(name)
+        decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        assert np.array_equal(decoded, frame)
+
+    # 偏移处的字节与常规工具解包的结果相同
+    path = str(tmp_path / f"clip_frames.{kind}")
+    if kind == "tar":
+        with tarfile.open(path) as archive:
+            members = {name: archive.extractfile(name).read() for name in names}
+    else:
+        with zipfile.ZipFile(path) as archive:
+            members = {name: archive.read(name) for name in names}
+    assert all(members[name] == reader.read(name) for name in names)
+    assert packed_files(str(tmp_path), "clip_frames") == ["clip_frames.index.json", f"clip_frames.{kind}"]
+
+
+def test_aborted_archive_leaves_nothing(tmp_path):
+    with pytest.raises(RuntimeError):
+        with open_sink("tar", str(tmp_path), "clip_frames", "png") as sink:
+            sink.write("a.png", gradient_frames(1)[0])
+            raise RuntimeError("中断")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_npy_rows_by_index(tmp_path):
+    frames = gradient_frames(4)
+    sink = open_sink("npy", str(tmp_path), "clip_frames", "png", capacity=4)
+    with sink:
+        # 写入线程池里完成顺序不定
+        for i in (2, 0, 3, 1):
+            sink.write(f"clip_{i + 1:04d}.png", frames[i], {"index": i})
+    array = np.load(str(tmp_path / "clip_frames.npy"))
+    assert array.shape == (4, 64, 96, 3)
+    for i, frame in enumerate(frames):
+        assert np.array_equal(array[i], cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+def test_npy_truncated_when_fewer_rows(tmp_path):
+    frames = gradient_frames(3)
+    sink = NpySink(str(tmp_path), "clip_frames", capacity=10)
+    _write_all(sink, frames)
+
+    array = np.load(str(tmp_path / "clip_frames.npy"))
+    assert array.shape == (3, 64, 96, 3)
+    assert (tmp_path / "clip_frames.npy").stat().st_size == array.nbytes + _header_size(tmp_path / "clip_frames.npy")
+
+    reader = PackedReader(index_path(str(tmp_path), "clip_frames"))
+    assert np.array_equal(reader.read("clip_0002.png"), cv2.cvtColor(frames[1], cv2.COLOR_BGR2RGB))
+
+
+def _header_size(path):
+    with open(path, "rb") as f:
+        np.lib.format.read_magic(f)
+        np.lib.format.read_array_header_1_0(f)
+        return f.tell()
+
+
+def test_npy_shrink_moves_data_after_shorter_header(tmp_path):
+    # 头部比 numpy 自己写的长（例如旧版本写的文件）：重写后数据要前移
+    rows = np.arange(5 * 4 * 3, dtype=np.uint8).reshape(5, 4, 3)
+    text = repr({"descr": "|u1", "fortran_order": False, "shape": (1000, 4, 3)}).encode("latin1")
+    header = text + b" " * (256 - 10 - len(text) - 1) + b"\n"
+    path = str(tmp_path / "old.npy")
+    with open(path, "wb") as f:
+        f.write(b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header + rows.tobytes())
+
+    _shrink_npy(path, np.lib.format.header_data_from_array_1_0(rows[:3]))
+    assert _header_size(path) < 256
+    assert np.array_equal(np.load(path), rows[:3])
+    assert os.path.getsize(path) == _header_size(path) + rows[:3].nbytes
+
+
+def test_cancelled_npy_extract_leaves_nothing(video, tmp_path):
+    out = tmp_path / "out"
+    cancel = threading.Event()
+
+    def progress(done, total, message):
+        if done >= 5:
+            cancel.set()
+
+    with pytest.raises(Cancelled):
+        extract_frames(video, str(out), 20, "png", progress=progress, cancel=cancel, sink="npy")
+    assert os.listdir(out) == []
+
+
+def test_npy_rejects_mismatched_size(tmp_path):
+    sink = open_sink("npy", str(tmp_path), "clip_frames", "png", capacity=2)
+    sink.write("a", np.zeros((8, 8, 3), np.uint8), {"index": 0})
+    with pytest.raises(MediaError):
+        sink.write("b", np.zeros((8, 9, 3), np.uint8), {"index": 1})
+    sink.abort()
+
+
+def test_sprite_cells(tmp_path):
+    frames = gradient_frames(5)
+    names = _write_all(open_sink("sprite", str(tmp_path), "clip_frames", "png", capacity=5), frames)
+    reader = PackedReader(index_path(str(tmp_path), "clip_frames"))
+    index = json.loads((tmp_path / "clip_frames.index.json").read_text(encoding="utf-8"))
+    assert index["cell"] == [96, 64]
+    for name, frame in zip(names, frames):
+        cell = reader.read(name)
+        assert isinstance(cell, Image.Image) and cell.size == (96, 64)
+        assert np.array_equal(np.asarray(cell.convert("RGB")), cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+def test_open_sink_requires_capacity(tmp_path):
+    with pytest.raises(MediaError):
+        open_sink("npy", str(tmp_path), "x", "png")
+
+
+def test_pil_images_in_archive(tmp_path):
+    image = Image.new("RGB", (10, 6), (200, 10, 30))
+    with open_sink("zip", str(tmp_path), "tiles", "png") as sink:
+        sink.write("tile_0_0.png", image, {"row": 0, "col": 0})
+    data = PackedReader(index_path(str(tmp_path), "tiles")).read("tile_0_0.png")
+    assert Image.open(io.BytesIO(data)).getpixel((0, 0)) == (200, 10, 30)
@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from media_engine import tiles
+from media_engine.tiles import crop_grid, grid_boxes, open_tile_source, partial_decode_supported
+
+
+def test_grid_boxes_no_overlap():
+    boxes = grid_boxes(100, 60, 4, 3)
+    assert len(boxes) == 12
+    assert boxes[0] == (0, 0, (0, 0, 25, 20))
+    assert boxes[-1] == (2, 3, (75, 40, 100, 60))
+    # 行优先
+    assert [(r, c) for r, c, _ in boxes[:5]] == [(0, 0), (0, 1), (0, 2), (0, 3), (1, 0)]
+
+
+def test_grid_boxes_drops_remainder():
+    # 103 // 4 = 25：右边多出的 3 像素舍弃（与原有行为一致）
+    boxes = grid_boxes(103, 61, 4, 3)
+    assert max(box[2] for _, _, box in boxes) == 100
+    assert max(box[3] for _, _, box in boxes) == 60
+
+
+def test_grid_boxes_overlap_clipped_to_image():
+    boxes = {(r, c): box for r, c, box in grid_boxes(100, 60, 4, 3, overlap=5)}
+    assert boxes[0, 0] == (0, 0, 30, 25)
+    assert boxes[1, 1] == (20, 15, 55, 45)
+    assert boxes[2, 3] == (70, 35, 100, 60)
+
+
+@pytest.mark.parametrize("overlap", [0, 3, 50])
+def test_grid_boxes_cover_grid(overlap):
+    for _, _, (left, top, right, bottom) in grid_boxes(120, 90, 3, 3, overlap):
+        assert 0 <= left < right <= 120
+        assert 0 <= top < bottom <= 90
+
+
+def _sample_image(mode, width=150, height=97):
+    ys, xs = np.mgrid[0:height, 0:width]
+    rgb = np.stack([xs * 255 // width, ys * 255 // height, (xs + ys) % 256], axis=-1).astype(np.uint8)
+    im = Image.fromarray(rgb, "RGB")
+    if mode == "P":
+        return im.quantize(64)
+    if mode == "RGBA":
+        im.putalpha(Image.fromarray(((xs * 7 + ys) % 256).astype(np.uint8)))
+        return im
+    return im.convert(mode)
+
+
+# (文件名, 模式, 预期的读取方式)
+SOURCES = [
+    ("bottom_up.bmp", "RGB", "band"),
+    ("raw.tif", "RGB", "band"),
+    ("gray.tif", "L", "band"),
+    ("photo.png", "RGB", "mmap"),
+    ("alpha.png", "RGBA", "mmap"),
+    ("palette.png", "P", "mmap"),
+    ("gray.png", "L", "mmap"),
+    ("photo.jpg", "RGB", "mmap"),
+    ("deep.png", "I;16", "full"),
+]
+
+
+def _check_crop_grid(tmp_path, filename, mode, kind, overlap):
+    src = str(tmp_path / filename)
+    _sample_image(mode).save(src)
+    source = open_tile_source(src, str(tmp_path))
+    assert source.kind == kind
+    source.close()
+
+    out = str(tmp_path / "tiles")
+    count, cell_w, cell_h = crop_grid(src, out, 4, 3, "png", overlap=overlap, workers=2, tmp_dir=str(tmp_path))
+    assert (count, cell_w, cell_h) == (12, 37, 32)
+    # 内存映射的临时文件用完即删
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".raw")]
+
+    stem = os.path.splitext(filename)[0]
+    with Image.open(src) as full:
+        full.load()
+        for row, col, box in grid_boxes(*full.size, 4, 3, overlap):
+            with Image.open(os.path.join(out, f"{stem}_{row + 1:02d}_{col + 1:02d}.png")) as tile:
+                want = full.crop(box)
+                assert tile.mode == want.mode
+                assert tile.size == want.size
+                if mode == "P":
+                    tile, want = tile.convert("RGB"), want.convert("RGB")
+                assert tile.tobytes() == want.tobytes()
+
+
+@pytest.mark.parametrize("filename, mode, kind", SOURCES)
+@pytest.mark.parametrize("overlap", [0, 4])
+def test_crop_grid_matches_plain_crop(tmp_path, filename, mode, kind, overlap):
+    assert partial_decode_supported()
+    _check_crop_grid(tmp_path, filename, mode, kind, overlap)
+
+
+@pytest.mark.parametrize("filename, mode, kind", SOURCES)
+def test_crop_grid_without_pillow_internals(tmp_path, monkeypatch, filename, mode, kind):
+    # 自检不通过：所有图片整幅解码后 Image.crop
+    monkeypatch.setattr(tiles, "_internals_ok", False)
+    _check_crop_grid(tmp_path, filename, mode, "full", 4)
+
+
+def test_self_check_fails_without_map_buffer(monkeypatch):
+    monkeypatch.setattr(tiles, "_internals_ok", None)
+    monkeypatch.delattr(tiles.Image.core, "map_buffer")
+    assert not partial_decode_supported()
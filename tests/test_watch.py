@@ -0,0 +1,97 @@
+import os
+import shutil
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import gradient_frames, write_video
+from media_engine.common import IMAGE_EXTS, MediaError
+from media_engine.jobs import JobScheduler
+from media_engine.watch import FolderWatcher, WatchRule, default_rules
+
+
+@pytest.fixture
+def inbox(tmp_path):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    write_video(str(inbox / "clip.avi"), gradient_frames(30))
+    for i in range(2):
+        Image.fromarray(gradient_frames(1)[0]).save(str(inbox / f"photo_{i}.bmp"))
+    (inbox / "broken.mp4").write_bytes(b"not a video" * 100)
+    (inbox / "broken.png").write_bytes(b"not an image")
+    (inbox / "notes.txt").write_text("跳过")
+    (inbox / ".upload.part").write_bytes(b"")
+    return inbox
+
+
+def _watch(inbox, out, settle=0.0, poll=True):
+    events = []
+    scheduler = JobScheduler(cpu_workers=2, io_workers=1)
+    rules = default_rules(str(out), video_ops=("extract",), image_format="png", count=5)
+    watcher = FolderWatcher([str(inbox)], rules, scheduler, settle=settle, interval=0.05, poll=poll,
+                            on_file=lambda path, status, message: events.append((os.path.basename(path), status)))
+    try:
+        watcher.run(once=True)
+    finally:
+        scheduler.shutdown()
+    return watcher, events
+
+
+@pytest.mark.parametrize("poll", [True, False])
+def test_run_once_routes_done_and_failed(inbox, tmp_path, poll):
+    out = tmp_path / "out"
+    watcher, events = _watch(inbox, out, poll=poll)
+
+    assert sorted(os.listdir(inbox / "done")) == ["clip.avi", "photo_0.bmp", "photo_1.bmp"]
+    assert sorted(os.listdir(inbox / "failed")) == ["broken.mp4", "broken.png"]
+    # 没有规则的文件和隐藏文件留在原处
+    assert sorted(f for f in os.listdir(inbox) if os.path.isfile(inbox / f)) == [".upload.part", "notes.txt"]
+    assert ("notes.txt", "skipped") in events
+    assert not [name for name, _ in events if name.startswith(".")]
+
+    assert sorted(os.listdir(out / "png")) == ["photo_0.png", "photo_1.png"]
+    assert len([f for f in os.listdir(out / "frames") if f.endswith(".jpg")]) == 5
+    assert watcher.stats()["done"] == 3
+    assert watcher.stats()["failed"] == 2
+    assert watcher.idle
+
+
+def test_converted_image_matches_input(inbox, tmp_path):
+    out = tmp_path / "out"
+    _watch(inbox, out)
+    with Image.open(out / "png" / "photo_0.png") as got, Image.open(inbox / "done" / "photo_0.bmp") as want:
+        assert np.array_equal(np.asarray(got), np.asarray(want))
+
+
+def test_waits_for_settle_time(tmp_path):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    Image.new("RGB", (8, 8), "red").save(str(inbox / "fresh.png"))
+    start = time.time()
+    _, events = _watch(inbox, tmp_path / "out", settle=0.3)
+    # 刚写完的文件要保持不变 settle 秒才处理
+    assert time.time() - start >= 0.25
+    assert events == [("fresh.png", "ready"), ("fresh.png", "done")]
+
+
+def test_same_name_goes_to_unique_target(inbox, tmp_path):
+    out = tmp_path / "out"
+    _watch(inbox, out)
+    shutil.copy(str(inbox / "done" / "photo_0.bmp"), str(inbox / "photo_0.bmp"))
+    _watch(inbox, out)
+    assert "photo_0_1.bmp" in os.listdir(inbox / "done")
+
+
+def test_rejects_bad_directories(tmp_path):
+    scheduler = JobScheduler(cpu_workers=1, io_workers=1)
+    try:
+        # 输出写回监视目录会被当成新文件再处理
+        rules = [WatchRule(IMAGE_EXTS, [("convert", {"output_dir": str(tmp_path), "fmt": "png"})])]
+        with pytest.raises(MediaError):
+            FolderWatcher([str(tmp_path)], rules, scheduler)
+        with pytest.raises(MediaError):
+            FolderWatcher([str(tmp_path / "missing")], default_rules(str(tmp_path / "out")), scheduler)
+    finally:
+        scheduler.shutdown()
@@ -3,16 +3,29 @@
 全能媒体工具箱
 - 视频抽帧、MP4转MP3、MP4转GIF
 - 图片格式转换、网格裁剪、合成GIF
+
+界面只负责收集参数和展示结果，处理逻辑都在 media_engine 中；
+带参数运行时等同于命令行：python 多媒体处理工具.py extract video.mp4 -o frames
 """
 
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from PIL import Image
-import cv2
+import io
+import sys
 import os
 import threading
-import subprocess
-import shutil
+
+from media_engine import (
+    ANIMATION_EXTS, ANIMATION_FORMATS, ENCODE_PRESETS, GIF_BACKENDS, GIF_PALETTE_MODES, GIF_DITHER_MODES, OUTPUT_SINKS, TILE_SINKS, Cancelled, MediaError,
+    default_writer_count,
+)
+from media_engine.common import format_progress, resolve_time_range
+
+# 带参数运行时直接走命令行，不加载 tkinter
+if __name__ == "__main__" and len(sys.argv) > 1:
+    from media_engine.cli import main
+    sys.exit(main())
+
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
 
 
 class MediaToolbox:
@@ -34,6 +47,43 @@ class MediaToolbox:
         self.create_image_convert_tab()    # 图片格式转换
         self.create_grid_crop_tab()        # 网格裁剪
         self.create_gif_maker_tab()        # 图片合成GIF
+        self.create_job_queue_tab()        # 任务队列
+
+        # 工作线程不直接操作界面：进度和结果都发到事件总线，由主线程定时取出
+        from media_engine.events import EventBus, log_handler
+
+        self.events = EventBus()
+        self.events.subscribe(self.on_event)
+        self.events.subscribe(log_handler())
+        self.pump_events()
+        self.refresh_jobs()
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        # 先让正在运行的任务在帧 / 文件之间停下并写好断点清单，再关窗口
+        self.img_convert_cancel.set()
+        if self.img_convert_thread is not None:
+            self.img_convert_thread.join()
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=True, cancel_pending=True)
+        self.window.destroy()
+
+    def pump_events(self):
+        from media_engine.events import DEFAULT_RATE
+
+        self.events.dispatch()
+        self.window.after(1000 // DEFAULT_RATE, self.pump_events)
+
+    def on_event(self, event):
+        handler = {"convert": self.on_convert_event, "estimate": self.on_estimate_event,
+                   "crop": self.on_crop_event, "gif": self.on_gif_event}.get(event.source)
+        if handler is not None:
+            handler(event)
+
+    def show_message(self, kind, title, message):
+        # 弹窗会进入嵌套事件循环，推迟到 dispatch 之外再弹，避免事件重入
+        show = {"info": messagebox.showinfo, "warning": messagebox.showwarning, "error": messagebox.showerror}[kind]
+        self.window.after_idle(show, title, message)
 
     # ================== 视频抽帧 ==================
     def create_frame_extract_tab(self):
@@ -43,7 +93,7 @@ class MediaToolbox:
         ttk.Label(tab, text="视频文件:").grid(row=0, column=0, sticky="w", pady=5)
         self.extract_video_path = tk.StringVar()
         ttk.Entry(tab, textvariable=self.extract_video_path, width=45).grid(row=0, column=1, pady=5)
-        ttk.Button(tab, text="浏览", command=lambda: self.browse_file(
+        ttk.Button(tab, text="浏览", command=lambda: self.browse_files(
             self.extract_video_path, [("视频文件", "*.mp4 *.avi *.mkv *.mov *.wmv")]
         )).grid(row=0, column=2, padx=5, pady=5)
 
@@ -62,20 +112,63 @@ class MediaToolbox:
         format_frame.grid(row=3, column=1, sticky="w", pady=5)
         for fmt in ["jpg", "png", "jpeg"]:
             ttk.Radiobutton(format_frame, text=fmt.upper(), variable=self.extract_format, value=fmt).pack(side="left", padx=10)
+        # 帧数多时打包成一个 tar/zip/npy 或拼成缩略图大图，附带索引
+        ttk.Label(format_frame, text="输出为:").pack(side="left", padx=(10, 5))
+        self.extract_sink = tk.StringVar(value="files")
+        ttk.Combobox(format_frame, textvariable=self.extract_sink, values=OUTPUT_SINKS,
+                     state="readonly", width=8).pack(side="left")
+
+        # 关键帧、镜头两种方式下“抽取数量”是上限
+        ttk.Label(tab, text="抽帧方式:").grid(row=4, column=0, sticky="w", pady=5)
+        self.extract_mode = tk.StringVar(value="uniform")
+        mode_frame = ttk.Frame(tab)
+        mode_frame.grid(row=4, column=1, columnspan=2, sticky="w", pady=5)
+        for value, text in [("uniform", "均匀"), ("keyframes", "仅关键帧"), ("scenes", "镜头切换")]:
+            ttk.Radiobutton(mode_frame, text=text, variable=self.extract_mode, value=value).pack(side="left", padx=10)
+        ttk.Label(mode_frame, text="阈值:").pack(side="left", padx=(10, 5))
+        self.extract_threshold = tk.StringVar(value="0.35")
+        ttk.Entry(mode_frame, textvariable=self.extract_threshold, width=6).pack(side="left")
+
+        ttk.Label(tab, text="抽帧策略:").grid(row=5, column=0, sticky="w", pady=5)
+        self.extract_strategy = tk.StringVar(value="auto")
+        strategy_frame = ttk.Frame(tab)
+        strategy_frame.grid(row=5, column=1, sticky="w", pady=5)
+        for value, text in [("auto", "自动"), ("sequential", "顺序解码"), ("seek", "逐帧定位")]:
+            ttk.Radiobutton(strategy_frame, text=text, variable=self.extract_strategy, value=value).pack(side="left", padx=10)
+
+        ttk.Label(tab, text="写入线程:").grid(row=6, column=0, sticky="w", pady=5)
+        writers_frame = ttk.Frame(tab)
+        writers_frame.grid(row=6, column=1, columnspan=2, sticky="w", pady=5)
+        self.extract_writers = tk.StringVar(value=str(default_writer_count()))
+        ttk.Entry(writers_frame, textvariable=self.extract_writers, width=10).pack(side="left")
+        # 按关键帧把视频切成几段，在多个进程里并行解码（1 为不分段）
+        ttk.Label(writers_frame, text="分段进程:").pack(side="left", padx=(15, 5))
+        self.extract_segments = tk.StringVar(value="1")
+        ttk.Entry(writers_frame, textvariable=self.extract_segments, width=6).pack(side="left")
+
+        # 静态画面（录屏、幻灯片）去掉几乎一样的帧，只写出有变化的
+        ttk.Label(tab, text="相似帧:").grid(row=7, column=0, sticky="w", pady=5)
+        dedup_frame = ttk.Frame(tab)
+        dedup_frame.grid(row=7, column=1, columnspan=2, sticky="w", pady=5)
+        self.extract_dedup = tk.BooleanVar(value=False)
+        ttk.Checkbutton(dedup_frame, text="去除", variable=self.extract_dedup).pack(side="left", padx=10)
+        ttk.Label(dedup_frame, text="差异位数 ≤").pack(side="left", padx=(10, 5))
+        self.extract_dedup_threshold = tk.StringVar(value="5")
+        ttk.Entry(dedup_frame, textvariable=self.extract_dedup_threshold, width=6).pack(side="left")
 
         self.extract_progress = ttk.Progressbar(tab, length=400, mode="determinate")
-        self.extract_progress.grid(row=4, column=0, columnspan=3, pady=15)
+        self.extract_progress.grid(row=8, column=0, columnspan=3, pady=15)
 
         self.extract_status = tk.StringVar(value="就绪")
-        ttk.Label(tab, textvariable=self.extract_status).grid(row=5, column=0, columnspan=3)
+        ttk.Label(tab, textvariable=self.extract_status).grid(row=9, column=0, columnspan=3)
 
-        ttk.Button(tab, text="开始抽帧", command=self.start_extract_frames).grid(row=6, column=0, columnspan=3, pady=15)
+        ttk.Button(tab, text="开始抽帧", command=self.start_extract_frames).grid(row=10, column=0, columnspan=3, pady=15)
 
     def start_extract_frames(self):
-        video_path = self.extract_video_path.get().strip()
+        video_paths = self.split_paths(self.extract_video_path.get())
         output_dir = self.extract_output_dir.get().strip()
 
-        if not video_path or not os.path.exists(video_path):
+        if not video_paths or not all(os.path.exists(p) for p in video_paths):
             messagebox.showerror("错误", "请选择有效的视频文件")
             return
         if not output_dir:
@@ -90,42 +183,47 @@ class MediaToolbox:
             messagebox.showerror("错误", "请输入有效的抽帧数量")
             return
 
-        os.makedirs(output_dir, exist_ok=True)
-        threading.Thread(target=self.extract_frames_thread, args=(video_path, output_dir, count), daemon=True).start()
+        try:
+            writers = int(self.extract_writers.get())
+            if writers <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "请输入有效的写入线程数")
+            return
+
+        segments = self.parse_segments(self.extract_segments)
+        if segments is None:
+            return
 
-    def extract_frames_thread(self, video_path, output_dir, count):
         try:
-            cap = cv2.VideoCapture(video_path)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-            if total_frames <= 0:
-                raise Exception("无法读取视频帧数，请确认视频文件是否损坏或编码不受支持")
-
-            if count > total_frames:
-                count = total_frames
-
-            indices = [int(i * total_frames / count) for i in range(count)]
-            fmt = self.extract_format.get().strip().lower()
-            video_name = os.path.splitext(os.path.basename(video_path))[0]
-
-            for i, frame_idx in enumerate(indices):
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-                ret, frame = cap.read()
-                if ret:
-                    output_path = os.path.join(output_dir, f"{video_name}_{i+1:04d}.{fmt}")
-                    cv2.imwrite(output_path, frame)
-
-                progress = (i + 1) / count * 100
-                self.extract_progress["value"] = progress
-                self.extract_status.set(f"处理中: {i+1}/{count}")
-                self.window.update_idletasks()
-
-            cap.release()
-            self.extract_status.set("完成!")
-            messagebox.showinfo("完成", f"成功抽取 {count} 帧到：\n{output_dir}")
-        except Exception as e:
-            self.extract_status.set("出错了")
-            messagebox.showerror("错误", str(e))
+            threshold = float(self.extract_threshold.get())
+            if not 0 < threshold < 1:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "镜头切换阈值必须在 0 到 1 之间")
+            return
+
+        try:
+            dedup_threshold = int(self.extract_dedup_threshold.get())
+            if not 0 <= dedup_threshold <= 64:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "去重阈值必须是 0 到 64 的整数")
+            return
+
+        fmt = self.extract_format.get().strip().lower()
+        strategy = self.extract_strategy.get().strip().lower()
+        mode = self.extract_mode.get()
+        dedup = "dhash" if self.extract_dedup.get() else None
+        scheduler = self.get_scheduler()
+        jobs = [
+            scheduler.submit("extract", path, output_dir=output_dir, count=count, fmt=fmt,
+                             strategy=strategy, writers=writers, mode=mode, threshold=threshold,
+                             dedup=dedup, dedup_threshold=dedup_threshold, checkpoint=True, segments=segments,
+                             sink=self.extract_sink.get())
+            for path in video_paths
+        ]
+        self.track_batch("extract", jobs)
 
     # ================== 视频转换 ==================
     def create_video_convert_tab(self):
@@ -135,7 +233,7 @@ class MediaToolbox:
         ttk.Label(tab, text="视频文件:").grid(row=0, column=0, sticky="w", pady=5)
         self.convert_video_path = tk.StringVar()
         ttk.Entry(tab, textvariable=self.convert_video_path, width=45).grid(row=0, column=1, pady=5)
-        ttk.Button(tab, text="浏览", command=lambda: self.browse_file(
+        ttk.Button(tab, text="浏览", command=lambda: self.browse_files(
             self.convert_video_path, [("视频文件", "*.mp4 *.avi *.mkv *.mov *.wmv")]
         )).grid(row=0, column=2, padx=5, pady=5)
 
@@ -149,7 +247,10 @@ class MediaToolbox:
         type_frame = ttk.Frame(tab)
         type_frame.grid(row=2, column=1, sticky="w", pady=5)
         ttk.Radiobutton(type_frame, text="MP3 (提取音频)", variable=self.convert_type, value="mp3").pack(anchor="w")
-        ttk.Radiobutton(type_frame, text="GIF (转动图)", variable=self.convert_type, value="gif").pack(anchor="w")
+        ttk.Radiobutton(type_frame, text="音频 (保持原编码，M4A/MP3 等直接复制)", variable=self.convert_type,
+                        value="audio").pack(anchor="w")
+        ttk.Radiobutton(type_frame, text="GIF / WebP / APNG (转动图，格式在下方选择)", variable=self.convert_type,
+                        value="gif").pack(anchor="w")
 
         gif_frame = ttk.LabelFrame(tab, text="GIF设置", padding=10)
         gif_frame.grid(row=3, column=0, columnspan=3, sticky="ew", pady=10)
@@ -162,7 +263,27 @@ class MediaToolbox:
         self.gif_scale = tk.StringVar(value="0.5")
         ttk.Entry(gif_frame, textvariable=self.gif_scale, width=8).grid(row=0, column=3, padx=5)
 
-        self.convert_progress = ttk.Progressbar(tab, length=400, mode="indeterminate")
+        self.convert_gif_options = self.create_gif_options(gif_frame)
+        self.convert_gif_options["frame"].grid(row=1, column=0, columnspan=4, sticky="w", pady=(8, 0))
+
+        # 只转换一段：开始/结束留空表示从头/到结尾，可填秒数或 mm:ss
+        clip_frame = ttk.Frame(gif_frame)
+        clip_frame.grid(row=2, column=0, columnspan=4, sticky="w", pady=(8, 0))
+        ttk.Label(clip_frame, text="开始:").pack(side="left", padx=5)
+        self.gif_start = tk.StringVar()
+        ttk.Entry(clip_frame, textvariable=self.gif_start, width=9).pack(side="left")
+        ttk.Label(clip_frame, text="结束:").pack(side="left", padx=5)
+        self.gif_end = tk.StringVar()
+        ttk.Entry(clip_frame, textvariable=self.gif_end, width=9).pack(side="left")
+        ttk.Label(clip_frame, text="方式:").pack(side="left", padx=(15, 5))
+        self.gif_backend = tk.StringVar(value="opencv")
+        ttk.Combobox(clip_frame, textvariable=self.gif_backend, values=GIF_BACKENDS,
+                     width=8, state="readonly").pack(side="left")
+        ttk.Label(clip_frame, text="分段进程:").pack(side="left", padx=(15, 5))
+        self.gif_segments = tk.StringVar(value="1")
+        ttk.Entry(clip_frame, textvariable=self.gif_segments, width=4).pack(side="left")
+
+        self.convert_progress = ttk.Progressbar(tab, length=400, mode="determinate")
         self.convert_progress.grid(row=4, column=0, columnspan=3, pady=15)
 
         self.convert_status = tk.StringVar(value="就绪")
@@ -170,131 +291,70 @@ class MediaToolbox:
 
         ttk.Button(tab, text="开始转换", command=self.start_video_convert).grid(row=6, column=0, columnspan=3, pady=15)
 
+    def parse_segments(self, var):
+        """分段进程数：0 为 CPU 核数；无效时弹窗并返回 None"""
+        try:
+            segments = int(var.get())
+            if segments < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "分段进程数必须是非负整数（0 为 CPU 核数）")
+            return None
+        return segments or os.cpu_count() or 1
+
     def start_video_convert(self):
-        video_path = self.convert_video_path.get().strip()
+        video_paths = self.split_paths(self.convert_video_path.get())
         output_dir = self.convert_output_dir.get().strip()
 
-        if not video_path or not os.path.exists(video_path):
+        if not video_paths or not all(os.path.exists(p) for p in video_paths):
             messagebox.showerror("错误", "请选择有效的视频文件")
             return
         if not output_dir:
             messagebox.showerror("错误", "请选择输出目录")
             return
 
-        os.makedirs(output_dir, exist_ok=True)
-        self.convert_progress.start()
-        threading.Thread(target=self.video_convert_thread, args=(video_path, output_dir), daemon=True).start()
-
-    def video_convert_thread(self, video_path, output_dir):
-        try:
-            video_name = os.path.splitext(os.path.basename(video_path))[0]
-            convert_type = self.convert_type.get().strip().lower()
-
-            if convert_type == "mp3":
-                output_path = os.path.join(output_dir, f"{video_name}.mp3")
-                self.convert_status.set("正在提取音频...")
-
-                # 优先 moviepy，失败再 ffmpeg
-                try:
-                    from moviepy.editor import VideoFileClip
-                    video = VideoFileClip(video_path)
-                    if video.audio is None:
-                        video.close()
-                        raise Exception("该视频没有音轨，无法导出 MP3")
-                    video.audio.write_audiofile(output_path)
-                    video.close()
-                except ImportError:
-                    if shutil.which("ffmpeg"):
-                        cmd = [
-                            "ffmpeg", "-y",
-                            "-i", video_path,
-                            "-vn",
-                            "-acodec", "libmp3lame",
-                            "-q:a", "2",
-                            output_path
-                        ]
-                        p = subprocess.run(cmd, capture_output=True, text=True)
-                        if p.returncode != 0:
-                            raise Exception(p.stderr.strip() or "ffmpeg 转换失败")
-                    else:
-                        raise Exception("请安装 moviepy: pip install moviepy  或者安装 ffmpeg 并加入 PATH")
-
-            elif convert_type == "gif":
-                output_path = os.path.join(output_dir, f"{video_name}.gif")
-                self.convert_status.set("正在转换为GIF...")
-
-                try:
-                    fps = int(self.gif_fps.get())
-                    if fps <= 0:
-                        raise ValueError
-                except ValueError:
-                    raise Exception("FPS 必须是正整数")
-
-                try:
-                    scale = float(self.gif_scale.get())
-                    if scale <= 0:
-                        raise ValueError
-                except ValueError:
-                    raise Exception("缩放比例必须是大于 0 的数字（例如 0.5）")
-
-                cap = cv2.VideoCapture(video_path)
-                if not cap.isOpened():
-                    raise Exception("无法打开视频文件")
-
-                original_fps = cap.get(cv2.CAP_PROP_FPS)
-                if original_fps is None or original_fps <= 0:
-                    original_fps = fps  # 取不到就用目标 fps 兜底
-
-                step = max(1, int(round(original_fps / fps)))
-
-                frames = []
-                idx = 0
-                while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-
-                    # 按步长采样，避免全部读入
-                    if idx % step != 0:
-                        idx += 1
-                        continue
-                    idx += 1
-
-                    if scale != 1.0:
-                        h, w = frame.shape[:2]
-                        new_w = max(1, int(w * scale))
-                        new_h = max(1, int(h * scale))
-                        frame = cv2.resize(frame, (new_w, new_h))
-
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    frames.append(Image.fromarray(frame_rgb))
-
-                cap.release()
-
-                if not frames:
-                    raise Exception("没有读取到任何帧，无法生成 GIF")
-
-                duration_ms = max(1, int(1000 / fps))
-                frames[0].save(
-                    output_path,
-                    save_all=True,
-                    append_images=frames[1:],
-                    duration=duration_ms,
-                    loop=0,
-                    format="GIF"
-                )
-
-            else:
-                raise Exception("未知转换类型")
-
-            self.convert_progress.stop()
-            self.convert_status.set("完成!")
-            messagebox.showinfo("完成", f"转换完成:\n{output_path}")
+        convert_type = self.convert_type.get().strip().lower()
+        params = {"output_dir": output_dir}
+        if convert_type == "mp3":
+            op = "to-mp3"
+        elif convert_type == "audio":
+            op = "to-audio"
+            params["audio_format"] = "auto"
+        elif convert_type == "gif":
+            op = "to-gif"
+            try:
+                params["fps"] = int(self.gif_fps.get())
+                if params["fps"] <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "FPS 必须是正整数")
+                return
+
+            try:
+                params["scale"] = float(self.gif_scale.get())
+                if params["scale"] <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "缩放比例必须是大于 0 的数字（例如 0.5）")
+                return
+
+            try:
+                params["start"], params["end"] = resolve_time_range(self.gif_start.get(), self.gif_end.get())
+            except MediaError as e:
+                messagebox.showerror("错误", str(e))
+                return
+            params["backend"] = self.gif_backend.get()
+            params["segments"] = self.parse_segments(self.gif_segments)
+            if params["segments"] is None:
+                return
+            params.update(self.get_gif_options(self.convert_gif_options))
+        else:
+            messagebox.showerror("错误", "未知转换类型")
+            return
 
-        except Exception as e:
-            self.convert_progress.stop()
-            self.convert_status.set("出错了")
-            messagebox.showerror("错误", str(e))
+        scheduler = self.get_scheduler()
+        jobs = [scheduler.submit(op, path, **params) for path in video_paths]
+        self.track_batch("convert", jobs)
 
     # ================== 图片格式转换 ==================
     def create_image_convert_tab(self):
@@ -333,7 +393,32 @@ class MediaToolbox:
         for fmt in ["png", "jpg", "jpeg", "bmp", "webp"]:
             ttk.Radiobutton(fmt_frame, text=fmt.upper(), variable=self.img_output_format, value=fmt).pack(side="left", padx=8)
 
-        ttk.Button(tab, text="开始转换", command=self.convert_images).pack(pady=15)
+        preset_frame = ttk.Frame(tab)
+        preset_frame.pack(fill="x", pady=5)
+        ttk.Label(preset_frame, text="编码预设:").pack(side="left")
+        self.img_preset = tk.StringVar(value="balanced")
+        ttk.Combobox(preset_frame, textvariable=self.img_preset, values=ENCODE_PRESETS,
+                     state="readonly", width=10).pack(side="left", padx=5)
+        ttk.Label(preset_frame, text="fast 最快 / smallest 最小，画质相同").pack(side="left", padx=5)
+        self.img_estimate_button = ttk.Button(preset_frame, text="预估", command=self.estimate_images)
+        self.img_estimate_button.pack(side="left", padx=5)
+
+        self.img_convert_progress = ttk.Progressbar(tab, length=400, mode="determinate")
+        self.img_convert_progress.pack(pady=(10, 0))
+
+        self.img_convert_status = tk.StringVar(value="就绪")
+        ttk.Label(tab, textvariable=self.img_convert_status).pack()
+
+        action_frame = ttk.Frame(tab)
+        action_frame.pack(pady=10)
+        self.img_convert_button = ttk.Button(action_frame, text="开始转换", command=self.convert_images)
+        self.img_convert_button.pack(side="left", padx=5)
+        # 取消后已转换的记在输出目录的断点清单里，再点开始转换会接着做
+        self.img_convert_cancel = threading.Event()
+        self.img_convert_thread = None
+        self.img_cancel_button = ttk.Button(action_frame, text="取消", state="disabled",
+                                            command=self.img_convert_cancel.set)
+        self.img_cancel_button.pack(side="left", padx=5)
 
     def add_images(self):
         files = filedialog.askopenfilenames(filetypes=[("图片文件", "*.png *.jpg *.jpeg *.bmp *.webp *.gif")])
@@ -356,22 +441,88 @@ class MediaToolbox:
             messagebox.showerror("错误", "请选择输出目录")
             return
 
-        os.makedirs(output_dir, exist_ok=True)
         fmt = self.img_output_format.get().strip().lower()
-
+        self.img_convert_button.configure(state="disabled")
+        self.img_cancel_button.configure(state="normal")
+        self.img_convert_cancel.clear()
+        self.img_convert_thread = threading.Thread(target=self.convert_images_thread,
+                                                   args=(list(self.image_files), output_dir, fmt,
+                                                         self.img_preset.get()), daemon=True)
+        self.img_convert_thread.start()
+
+    def convert_images_thread(self, image_files, output_dir, fmt, preset):
         try:
-            for img_path in self.image_files:
-                img = Image.open(img_path)
-                if img.mode == "RGBA" and fmt in ["jpg", "jpeg"]:
-                    img = img.convert("RGB")
+            from media_engine.encoders import encode_options
+            from media_engine.images import convert_images
+            from media_engine.profiling import JobProfile
+
+            prof = JobProfile("convert", image_files)
+            with prof:
+                result = convert_images(image_files, output_dir, fmt, self.events.progress("convert"),
+                                        cancel=self.img_convert_cancel, checkpoint=True,
+                                        encode=encode_options(fmt, preset))
+            report = prof.report(result, result.succeeded + result.cached)
+            self.events.post("convert", "finished", f"转换完成：{result.summary()}", result=result, report=report)
+        except Cancelled:
+            self.events.post("convert", "cancelled", "已取消，再次开始转换会跳过已完成的图片")
+        except Exception as e:
+            self.events.post("convert", "failed", str(e))
+
+    def estimate_images(self):
+        if not self.image_files:
+            messagebox.showerror("错误", "请先添加图片")
+            return
+        fmt = self.img_output_format.get().strip().lower()
+        self.img_estimate_button.configure(state="disabled")
+        threading.Thread(target=self.estimate_images_thread, args=(list(self.image_files), fmt), daemon=True).start()
 
-                name = os.path.splitext(os.path.basename(img_path))[0]
-                output_path = os.path.join(output_dir, f"{name}.{fmt}")
-                img.save(output_path)
+    def estimate_images_thread(self, image_files, fmt):
+        try:
+            from media_engine.encoders import estimate_presets, format_estimates
 
-            messagebox.showinfo("完成", f"成功转换 {len(self.image_files)} 张图片")
+            text = io.StringIO()
+            format_estimates(estimate_presets(image_files, fmt, progress=self.events.progress("estimate")), text)
+            self.events.post("estimate", "finished", text.getvalue())
         except Exception as e:
-            messagebox.showerror("错误", str(e))
+            self.events.post("estimate", "failed", str(e))
+
+    def on_estimate_event(self, event):
+        if event.kind == "progress":
+            self.img_convert_status.set(event.message)
+            return
+        self.img_estimate_button.configure(state="normal")
+        self.img_convert_status.set("就绪")
+        if event.kind == "failed":
+            self.show_message("error", "错误", event.message)
+        else:
+            self.show_message("info", "预估（抽样试编码）", event.message)
+
+    def on_convert_event(self, event):
+        if event.kind == "progress":
+            self.img_convert_progress["value"] = event.done / event.total * 100 if event.total else 0
+            self.img_convert_status.set(event.message)
+            return
+        self.img_convert_button.configure(state="normal")
+        self.img_cancel_button.configure(state="disabled")
+        if event.kind == "cancelled":
+            self.img_convert_status.set(event.message)
+            return
+        if event.kind == "failed":
+            self.img_convert_status.set("出错了")
+            self.show_message("error", "错误", event.message)
+            return
+
+        from media_engine.profiling import summary_line
+
+        result = event.data["result"]
+        self.img_convert_status.set(f"{result.summary()} | {summary_line(event.data['report'])}")
+        message = event.message
+        problems = [f"{os.path.basename(p)}: {r}" for p, r in result.failed + result.skipped]
+        if problems:
+            message += "\n\n" + "\n".join(problems[:10])
+            if len(problems) > 10:
+                message += f"\n... 共 {len(problems)} 项"
+        self.show_message("warning" if result.failed else "info", "完成", message)
 
     # ================== 网格裁剪 ==================
     def create_grid_crop_tab(self):
@@ -407,6 +558,10 @@ class MediaToolbox:
         ttk.Button(preset_frame, text="4x2", command=lambda: self.set_grid(4, 2)).pack(side="left", padx=3)
         ttk.Button(preset_frame, text="2x8", command=lambda: self.set_grid(2, 8)).pack(side="left", padx=3)
 
+        ttk.Label(grid_frame, text="重叠像素:").grid(row=2, column=0, padx=5, pady=5)
+        self.crop_overlap = tk.StringVar(value="0")
+        ttk.Entry(grid_frame, textvariable=self.crop_overlap, width=8).grid(row=2, column=1, padx=5, pady=5)
+
         ttk.Label(tab, text="输出目录:").grid(row=3, column=0, sticky="w", pady=5)
         self.crop_output_dir = tk.StringVar()
         ttk.Entry(tab, textvariable=self.crop_output_dir, width=40).grid(row=3, column=1, pady=5)
@@ -416,14 +571,26 @@ class MediaToolbox:
         self.crop_format = tk.StringVar(value="png")
         fmt_frame = ttk.Frame(tab)
         fmt_frame.grid(row=4, column=1, sticky="w", pady=5)
-        for fmt in ["png", "jpg", "jpeg"]:
+        for fmt in ["png", "jpg", "jpeg", "webp"]:
             ttk.Radiobutton(fmt_frame, text=fmt.upper(), variable=self.crop_format, value=fmt).pack(side="left", padx=8)
+        self.crop_preset = tk.StringVar(value="balanced")
+        ttk.Combobox(fmt_frame, textvariable=self.crop_preset, values=ENCODE_PRESETS,
+                     state="readonly", width=10).pack(side="left", padx=8)
+        self.crop_sink = tk.StringVar(value="files")
+        ttk.Combobox(fmt_frame, textvariable=self.crop_sink, values=TILE_SINKS,
+                     state="readonly", width=6).pack(side="left", padx=8)
+
+        self.crop_status = tk.StringVar(value="就绪")
+        ttk.Label(tab, textvariable=self.crop_status).grid(row=5, column=0, columnspan=3, pady=(10, 0))
 
-        ttk.Button(tab, text="开始裁剪", command=self.start_grid_crop).grid(row=5, column=0, columnspan=3, pady=20)
+        self.crop_button = ttk.Button(tab, text="开始裁剪", command=self.start_grid_crop)
+        self.crop_button.grid(row=6, column=0, columnspan=3, pady=10)
 
     def browse_crop_image(self):
         file = filedialog.askopenfilename(filetypes=[("图片文件", "*.png *.jpg *.jpeg *.bmp *.webp")])
         if file:
+            from PIL import Image
+
             file = file.strip()
             self.crop_image_path.set(file)
             img = Image.open(file)
@@ -453,36 +620,55 @@ class MediaToolbox:
             messagebox.showerror("错误", "请输入有效的切割数量")
             return
 
-        os.makedirs(output_dir, exist_ok=True)
+        try:
+            overlap = int(self.crop_overlap.get() or 0)
+            if overlap < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "请输入有效的重叠像素（非负整数）")
+            return
+
+        fmt = self.crop_format.get().strip().lower()
+        self.crop_button.configure(state="disabled")
+        threading.Thread(target=self.grid_crop_thread,
+                         args=(img_path, output_dir, cols, rows, fmt, overlap, self.crop_preset.get(),
+                               self.crop_sink.get()),
+                         daemon=True).start()
 
+    def grid_crop_thread(self, img_path, output_dir, cols, rows, fmt, overlap, preset, sink):
         try:
-            img = Image.open(img_path)
-            w, h = img.size
-            cell_w = w // cols
-            cell_h = h // rows
-
-            fmt = self.crop_format.get().strip().lower()
-            name = os.path.splitext(os.path.basename(img_path))[0]
-
-            count = 0
-            for row in range(rows):
-                for col in range(cols):
-                    left = col * cell_w
-                    top = row * cell_h
-                    right = left + cell_w
-                    bottom = top + cell_h
-
-                    cell = img.crop((left, top, right, bottom))
-                    if cell.mode == "RGBA" and fmt in ["jpg", "jpeg"]:
-                        cell = cell.convert("RGB")
-
-                    output_path = os.path.join(output_dir, f"{name}_{row+1:02d}_{col+1:02d}.{fmt}")
-                    cell.save(output_path)
-                    count += 1
-
-            messagebox.showinfo("完成", f"成功裁剪为 {count} 张图片\n每张尺寸: {cell_w} x {cell_h}")
+            from media_engine.encoders import encode_options
+            from media_engine.images import grid_crop
+            from media_engine.jobs import job_outputs
+            from media_engine.profiling import JobProfile
+
+            prof = JobProfile("grid-crop", [img_path])
+            with prof:
+                encode = encode_options(fmt, preset)
+                result = grid_crop(img_path, output_dir, cols, rows, fmt, self.events.progress("crop"), overlap,
+                                   encode=encode, sink=sink)
+            count, cell_w, cell_h = result
+            params = {"output_dir": output_dir, "cols": cols, "rows": rows, "fmt": fmt, "sink": sink}
+            report = prof.report(result, job_outputs("grid-crop", img_path, params, result, prof.started))
+            self.events.post("crop", "finished", f"成功裁剪为 {count} 张图片\n每张尺寸: {cell_w} x {cell_h}",
+                             report=report)
         except Exception as e:
-            messagebox.showerror("错误", str(e))
+            self.events.post("crop", "failed", str(e))
+
+    def on_crop_event(self, event):
+        if event.kind == "progress":
+            self.crop_status.set(event.message)
+            return
+        self.crop_button.configure(state="normal")
+        if event.kind == "failed":
+            self.crop_status.set("出错了")
+            self.show_message("error", "错误", event.message)
+            return
+
+        from media_engine.profiling import summary_line
+
+        self.crop_status.set(f"完成! {summary_line(event.data['report'])}")
+        self.show_message("info", "完成", event.message)
 
     # ================== 图片合成GIF ==================
     def create_gif_maker_tab(self):
@@ -519,6 +705,13 @@ class MediaToolbox:
         self.gif_loop = tk.BooleanVar(value=True)
         ttk.Checkbutton(setting_frame, text="循环播放", variable=self.gif_loop).pack(side="left", padx=20)
 
+        ttk.Label(setting_frame, text="最长边(像素，留空不限):").pack(side="left")
+        self.gif_max_side = tk.StringVar(value="")
+        ttk.Entry(setting_frame, textvariable=self.gif_max_side, width=8).pack(side="left", padx=5)
+
+        self.maker_gif_options = self.create_gif_options(tab)
+        self.maker_gif_options["frame"].pack(fill="x", pady=5)
+
         out_frame = ttk.Frame(tab)
         out_frame.pack(fill="x", pady=5)
         ttk.Label(out_frame, text="输出文件:").pack(side="left")
@@ -526,7 +719,11 @@ class MediaToolbox:
         ttk.Entry(out_frame, textvariable=self.gif_output_path, width=35).pack(side="left", padx=5)
         ttk.Button(out_frame, text="浏览", command=self.browse_gif_output).pack(side="left")
 
-        ttk.Button(tab, text="生成GIF", command=self.create_gif).pack(pady=15)
+        self.gif_status = tk.StringVar(value="就绪")
+        ttk.Label(tab, textvariable=self.gif_status).pack()
+
+        self.gif_button = ttk.Button(tab, text="生成GIF", command=self.create_gif)
+        self.gif_button.pack(pady=10)
 
     def add_gif_images(self):
         files = filedialog.askopenfilenames(filetypes=[("图片文件", "*.png *.jpg *.jpeg *.bmp *.webp")])
@@ -561,17 +758,18 @@ class MediaToolbox:
         self.gif_listbox.delete(0, "end")
 
     def browse_gif_output(self):
+        ext = ANIMATION_EXTS[self.maker_gif_options["format"].get()]
         file = filedialog.asksaveasfilename(
-            defaultextension=".gif",
-            filetypes=[("GIF 文件", "*.gif"), ("所有文件", "*.*")]
+            defaultextension=ext,
+            filetypes=[("动图文件", "*.gif *.webp *.png"), ("所有文件", "*.*")]
         )
         if self.debug:
             print("asksaveasfilename returned:", repr(file))
 
         if file:
             file = file.strip()
-            if not file.lower().endswith(".gif"):
-                file += ".gif"
+            if not file.lower().endswith(ext):
+                file += ext
             self.gif_output_path.set(file)
 
     def create_gif(self):
@@ -588,8 +786,9 @@ class MediaToolbox:
             messagebox.showerror("错误", "输出路径是文件夹，请选择一个 .gif 文件名（例如：out.gif）")
             return
 
-        if not output_path.lower().endswith(".gif"):
-            output_path += ".gif"
+        ext = ANIMATION_EXTS[self.maker_gif_options["format"].get()]
+        if not output_path.lower().endswith(ext):
+            output_path += ext
             self.gif_output_path.set(output_path)
 
         try:
@@ -600,33 +799,295 @@ class MediaToolbox:
             messagebox.showerror("错误", "请输入有效的帧间隔（正整数，单位毫秒）")
             return
 
+        max_side = self.gif_max_side.get().strip()
         try:
-            images = []
-            for f in self.gif_files:
-                img = Image.open(f)
-                if img.mode != "RGBA":
-                    img = img.convert("RGBA")
-                images.append(img)
-
-            loop = 0 if self.gif_loop.get() else 1
-            images[0].save(
-                output_path,
-                save_all=True,
-                append_images=images[1:],
-                duration=duration,
-                loop=loop,
-                format="GIF"
-            )
+            max_side = int(max_side) if max_side else None
+            if max_side is not None and max_side <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "最长边必须是正整数（留空表示不限制）")
+            return
+
+        options = dict(self.get_gif_options(self.maker_gif_options), max_side=max_side)
+        self.gif_button.configure(state="disabled")
+        threading.Thread(target=self.create_gif_thread,
+                         args=(list(self.gif_files), output_path, duration, bool(self.gif_loop.get()), options),
+                         daemon=True).start()
 
-            messagebox.showinfo("完成", f"GIF已生成:\n{output_path}")
+    def create_gif_thread(self, image_files, output_path, duration, loop, options):
+        try:
+            from media_engine.images import make_gif
+            from media_engine.profiling import JobProfile
+
+            prof = JobProfile("make-gif", image_files)
+            with prof:
+                make_gif(image_files, output_path, duration, loop, progress=self.events.progress("gif"), **options)
+            report = prof.report(output_path, [output_path])
+            self.events.post("gif", "finished", f"已生成:\n{output_path}", report=report)
         except Exception as e:
-            messagebox.showerror("错误", str(e))
+            self.events.post("gif", "failed", str(e))
+
+    def on_gif_event(self, event):
+        if event.kind == "progress":
+            self.gif_status.set(event.message)
+            return
+        self.gif_button.configure(state="normal")
+        if event.kind == "failed":
+            self.gif_status.set("出错了")
+            self.show_message("error", "错误", event.message)
+            return
+
+        from media_engine.profiling import summary_line
+
+        summary = summary_line(event.data["report"])
+        self.gif_status.set(f"完成! {summary}")
+        self.show_message("info", "完成", f"{event.message}\n\n{summary}")
+
+    # ================== 任务队列 ==================
+    def create_job_queue_tab(self):
+        tab = ttk.Frame(self.notebook, padding=15)
+        self.notebook.add(tab, text="任务队列")
+
+        # 视频抽帧、视频转换提交的任务都在这里排队执行
+        self.scheduler = None
+        self.job_batches = {}
+
+        setting_frame = ttk.Frame(tab)
+        setting_frame.pack(fill="x", pady=5)
+        ttk.Label(setting_frame, text="CPU 并发:").pack(side="left")
+        self.queue_cpu_workers = tk.StringVar(value=str(max(1, (os.cpu_count() or 1) // 2)))
+        ttk.Entry(setting_frame, textvariable=self.queue_cpu_workers, width=5).pack(side="left", padx=5)
+        ttk.Label(setting_frame, text="I/O 并发:").pack(side="left", padx=(10, 0))
+        self.queue_io_workers = tk.StringVar(value="2")
+        ttk.Entry(setting_frame, textvariable=self.queue_io_workers, width=5).pack(side="left", padx=5)
+        # 输入和参数都没变的任务直接从结果缓存还原输出
+        self.queue_use_cache = tk.BooleanVar(value=False)
+        ttk.Checkbutton(setting_frame, text="结果缓存", variable=self.queue_use_cache).pack(side="left", padx=(10, 0))
+        ttk.Button(setting_frame, text="应用", command=self.apply_queue_limits).pack(side="left", padx=10)
+
+        list_frame = ttk.Frame(tab)
+        list_frame.pack(fill="both", expand=True, pady=5)
+        columns = [("id", "#", 40), ("file", "文件", 170), ("op", "操作", 70), ("priority", "优先级", 55),
+                   ("status", "状态", 70), ("progress", "进度", 60), ("message", "信息", 150)]
+        self.job_tree = ttk.Treeview(list_frame, columns=[c[0] for c in columns], show="headings", height=8)
+        for key, text, width in columns:
+            self.job_tree.heading(key, text=text)
+            self.job_tree.column(key, width=width, anchor="w")
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.job_tree.yview)
+        self.job_tree.configure(yscrollcommand=scrollbar.set)
+        self.job_tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        btn_frame = ttk.Frame(tab)
+        btn_frame.pack(fill="x", pady=5)
+        ttk.Button(btn_frame, text="取消", command=lambda: self.for_selected_jobs("cancel")).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="重试", command=lambda: self.for_selected_jobs("retry")).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="优先级 +", command=lambda: self.for_selected_jobs("priority", 1)).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="优先级 -", command=lambda: self.for_selected_jobs("priority", -1)).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="清除已结束", command=self.clear_finished_jobs).pack(side="left", padx=5)
+
+        self.queue_stats = tk.StringVar(value="队列空闲")
+        ttk.Label(tab, textvariable=self.queue_stats).pack(anchor="w", pady=5)
+
+    def get_scheduler(self):
+        if self.scheduler is None:
+            from media_engine.jobs import JobScheduler
+
+            cpu_workers, io_workers = self.parse_queue_limits()
+            cache = None
+            if self.queue_use_cache.get():
+                from media_engine.cache import ResultCache
+                cache = ResultCache()
+            self.scheduler = JobScheduler(cpu_workers, io_workers, cache=cache, on_update=self.on_job_update)
+        return self.scheduler
+
+    def on_job_update(self, job):
+        # 工作线程里调用：只写事件总线（任务表格由 refresh_jobs 定时刷新）
+        source = f"#{job.id} {job.op} {job.input_path}"
+        if job.status == "running":
+            self.events.update(source, job.done, job.total, job.message)
+        elif job.status == "done":
+            self.events.post(source, "finished", f"[完成] {source} -> {job.result}")
+        elif job.status == "failed":
+            self.events.post(source, "failed", f"[失败] {source}: {job.error}")
+        elif job.status == "cancelled":
+            self.events.post(source, "cancelled", f"[取消] {source}")
+
+    def parse_queue_limits(self):
+        try:
+            cpu_workers = int(self.queue_cpu_workers.get())
+            io_workers = int(self.queue_io_workers.get())
+            if cpu_workers <= 0 or io_workers <= 0:
+                raise ValueError
+        except ValueError:
+            cpu_workers, io_workers = None, 2
+        return cpu_workers, io_workers
+
+    def apply_queue_limits(self):
+        if self.scheduler is not None and self.scheduler.pending():
+            messagebox.showerror("错误", "队列中还有任务，全部结束后才能修改并发数")
+            return
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+        cpu_workers, io_workers = self.parse_queue_limits()
+        cache_text = "开" if self.queue_use_cache.get() else "关"
+        self.queue_stats.set(f"设置将在下次提交时生效：CPU {cpu_workers or '自动'}，I/O {io_workers}，结果缓存{cache_text}")
+
+    def for_selected_jobs(self, action, delta=0):
+        if self.scheduler is None:
+            return
+        for iid in self.job_tree.selection():
+            job = self.scheduler.jobs.get(int(iid))
+            if job is None:
+                continue
+            if action == "cancel":
+                self.scheduler.cancel(job.id)
+            elif action == "retry":
+                self.scheduler.retry(job.id)
+            elif action == "priority":
+                self.scheduler.set_priority(job.id, job.priority + delta)
+
+    def clear_finished_jobs(self):
+        if self.scheduler is not None:
+            self.scheduler.clear_finished()
+
+    def track_batch(self, tab_name, jobs):
+        """记录某个标签页最近提交的一批任务，全部结束时弹出汇总"""
+        self.job_batches[tab_name] = {"jobs": jobs, "announced": False}
+        self.batch_status(tab_name).set(f"已加入队列: {len(jobs)} 个任务")
+
+    def batch_status(self, tab_name):
+        return self.extract_status if tab_name == "extract" else self.convert_status
+
+    def batch_progress(self, tab_name):
+        return self.extract_progress if tab_name == "extract" else self.convert_progress
+
+    def update_batch_progress(self, bar, jobs):
+        """所有运行中的任务都知道总量时显示真实百分比，否则显示来回滚动的进度条"""
+        running = [j for j in jobs if j.status == "running"]
+        if any(j.total is None for j in running):
+            if str(bar["mode"]) != "indeterminate":
+                bar.configure(mode="indeterminate")
+                bar.start()
+            return
+        if str(bar["mode"]) != "determinate":
+            bar.stop()
+            bar.configure(mode="determinate")
+        bar["value"] = sum(j.percent for j in jobs) / len(jobs)
+
+    def refresh_jobs(self):
+        """定时刷新任务列表、吞吐和各标签页的批次进度（只在主线程读取任务状态）"""
+        if self.scheduler is not None:
+            jobs = list(self.scheduler.jobs.values())
+            existing = set(self.job_tree.get_children())
+            current = set()
+            for job in jobs:
+                iid = str(job.id)
+                current.add(iid)
+                message = (str(job.error) if job.error is not None and job.status == "failed"
+                           else format_progress(job.message, job.done, job.total))
+                values = (job.id, os.path.basename(job.input_path), job.op, job.priority,
+                          job.status, f"{job.percent:.0f}%", message)
+                if iid in existing:
+                    self.job_tree.item(iid, values=values)
+                else:
+                    self.job_tree.insert("", "end", iid=iid, values=values)
+            for iid in existing - current:
+                self.job_tree.delete(iid)
+
+            st = self.scheduler.stats()
+            counts = st["counts"]
+            self.queue_stats.set(
+                f"运行 {counts['running']}，排队 {counts['queued']}，完成 {counts['done']}，"
+                f"失败 {counts['failed']}，取消 {counts['cancelled']}，缓存命中 {st['cached']} | "
+                f"{st['files_per_min']:.1f} 文件/分钟，{st['frames_per_s']:.1f} 帧/秒"
+            )
+
+        for tab_name, batch in self.job_batches.items():
+            if batch["announced"]:
+                continue
+            jobs = batch["jobs"]
+            finished = [j for j in jobs if j.status not in ("queued", "running")]
+            self.update_batch_progress(self.batch_progress(tab_name), jobs)
+            if len(finished) < len(jobs):
+                self.batch_status(tab_name).set(f"处理中: {len(finished)}/{len(jobs)} 个文件完成")
+                continue
+
+            batch["announced"] = True
+            failed = [j for j in jobs if j.status == "failed"]
+            done = [j for j in jobs if j.status == "done"]
+            if failed:
+                self.batch_status(tab_name).set("出错了")
+            elif done:
+                from media_engine.profiling import merge_reports, summary_line
+                self.batch_status(tab_name).set(f"完成! {summary_line(merge_reports(j.report for j in done))}")
+            else:
+                self.batch_status(tab_name).set("完成!")
+            if failed:
+                lines = [f"{os.path.basename(j.input_path)}: {j.error}" for j in failed[:10]]
+                messagebox.showerror("错误", f"{len(failed)} 个任务失败：\n" + "\n".join(lines))
+            elif tab_name == "extract":
+                frames = sum(j.result or 0 for j in done)
+                messagebox.showinfo("完成", f"成功抽取 {frames} 帧（{len(done)} 个视频）到：\n{done[0].params['output_dir']}" if done else "任务已取消")
+            else:
+                messagebox.showinfo("完成", "转换完成:\n" + "\n".join(str(j.result) for j in done[:10]) if done else "任务已取消")
+
+        self.window.after(500, self.refresh_jobs)
 
     # ================== 通用方法 ==================
-    def browse_file(self, var, filetypes):
-        file = filedialog.askopenfilename(filetypes=filetypes)
-        if file:
-            var.set(file.strip())
+    def create_gif_options(self, parent):
+        """动图选项（格式 / 调色板 / 抖动 / 差分帧），视频转 GIF 和合成 GIF 共用；调色板和抖动只对 GIF 有效"""
+        frame = ttk.Frame(parent)
+        options = {
+            "frame": frame,
+            "format": tk.StringVar(value="gif"),
+            "palette": tk.StringVar(value="global"),
+            "dither": tk.StringVar(value="none"),
+            "delta": tk.BooleanVar(value=True),
+            "lossless": tk.BooleanVar(value=False),
+            "compare": tk.BooleanVar(value=False),
+        }
+
+        ttk.Label(frame, text="格式:").pack(side="left")
+        ttk.Combobox(frame, textvariable=options["format"], values=ANIMATION_FORMATS,
+                     width=6, state="readonly").pack(side="left", padx=(5, 10))
+
+        ttk.Label(frame, text="调色板:").pack(side="left")
+        ttk.Combobox(frame, textvariable=options["palette"], values=GIF_PALETTE_MODES,
+                     width=9, state="readonly").pack(side="left", padx=5)
+        ttk.Label(frame, text="抖动:").pack(side="left", padx=(10, 0))
+        ttk.Combobox(frame, textvariable=options["dither"], values=GIF_DITHER_MODES,
+                     width=8, state="readonly").pack(side="left", padx=5)
+        ttk.Checkbutton(frame, text="差分帧", variable=options["delta"]).pack(side="left", padx=10)
+        ttk.Checkbutton(frame, text="WebP 无损", variable=options["lossless"]).pack(side="left")
+        # 再编码一份 GIF（不保留），完成后在状态栏显示体积对比
+        ttk.Checkbutton(frame, text="与 GIF 对比", variable=options["compare"]).pack(side="left", padx=10)
+        return options
+
+    def get_gif_options(self, options):
+        anim_format = options["format"].get()
+        anim_encode = None
+        if anim_format != "gif":
+            from media_engine.encoders import encode_options
+            anim_encode = encode_options(anim_format, lossless=bool(options["lossless"].get()))
+        return {
+            "palette": options["palette"].get(),
+            "dither": options["dither"].get(),
+            "delta": bool(options["delta"].get()),
+            "anim_format": anim_format,
+            "anim_encode": anim_encode,
+            "compare_gif": bool(options["compare"].get()),
+        }
+
+    def browse_files(self, var, filetypes):
+        """可多选；多个文件在输入框中用分号分隔"""
+        files = filedialog.askopenfilenames(filetypes=filetypes)
+        if files:
+            var.set("; ".join(f.strip() for f in files))
+
+    def split_paths(self, text):
+        return [p.strip() for p in text.split(";") if p.strip()]
 
     def browse_dir(self, var):
         dir_path = filedialog.askdirectory()